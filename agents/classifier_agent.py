@@ -1,61 +1,108 @@
 # agents/classifier_agent.py
 from memory.shared_memory import global_shared_memory
-from utils.llm_client import generate_text_gemini, summarize_pdf_bytes_gemini
-from utils.file_parser import get_file_format, extract_text_from_pdf, parse_json_file, extract_text_from_email_file, extract_text_from_raw_email_content
+from utils.llm_client import generate_text_gemini, generate_text_gemini_async, summarize_pdf_bytes_gemini
+from utils.document import ParsedDocument, INTENT_CONTENT_LIMIT
+from utils.file_parser import is_in_memory_source
+from utils.local_intent_classifier import LocalIntentClassifier
+from utils.metrics import stage
+from agents.json_agent import TARGET_SCHEMAS, SCHEMA_MATCH_THRESHOLD, match_json_schema
+import asyncio
+import json
 import os
+import threading
+from collections import Counter
+
+POSSIBLE_INTENTS = ["Invoice", "RFQ", "Complaint", "Regulation", "Order", "Query", "Marketing", "Internal Memo", "Resume", "Other"]
+BULK_INTENT = "Bulk" # Intent logged for an NDJSON / JSON-array file; each record gets its own
+LLM_ERROR_INTENT = "Unknown (LLM error)" # The LLM call failed; never learned from or remembered for dedupe
+
+# Batched classification: documents per LLM call and characters of each document in the prompt
+INTENT_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", 8))
+BATCH_EXCERPT_CHARS = 1500
+
+# Local fast path: rules + a model trained on past LLM labels; the LLM is only asked below the threshold
+LOCAL_CLASSIFIER_ENABLED = os.getenv("INTENT_LOCAL_CLASSIFIER", "1").lower() in ("1", "true", "yes")
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_LOCAL_THRESHOLD", 0.8))
+# The model alone must be more certain than the rules; agreement of both uses LOCAL_CONFIDENCE_THRESHOLD
+LOCAL_MODEL_THRESHOLD = float(os.getenv("INTENT_MODEL_THRESHOLD", 0.95))
+LOCAL_TRAIN_LIMIT = int(os.getenv("INTENT_LOCAL_TRAIN_LIMIT", 5000)) # 0 = don't train from agent_logs at start-up
+CONTENT_EXCERPT_CHARS = 1000 # Stored with each classification so the local model can learn from it
+
+# Emails get intent, urgency, CRM summary and entities from a single LLM call
+COMBINED_EMAIL_MODE = os.getenv("EMAIL_COMBINED_MODE", "1").lower() in ("1", "true", "yes")
+
+# Byte-identical inputs reuse the stored classification and agent outputs instead of reprocessing
+DEDUPE_ENABLED = os.getenv("CLASSIFIER_DEDUPE", "1").lower() in ("1", "true", "yes")
+# Columns and bookkeeping fields that are regenerated when a log is replayed for a duplicate
+_REPLAY_SKIP_FIELDS = {"id", "timestamp", "agent_name", "thread_id", "source_filename", "log_details"}
+
+async def _resolved(value):
+    return value
+
+class PendingClassification:
+    """A parsed input waiting for its intent (see ClassifierAgent.prepare/complete)."""
+    def __init__(self, thread_id: str, document: ParsedDocument, content_for_intent: str):
+        self.thread_id = thread_id
+        self.document = document
+        self.content_for_intent = content_for_intent
+        self.email_analysis = None # Urgency/summary/entities when the combined email prompt was used
+        self.intent = None # Set early when the intent is known without the LLM
+        self.intent_source = None # "llm", "rules", "model" or "none"
+        self.intent_confidence = None
+
+    def set_intent(self, intent: str, source: str, confidence: float = None):
+        self.intent = intent
+        self.intent_source = source
+        self.intent_confidence = confidence
 
 class ClassifierAgent:
-    def __init__(self, memory=global_shared_memory):
+    def __init__(self, memory=global_shared_memory, dedupe=DEDUPE_ENABLED, use_local_classifier=LOCAL_CLASSIFIER_ENABLED,
+                 local_threshold=LOCAL_CONFIDENCE_THRESHOLD, model_threshold=LOCAL_MODEL_THRESHOLD,
+                 combined_email=COMBINED_EMAIL_MODE):
         self.memory = memory
         self.name = "ClassifierAgent"
+        self.dedupe = dedupe
+        self.combined_email = combined_email
+        self.local_threshold = local_threshold
+        self.model_threshold = model_threshold
+        self.local_classifier = None
+        if use_local_classifier:
+            self.local_classifier = LocalIntentClassifier(POSSIBLE_INTENTS)
+            if LOCAL_TRAIN_LIMIT > 0:
+                self.local_classifier.train_from_memory(memory, agent_name=self.name, limit=LOCAL_TRAIN_LIMIT)
+        self.intent_stats = Counter() # Classifications per intent_source, one per document
+        self.bulk_record_intent_stats = Counter() # Same for the records of bulk files, see classify_json_record
+        self._stats_lock = threading.Lock()
 
-    def _get_content_for_intent(self, file_path: str, file_format: str, raw_content_bytes: bytes = None) -> str:
+    @property
+    def llm_skip_rate(self) -> float:
+        """Share of documents whose intent was decided without calling the LLM. Bulk-file records are not counted."""
+        with self._stats_lock:
+            total = sum(self.intent_stats.values())
+            return (total - self.intent_stats["llm"]) / total if total else 0.0
+
+    def _get_content_for_intent(self, document: ParsedDocument) -> str:
         """Extracts relevant text content for intent classification."""
-        content_for_intent = ""
-        if file_format == "PDF":
-            if raw_content_bytes: # Prefer direct PDF processing if available and model supports it
-                # For intent classification, a summary might be better than full text
-                # Or, we can use Gemini's ability to process PDF directly for classification
-                # Let's try a short summary for intent classification from PDF
-                # content_for_intent = summarize_pdf_bytes_gemini(raw_content_bytes, "Briefly describe the type of document this is.")
-                # OR, just extract text for now if summarization is too slow/costly for just intent
-                content_for_intent = extract_text_from_pdf(file_path) # Fallback or primary
-                if not content_for_intent and raw_content_bytes: # if PyPDF2 fails, try to send bytes (if model can take it)
-                    # This part is tricky for intent classification directly.
-                    # Usually, you'd give text. If sending bytes, the prompt needs to be clear.
-                    print("PDF text extraction failed, attempting to use raw bytes summary (experimental for intent)")
-                    # content_for_intent = summarize_pdf_bytes_gemini(raw_content_bytes, "What is the primary purpose or intent of this document? Choose from: Invoice, RFQ, Complaint, Regulation, Order, Query, General Information, Other.")
-                    # For simplicity, let's stick to extracted text for intent classification.
-            else:
-                 content_for_intent = extract_text_from_pdf(file_path)
-
-        elif file_format == "JSON":
-            # For JSON, we might stringify it or pick key fields.
-            # Stringifying the whole JSON might be too much for intent if it's large.
-            # Let's use the stringified version for now, LLM can often pick up cues.
-            json_data = parse_json_file(file_path)
-            if json_data:
-                content_for_intent = str(json_data)[:2000] # Truncate for very large JSONs
-        elif file_format == "EMAIL":
-            if file_path: # if it's a file
-                _, _, _, body = extract_text_from_email_file(file_path)
-                content_for_intent = body
-            elif raw_content_bytes: # if it's raw bytes
-                _, _, _, body = extract_text_from_raw_email_content(raw_content_bytes.decode('utf-8', errors='replace'))
-                content_for_intent = body
-        elif file_format == "TEXT": # Could be raw email body passed as text
-            if file_path:
-                with open(file_path, "r", encoding='utf-8') as f:
-                    content_for_intent = f.read()
-            elif raw_content_bytes: # if it's raw bytes for a text file
-                 content_for_intent = raw_content_bytes.decode('utf-8', errors='replace')
-
-        return content_for_intent[:4000] # Limit context for LLM
+        # For PDFs we stick to extracted text; if PyPDF2 finds nothing the content is empty
+        # and classify_intent reports "Unknown (No content)".
+        return document.content_for_intent(INTENT_CONTENT_LIMIT) # Limit context for LLM
 
     def classify_intent(self, text_content: str, filename: str = "") -> str:
         if not text_content.strip():
             return "Unknown (No content)"
 
+        # print(f"\nDEBUG: Sending to LLM for intent classification:\n{prompt}\n")
+        intent = generate_text_gemini(self._build_intent_prompt(text_content, filename))
+        return self._parse_intent_response(intent)
+
+    async def classify_intent_async(self, text_content: str, filename: str = "") -> str:
+        """classify_intent without blocking the event loop on the LLM call."""
+        if not text_content.strip():
+            return "Unknown (No content)"
+        intent = await generate_text_gemini_async(self._build_intent_prompt(text_content, filename))
+        return self._parse_intent_response(intent)
+
+    def _build_intent_prompt(self, text_content: str, filename: str) -> str:
         # More robust prompt with few-shot examples or clearer instructions
         prompt = f"""
         Analyze the following text content (from file: "{filename}") and classify its primary intent.
@@ -80,75 +127,347 @@ class ClassifierAgent:
         ---
         Primary Intent:
         """
-        # print(f"\nDEBUG: Sending to LLM for intent classification:\n{prompt}\n")
-        intent = generate_text_gemini(prompt)
+        return prompt
+
+    def classify_intents_batch(self, items: list) -> list:
+        """
+        Classifies several documents with one LLM call per INTENT_BATCH_SIZE documents.
+        items: list of (text_content, filename). Returns one intent label per item, in order.
+        Documents whose label is missing or invalid in the batched answer are retried one by one.
+        """
+        intents, chunks = self._plan_intent_batches(items)
+        for chunk in chunks:
+            response = generate_text_gemini(self._build_batch_intent_prompt(items, chunk))
+            parsed = self._parse_batch_intent_response(response, len(chunk))
+            for position, index in enumerate(chunk):
+                if parsed.get(position + 1):
+                    intents[index] = parsed[position + 1]
+                else:
+                    intents[index] = self.classify_intent(*items[index]) # Per-document fallback
+        return intents
+
+    async def classify_intents_batch_async(self, items: list) -> list:
+        intents, chunks = self._plan_intent_batches(items)
+        async def run_chunk(chunk):
+            response = await generate_text_gemini_async(self._build_batch_intent_prompt(items, chunk))
+            parsed = self._parse_batch_intent_response(response, len(chunk))
+            for position, index in enumerate(chunk):
+                if parsed.get(position + 1):
+                    intents[index] = parsed[position + 1]
+                else:
+                    intents[index] = await self.classify_intent_async(*items[index])
+        await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+        return intents
+
+    def _plan_intent_batches(self, items: list):
+        """Fills in labels that need no LLM call and groups the remaining item indexes into chunks."""
+        intents = [None] * len(items)
+        pending = []
+        for index, (text_content, _) in enumerate(items):
+            if not text_content.strip():
+                intents[index] = "Unknown (No content)"
+            else:
+                pending.append(index)
+        chunks = [pending[i:i + INTENT_BATCH_SIZE] for i in range(0, len(pending), INTENT_BATCH_SIZE)]
+        return intents, chunks
+
+    def _build_batch_intent_prompt(self, items: list, chunk: list) -> str:
+        documents = "\n".join(
+            f"""
+        Document {position + 1} (from file: "{items[index][1]}"):
+        ---
+        {items[index][0][:BATCH_EXCERPT_CHARS]}
+        ---"""
+            for position, index in enumerate(chunk)
+        )
+        prompt = f"""
+        Classify the primary intent of each of the {len(chunk)} documents below.
+        Use exactly one of these labels per document:
+        {", ".join(POSSIBLE_INTENTS)}
+        (Invoice = billing statement; RFQ = request for quotation; Complaint = dissatisfaction or issue report;
+        Regulation = official rule or compliance information; Order = purchase confirmation or supply request;
+        Query = question not fitting other categories; Marketing = promotional material;
+        Internal Memo = communication within an organization; Resume = CV or job application; Other = none of these)
+
+        Respond with only a JSON array containing one object per document, in order, for example:
+        [{{"document": 1, "intent": "Invoice"}}, {{"document": 2, "intent": "Complaint"}}]
+        {documents}
+        """
+        return prompt
+
+    def _parse_batch_intent_response(self, response: str, expected: int) -> dict:
+        """Returns {document number: label} for every entry with a valid label."""
+        text = response.strip()
+        if text.startswith("```"): # Gemini sometimes wraps JSON in ```json ... ```
+            text = text.strip("`")
+            if text.startswith("json"):
+                text = text[4:]
+        try:
+            entries = json.loads(text)
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(entries, list):
+            return {}
+
+        labels = {pi.lower(): pi for pi in POSSIBLE_INTENTS}
+        parsed = {}
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            number = entry.get("document", position + 1)
+            label = labels.get(str(entry.get("intent", "")).strip().lower())
+            if isinstance(number, int) and 1 <= number <= expected and label:
+                parsed[number] = label
+        return parsed
+
+    def _parse_intent_response(self, intent: str) -> str:
+        if intent.startswith("Error:"): # generate_text_gemini failed, see utils/llm_client._llm_error_text
+            return LLM_ERROR_INTENT
         # Clean up the response, sometimes LLMs add extra text
-        possible_intents = ["Invoice", "RFQ", "Complaint", "Regulation", "Order", "Query", "Marketing", "Internal Memo", "Resume", "Other"]
-        for pi in possible_intents:
+        for pi in POSSIBLE_INTENTS:
             if pi.lower() in intent.lower():
                 return pi
         return "Other" # Default if no specific intent is found
 
-    def process(self, input_data: str, is_filepath=True):
+    def process(self, input_data, is_filepath=True, filename: str = None):
         """
         Processes input, classifies, logs, and prepares for routing.
-        input_data: Can be a filepath or raw string content (e.g., email body).
-        is_filepath: True if input_data is a path, False if it's raw content.
+        input_data: Can be a filepath, raw string content (e.g., email body), or the document's
+                    bytes / a binary file-like object (e.g. an upload), in which case filename is required.
+        is_filepath: True if input_data is a path, False if it's raw content. Ignored for bytes/file-like input.
+        filename: Name logged for the document (and used for its format); defaults to the path's basename.
+        """
+        pending, result = self.prepare(input_data, is_filepath, filename)
+        if pending is None:
+            return result
+        if not pending.intent:
+            self._classify_with_llm(pending)
+        return self.complete(pending)
+
+    async def process_async(self, input_data, is_filepath=True, filename: str = None):
+        """process() for asyncio callers: file I/O, parsing and SQLite run in worker threads."""
+        pending, result = await asyncio.to_thread(self.prepare, input_data, is_filepath, filename)
+        if pending is None:
+            return result
+        if not pending.intent:
+            await self._classify_with_llm_async(pending)
+        return await asyncio.to_thread(self.complete, pending)
+
+    def process_many(self, inputs: list, is_filepath=True) -> list:
+        """process() for several inputs at once; their intents are classified with batched LLM calls."""
+        prepared = [self.prepare(input_data, is_filepath) for input_data in inputs]
+        emails, others = self._split_for_llm(prepared)
+        for p in emails: # One combined call per email beats a batched intent call plus the EmailAgent call
+            self._classify_with_llm(p)
+        for p, intent in zip(others, self.classify_intents_batch([(p.content_for_intent, p.document.filename) for p in others])):
+            p.set_intent(intent, "llm")
+        return [self.complete(p) if p is not None else result for p, result in prepared]
+
+    async def process_many_async(self, inputs: list, is_filepath=True) -> list:
+        prepared = await asyncio.gather(*(asyncio.to_thread(self.prepare, i, is_filepath) for i in inputs))
+        emails, others = self._split_for_llm(prepared)
+        intents, _ = await asyncio.gather(
+            self.classify_intents_batch_async([(p.content_for_intent, p.document.filename) for p in others]),
+            asyncio.gather(*(self._classify_with_llm_async(p) for p in emails)),
+        )
+        for p, intent in zip(others, intents):
+            p.set_intent(intent, "llm")
+        return await asyncio.gather(*(
+            asyncio.to_thread(self.complete, p) if p is not None else _resolved(result)
+            for p, result in prepared
+        ))
+
+    def _split_for_llm(self, prepared: list) -> tuple:
+        """Splits still-unclassified inputs into (combined-mode emails, everything else)."""
+        needs_llm = [p for p, _ in prepared if p is not None and not p.intent]
+        emails = [p for p in needs_llm if self._uses_combined_email(p)]
+        others = [p for p in needs_llm if not self._uses_combined_email(p)]
+        return emails, others
+
+    def _classify_with_llm(self, pending: PendingClassification):
+        if self._uses_combined_email(pending):
+            response = generate_text_gemini(self._build_combined_email_prompt(pending.document))
+            if self._apply_combined_email_response(pending, response):
+                return
+        pending.set_intent(self.classify_intent(pending.content_for_intent, pending.document.filename), "llm")
+
+    async def _classify_with_llm_async(self, pending: PendingClassification):
+        if self._uses_combined_email(pending):
+            response = await generate_text_gemini_async(self._build_combined_email_prompt(pending.document))
+            if self._apply_combined_email_response(pending, response):
+                return
+        pending.set_intent(await self.classify_intent_async(pending.content_for_intent, pending.document.filename), "llm")
+
+    def _uses_combined_email(self, pending: PendingClassification) -> bool:
+        return self.combined_email and pending.document.file_format == "EMAIL"
+
+    def _build_combined_email_prompt(self, document: ParsedDocument) -> str:
+        email = document.email_fields
+        prompt = f"""
+        Analyze the following email (from file: "{document.filename}"):
+        Sender: {email["sender"]}
+        Subject: {email["subject"]}
+        Body:
+        ---
+        {email["body"][:3000]}
+        ---
+
+        Determine the following:
+        1. Intent: the primary intent, exactly one of: {", ".join(POSSIBLE_INTENTS)}.
+        2. Urgency: Classify the urgency as Low, Medium, or High.
+        3. CRM Summary: Provide a concise summary (1-2 sentences) of the main point or request, suitable for a CRM system.
+        4. Extracted Entities (Optional): List any key entities like names, organizations, dates, or product names mentioned.
+
+        Format your response as a JSON object with keys "intent", "urgency", "crm_summary", and "entities" (entities can be a list of strings).
+        Example:
+        {{
+          "intent": "Complaint",
+          "urgency": "High",
+          "crm_summary": "Customer is reporting a critical system outage and requires immediate assistance.",
+          "entities": ["System X", "John Doe", "Main St Office"]
+        }}
+        """
+        return prompt
+
+    def _apply_combined_email_response(self, pending: PendingClassification, response: str) -> bool:
+        """Stores intent and CRM fields from a combined answer. False if it's unusable (caller falls back)."""
+        text = response.strip()
+        if text.startswith("```"): # Gemini sometimes wraps JSON in ```json ... ```
+            text = text.strip("`")
+            if text.startswith("json"):
+                text = text[4:]
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            return False
+        if not isinstance(parsed, dict):
+            return False
+        labels = {pi.lower(): pi for pi in POSSIBLE_INTENTS}
+        intent = labels.get(str(parsed.get("intent", "")).strip().lower())
+        if not intent:
+            return False
+        pending.set_intent(intent, "llm")
+        pending.email_analysis = { # Handed to EmailAgent so it can skip its own LLM call
+            "urgency": parsed.get("urgency", "Medium"),
+            "crm_summary": parsed.get("crm_summary", "Summary not extracted."),
+            "entities": parsed.get("entities", []),
+        }
+        return True
+
+    def prepare(self, input_data, is_filepath=True, filename: str = None):
+        """
+        Everything before the intent decision: read and parse the input and check for duplicates.
+        Returns (PendingClassification, None), or (None, final process() result) when there is
+        nothing left to classify.
         """
         thread_id = self.memory.generate_thread_id()
-        filename = os.path.basename(input_data) if is_filepath else "raw_input"
-        raw_bytes_content = None
-        initial_content_for_processing = None # This will be passed to next agent
 
-        if is_filepath:
-            source_type = get_file_format(input_data)
+        if is_in_memory_source(input_data): # Uploaded bytes or stream, never written to disk
+            filename = filename or "upload"
+            with stage("parse"):
+                document = ParsedDocument.from_bytes(input_data, filename)
+        elif is_filepath:
+            filename = filename or os.path.basename(input_data)
             if not os.path.exists(input_data):
                 print(f"Error: File not found at {input_data}")
                 self.memory.add_log(self.name, {
                     "thread_id": thread_id, "source_filename": filename, "status": "Error",
                     "error": "File not found", "classified_format": "Unknown", "classified_intent": "Unknown"
                 })
-                return None, None, None # No routing
-
-            with open(input_data, "rb") as f:
-                raw_bytes_content = f.read()
-
-            if source_type == "JSON":
-                initial_content_for_processing = parse_json_file(input_data)
-            elif source_type == "PDF":
-                initial_content_for_processing = extract_text_from_pdf(input_data) # Text for next agent
-                # Or pass raw_bytes_content if PDF agent can handle it
-            elif source_type == "EMAIL": # .eml file
-                sender, subject, recipients, body = extract_text_from_email_file(input_data)
-                initial_content_for_processing = {
-                    "sender": sender, "subject": subject,
-                    "recipients": recipients, "body": body,
-                    "original_format": "EMAIL_FILE"
-                }
-            elif source_type == "TEXT": # plain .txt file
-                 with open(input_data, "r", encoding='utf-8') as f:
-                    initial_content_for_processing = f.read()
+                return None, (None, None, None) # No routing
+            with stage("parse"):
+                document = ParsedDocument.from_path(input_data, filename) # Bytes are read once here
+        else: # Raw content (assumed to be email text for now as per prompt)
+            document = ParsedDocument.from_raw_text(input_data, filename or "raw_input")
 
+        if self.dedupe:
+            original = self.memory.find_document_by_hash(document.content_hash)
+            if original:
+                return None, self._replay_duplicate(thread_id, document, original)
 
-        else: # Raw content (assumed to be email text for now as per prompt)
-            source_type = "EMAIL" # Assume raw text is an email body
-            raw_bytes_content = input_data.encode('utf-8') # Convert string to bytes
-            sender, subject, recipients, body = extract_text_from_raw_email_content(input_data)
-            initial_content_for_processing = {
-                "sender": sender, "subject": subject,
-                "recipients": recipients, "body": body,
-                "original_format": "EMAIL_TEXT"
-            }
+        # Both the intent excerpt and the routed content come from the same parse of the document
+        with stage("parse"):
+            content_for_intent = self._get_content_for_intent(document)
+        pending = PendingClassification(thread_id, document, content_for_intent)
+        if not pending.content_for_intent.strip():
+            pending.set_intent("Unknown (No content)", "none")
+        elif document.is_bulk_json: # Each record is classified on its own, see classify_json_record
+            pending.set_intent(BULK_INTENT, "bulk")
+        else:
+            if document.file_format == "JSON":
+                self._classify_json_by_schema(pending)
+            if not pending.intent:
+                self._classify_locally(pending)
+        return pending, None
+
+    def _classify_json_by_schema(self, pending: PendingClassification):
+        """JSON payloads whose keys match a known JSONAgent schema need no LLM call."""
+        schema_key, score = match_json_schema(pending.document.json_content, TARGET_SCHEMAS)
+        if schema_key and score >= SCHEMA_MATCH_THRESHOLD:
+            intent = next((pi for pi in POSSIBLE_INTENTS if pi.lower() == schema_key), None)
+            if intent:
+                pending.set_intent(intent, "schema", round(score, 3))
+
+    def classify_json_record(self, record) -> tuple:
+        """
+        (intent, intent_source, confidence) for one record of a bulk file: schema match, then the
+        local classifier. Records are never sent to the LLM; unresolved ones get intent None.
+        """
+        intent, source, confidence = None, "none", None
+        schema_key, score = match_json_schema(record, TARGET_SCHEMAS)
+        if schema_key and score >= SCHEMA_MATCH_THRESHOLD:
+            intent = next((pi for pi in POSSIBLE_INTENTS if pi.lower() == schema_key), None)
+            source, confidence = "schema", round(score, 3)
+        if intent is None and self.local_classifier is not None and isinstance(record, dict):
+            label, local_confidence, local_source = self.local_classifier.predict(json.dumps(record)[:BATCH_EXCERPT_CHARS])
+            if self._locally_settled(label, local_confidence, local_source):
+                intent, source, confidence = label, local_source, round(local_confidence, 3)
+        with self._stats_lock:
+            self.bulk_record_intent_stats[source] += 1
+        return intent, source, confidence
 
+    def _classify_locally(self, pending: PendingClassification):
+        """Settles the intent without the LLM when the local classifier is confident enough."""
+        if self.local_classifier is None:
+            return
+        document = pending.document
+        text = f"{document.filename}\n{pending.content_for_intent}"
+        if document.file_format == "EMAIL": # The subject is often the strongest cue
+            text = f"{document.email_fields['subject']}\n{text}"
+        label, confidence, source = self.local_classifier.predict(text)
+        if self._locally_settled(label, confidence, source):
+            pending.set_intent(label, source, round(confidence, 3))
 
-        content_for_intent = self._get_content_for_intent(input_data if is_filepath else None, source_type, raw_bytes_content)
-        intent = self.classify_intent(content_for_intent, filename)
+    def _locally_settled(self, label, confidence: float, source: str) -> bool:
+        threshold = self.model_threshold if source == "model" else self.local_threshold
+        return bool(label) and confidence >= threshold
+
+    def complete(self, pending: "PendingClassification"):
+        """Logs the classification and decides where the document goes next."""
+        intent = pending.intent
+        with self._stats_lock:
+            self.intent_stats[pending.intent_source] += 1
+        if pending.intent_source == "llm" and self.local_classifier is not None:
+            # Same text train_from_memory reads back from the log, so the model keeps improving between restarts
+            self.local_classifier.learn(pending.content_for_intent[:CONTENT_EXCERPT_CHARS], intent)
+        thread_id = pending.thread_id
+        document = pending.document
+        filename = document.filename
+        source_type = document.file_format
+        # This will be passed to next agent. Full PDF text is deferred until routing needs it.
+        initial_content_for_processing = document.routing_content if source_type != "PDF" else None
+        # Documents read from a path (e.g. spooled uploads) aren't loaded just to pass their bytes along
+        raw_bytes_content = document.raw_bytes if document.filepath is None else None
 
         log_entry = {
             "thread_id": thread_id,
             "source": filename,
             "classified_format": source_type,
             "classified_intent": intent,
+            "content_hash": document.content_hash,
+            "intent_source": pending.intent_source,
+            "intent_confidence": pending.intent_confidence,
+            "content_excerpt": pending.content_for_intent[:CONTENT_EXCERPT_CHARS],
             "status": "Classified"
         }
         self.memory.add_log(self.name, log_entry)
@@ -156,22 +475,30 @@ class ClassifierAgent:
             "source_filename": filename,
             "classified_format": source_type,
             "classified_intent": intent,
+            "content_hash": document.content_hash,
             "initial_sender": initial_content_for_processing.get("sender") if isinstance(initial_content_for_processing, dict) else None
         })
-
         # Data to be routed
         routing_data = {
             "thread_id": thread_id,
             "original_filename": filename,
             "classified_format": source_type,
             "classified_intent": intent,
+            "content_hash": document.content_hash, # Registered by the Orchestrator once processing succeeded
             "content": initial_content_for_processing, # This is the parsed content
-            "raw_bytes_content": raw_bytes_content # For agents that might need original bytes (e.g. PDF agent)
+            "raw_bytes_content": raw_bytes_content, # For agents that might need original bytes (e.g. PDF agent)
+            "source_filepath": document.filepath, # Set instead of raw_bytes_content for documents on disk
         }
+        if pending.email_analysis:
+            routing_data["email_analysis"] = pending.email_analysis
 
         # Determine target agent
         target_agent_name = None
-        if source_type == "JSON":
+        if document.is_bulk_json: # NDJSON / JSON array: JSONAgent streams and handles each record
+            target_agent_name = "JSONAgent"
+            routing_data["records"] = document.iter_json_records
+            routing_data["classify_record"] = self.classify_json_record
+        elif source_type == "JSON":
             target_agent_name = "JSONAgent"
         elif source_type == "EMAIL" or (source_type == "TEXT" and intent not in ["Invoice", "RFQ", "Regulation"]): # TEXT could be email-like
             target_agent_name = "EmailAgent"
@@ -183,9 +510,8 @@ class ClassifierAgent:
             # The prompt says "routes to correct agent". Email and JSON are the only processing agents specified.
             if intent in ["Complaint", "Query", "Order","RFQ"]: # If PDF's intent aligns with email agent's capabilities
                 target_agent_name = "EmailAgent"
-                # Ensure content for EmailAgent is text
-                if not isinstance(routing_data["content"], str):
-                    routing_data["content"] = extract_text_from_pdf(input_data) if is_filepath else ""
+                with stage("parse"):
+                    routing_data["content"] = document.pdf_text # Full text is only extracted for routed PDFs
             else:
                 print(f"Classifier: PDF with intent '{intent}' has no specific processing agent beyond classification. Logging only.")
                 # No specific agent to route to based on current setup for PDF + (Invoice/RFQ/Regulation etc.)
@@ -193,4 +519,45 @@ class ClassifierAgent:
             print(f"Classifier: No specific agent for format '{source_type}' and intent '{intent}'. Logging only.")
 
         return target_agent_name, routing_data, thread_id
-    
\ No newline at end of file
+
+    def _replay_duplicate(self, thread_id: str, document: ParsedDocument, original: dict):
+        """
+        Records a redelivered document under its own thread_id by copying the original
+        thread's classification, agent outputs and context. No parsing or LLM calls.
+        """
+        original_thread_id = original["thread_id"]
+        filename = document.filename
+        print(f"Classifier: '{filename}' is identical to the document processed in thread {original_thread_id}. Reusing its results.")
+
+        self.memory.add_log(self.name, {
+            "thread_id": thread_id,
+            "source": filename,
+            "classified_format": original["classified_format"],
+            "classified_intent": original["classified_intent"],
+            "content_hash": document.content_hash,
+            "duplicate_of": original_thread_id,
+            "status": "Duplicate"
+        })
+        for log in self.memory.get_logs_by_thread_id(original_thread_id):
+            if log.get("agent_name") == self.name:
+                continue # Replaced by the Duplicate entry above
+            details = {k: v for k, v in log.items() if k not in _REPLAY_SKIP_FIELDS}
+            details.update({"thread_id": thread_id, "source": filename, "duplicate_of": original_thread_id})
+            self.memory.add_log(log["agent_name"], details)
+
+        context = self.memory.get_context(original_thread_id)
+        context.update({
+            "source_filename": filename,
+            "duplicate_of": original_thread_id,
+            "content_hash": document.content_hash,
+        })
+        self.memory.update_context(thread_id, context)
+
+        routing_data = {
+            "thread_id": thread_id,
+            "original_filename": filename,
+            "classified_format": original["classified_format"],
+            "classified_intent": original["classified_intent"],
+            "duplicate_of": original_thread_id,
+        }
+        return None, routing_data, thread_id # Nothing to route, the outputs already exist
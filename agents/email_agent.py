@@ -1,6 +1,7 @@
 # agents/email_agent.py
 from memory.shared_memory import global_shared_memory
-from utils.llm_client import generate_text_gemini
+from utils.llm_client import generate_text_gemini, generate_text_gemini_async
+import asyncio
 import re
 import json
 
@@ -17,6 +18,28 @@ class EmailAgent:
         return match.group(0) if match else text_sender_field # Return full if no email found
 
     def process(self, data_payload: dict):
+        email = self._prepare(data_payload)
+        if email is None:
+            return # Error already logged
+        if data_payload.get("email_analysis"): # Already answered by the classifier's combined prompt
+            llm_response_str = json.dumps(data_payload["email_analysis"])
+        else:
+            llm_response_str = generate_text_gemini(self._build_prompt(email))
+        self._finish(email, llm_response_str)
+
+    async def process_async(self, data_payload: dict):
+        """process() for asyncio callers; only the LLM call is awaited on the event loop."""
+        email = await asyncio.to_thread(self._prepare, data_payload)
+        if email is None:
+            return
+        if data_payload.get("email_analysis"):
+            llm_response_str = json.dumps(data_payload["email_analysis"])
+        else:
+            llm_response_str = await generate_text_gemini_async(self._build_prompt(email))
+        await asyncio.to_thread(self._finish, email, llm_response_str)
+
+    def _prepare(self, data_payload: dict) -> dict:
+        """Pulls sender/subject/body out of the payload. Returns None (after logging) if unusable."""
         thread_id = data_payload.get("thread_id")
         intent = data_payload.get("classified_intent")
         filename = data_payload.get("original_filename", "N/A")
@@ -45,7 +68,7 @@ class EmailAgent:
                 "error": error_msg, "details": f"Expected dict or str, got {type(email_content_data)}"
             })
             self.memory.update_context(thread_id, {"email_agent_status": "Error", "email_agent_error": error_msg})
-            return
+            return None
 
         if not body.strip():
             error_msg = "Email body is empty."
@@ -54,8 +77,15 @@ class EmailAgent:
                 "error": error_msg, "extracted_sender": sender, "extracted_subject": subject
             })
             self.memory.update_context(thread_id, {"email_agent_status": "Error", "email_agent_error": error_msg})
-            return
+            return None
 
+        return {
+            "thread_id": thread_id, "intent": intent, "filename": filename,
+            "sender": sender, "subject": subject, "body": body
+        }
+
+    def _build_prompt(self, email: dict) -> str:
+        sender, subject, body = email["sender"], email["subject"], email["body"]
         # Use LLM to determine urgency and format for CRM
         prompt = f"""
         Analyze the following email content:
@@ -79,7 +109,12 @@ class EmailAgent:
           "entities": ["System X", "John Doe", "Main St Office"]
         }}
         """
-        llm_response_str = generate_text_gemini(prompt)
+        return prompt
+
+    def _finish(self, email: dict, llm_response_str: str):
+        """Parses the LLM answer and records the CRM-formatted result."""
+        thread_id, intent, filename = email["thread_id"], email["intent"], email["filename"]
+        sender, subject, body = email["sender"], email["subject"], email["body"]
 
         # Attempt to parse the LLM response (it should be JSON)
         crm_data = {}
@@ -1,99 +1,282 @@
 # agents/json_agent.py
 from memory.shared_memory import global_shared_memory
+from utils.json_stream import LazyJSONObject, LazyJSONArray
+from utils.schema_validation import AnomalyAggregator, compile_schemas, load_schema_config
+import asyncio
+import os
+import sqlite3
+import time
+from collections import Counter
+from collections.abc import Mapping
 # from utils.llm_client import generate_text_gemini # If LLM is needed for complex reformatting
 
+# Target schemas keyed by lower-cased intent. item_schemas gives the expected types of the
+# objects in an array field. JSON_SCHEMAS_PATH replaces these with a JSON config file
+# (see utils.schema_validation.load_schema_config).
+TARGET_SCHEMAS = {
+    "invoice": {
+        "required_fields": ["invoice_id", "customer_name", "total_amount", "issue_date", "items"],
+        "item_schemas": {"items": {"name": str, "quantity": int, "unit_price": float}}
+    },
+    "rfq": {
+        "required_fields": ["rfq_id", "company_name", "request_details", "submission_deadline"],
+        "item_schemas": {"request_details": {"item_description": str, "quantity_needed": int}}
+    }
+    # Add other schemas as needed
+}
+JSON_SCHEMAS_PATH = os.getenv("JSON_SCHEMAS_PATH")
+if JSON_SCHEMAS_PATH:
+    TARGET_SCHEMAS = load_schema_config(JSON_SCHEMAS_PATH)
+COMPILED_SCHEMAS = compile_schemas(TARGET_SCHEMAS) # Compiled once, shared by every JSONAgent
+
+# Share of a schema's required fields a document must contain to be recognised as that schema
+SCHEMA_MATCH_THRESHOLD = float(os.getenv("JSON_SCHEMA_MATCH_THRESHOLD", 0.75))
+# Items kept in the log per array field of a streamed (LazyJSONObject) document; all of them are validated
+STREAMED_ITEMS_SAMPLE = int(os.getenv("JSON_STREAMED_ITEMS_SAMPLE", 100))
+# Bulk mode (NDJSON / JSON arrays): records per logs+contexts transaction, and how many records
+# with anomalies are listed in the file's summary log
+BULK_WRITE_BATCH_SIZE = int(os.getenv("JSON_BULK_WRITE_BATCH_SIZE", 500))
+BULK_ANOMALY_SAMPLE = 20
+
+
+def match_json_schema(json_data, schemas: dict = None) -> tuple:
+    """
+    Scores a JSON object's top-level keys against each schema's required fields.
+    Returns (schema_key, score) for the best match, or (None, 0.0) when nothing matches
+    or two schemas tie.
+    """
+    if not isinstance(json_data, Mapping): # dict or LazyJSONObject
+        return None, 0.0
+    schemas = TARGET_SCHEMAS if schemas is None else schemas
+    keys = set(json_data)
+    scores = []
+    for schema_key, schema_config in schemas.items():
+        required = schema_config["required_fields"]
+        if required:
+            scores.append((len(keys.intersection(required)) / len(required), schema_key))
+    if not scores:
+        return None, 0.0
+    scores.sort(reverse=True)
+    best_score, best_key = scores[0]
+    if best_score == 0 or (len(scores) > 1 and scores[1][0] == best_score):
+        return None, 0.0
+    return best_key, best_score
+
+
+def _count_and_sample(items, counts: dict) -> list:
+    """Streams items once, counting them into counts["total"] and keeping the first STREAMED_ITEMS_SAMPLE."""
+    sample = []
+    for item in items:
+        counts["total"] += 1
+        if len(sample) < STREAMED_ITEMS_SAMPLE:
+            sample.append(item)
+    return sample
+
+
 class JSONAgent:
-    def __init__(self, memory=global_shared_memory):
+    def __init__(self, memory=global_shared_memory, schemas: dict = None):
         self.memory = memory
         self.name = "JSONAgent"
-        # Example target schema (could be loaded from a config file)
-        self.target_schema = {
-            "invoice": {
-                "required_fields": ["invoice_id", "customer_name", "total_amount", "issue_date", "items"],
-                "item_schema": {"name": str, "quantity": int, "unit_price": float}
-            },
-            "rfq": {
-                "required_fields": ["rfq_id", "company_name", "request_details", "submission_deadline"],
-                "details_schema": {"item_description": str, "quantity_needed": int}
-            }
-            # Add other schemas as needed
-        }
+        self.target_schema = TARGET_SCHEMAS if schemas is None else schemas
+        self.compiled_schemas = COMPILED_SCHEMAS if schemas is None else compile_schemas(schemas)
 
     def process(self, data_payload: dict):
+        if data_payload.get("records") is not None: # NDJSON / JSON array, see process_bulk
+            self.process_bulk(data_payload)
+            return
         thread_id = data_payload.get("thread_id")
-        original_json = data_payload.get("content")
-        intent = data_payload.get("classified_intent")
-        filename = data_payload.get("original_filename", "N/A")
+        log_entry, context_update = self.evaluate(
+            data_payload.get("content"), data_payload.get("classified_intent"),
+            thread_id, data_payload.get("original_filename", "N/A"),
+        )
+        self.memory.add_log(self.name, log_entry)
+        self.memory.update_context(thread_id, context_update)
 
-        if not isinstance(original_json, dict):
+    def evaluate(self, original_json, intent: str, thread_id: str, filename: str) -> tuple:
+        """Validates one JSON document against the schema for its intent. Returns (log_entry, context_update)."""
+        if not isinstance(original_json, Mapping): # dict, or LazyJSONObject for large documents
             error_msg = "Invalid data: Expected a JSON dictionary."
-            self.memory.add_log(self.name, {
+            log_entry = {
                 "thread_id": thread_id, "source": filename, "status": "Error",
                 "error": error_msg, "details": "Input was not a dictionary"
-            })
-            self.memory.update_context(thread_id, {"json_agent_status": "Error", "json_agent_error": error_msg})
-            return
+            }
+            return log_entry, {"json_agent_status": "Error", "json_agent_error": error_msg}
 
         extracted_data = {}
-        anomalies = []
+        anomalies = AnomalyAggregator()
+        item_counts = {} # Array field -> {"total", "valid"}
         processed_successfully = False
+        streamed = isinstance(original_json, LazyJSONObject)
 
         # Determine schema based on intent (simplified)
         schema_key = intent.lower() if intent else None
-        current_schema_config = self.target_schema.get(schema_key)
+        schema = self.compiled_schemas.get(schema_key)
 
-        if not current_schema_config:
+        if not schema:
             anomaly_msg = f"No target schema defined for intent: {intent}. Processing as generic JSON."
-            anomalies.append(anomaly_msg)
-            extracted_data = original_json # Store original if no schema
+            anomalies.add("document", "no_schema", anomaly_msg)
+            extracted_data = dict(original_json) if streamed else original_json # Store original if no schema
             # In a real system, you might have a default extraction or use LLM to guess structure
         else:
             # Validate required fields
-            missing_fields = [field for field in current_schema_config["required_fields"] if field not in original_json]
+            missing_fields = schema.missing_fields(original_json)
             if missing_fields:
-                anomalies.append(f"Missing required fields: {', '.join(missing_fields)}")
+                anomalies.add("document", "missing_required_fields", f"Missing required fields: {', '.join(missing_fields)}")
 
             # Extract fields based on schema (simple extraction)
-            for field in current_schema_config["required_fields"]:
+            for field in schema.required_fields:
                 if field in original_json:
                     extracted_data[field] = original_json[field]
                 # else: already handled by missing_fields
 
-            # Example: Basic type checking for items in an invoice
-            if schema_key == "invoice" and "items" in extracted_data and isinstance(extracted_data["items"], list):
-                valid_items = []
-                for i, item in enumerate(extracted_data["items"]):
-                    if not isinstance(item, dict):
-                        anomalies.append(f"Item {i+1} is not a valid object.")
-                        continue
-                    
-                    item_valid = True
-                    for key, expected_type in current_schema_config["item_schema"].items():
-                        if key not in item:
-                            anomalies.append(f"Item {i+1} missing field: {key}")
-                            item_valid = False
-                        elif not isinstance(item[key], expected_type):
-                            anomalies.append(f"Item {i+1} field '{key}' has incorrect type (expected {expected_type.__name__}, got {type(item[key]).__name__})")
-                            item_valid = False
-                    if item_valid:
-                         valid_items.append(item)
-                extracted_data["items"] = valid_items # only keep valid structure items or transformed items
+            # Type-check the objects of each array field with the compiled item validators
+            for field, validator in schema.item_validators.items():
+                if field not in extracted_data:
+                    continue
+                items = extracted_data[field]
+                if not isinstance(items, (list, LazyJSONArray)):
+                    anomalies.add(field, "not_array", f"Field '{field}' is not a list.")
+                    continue
+                # Only valid items are kept; a streamed document keeps a sample of them
+                valid_items, valid_count, total = validator.validate(
+                    items, anomalies, keep_valid=STREAMED_ITEMS_SAMPLE if streamed else None
+                )
+                extracted_data[field] = valid_items
+                item_counts[field] = {"total": total, "valid": valid_count}
 
             # Add more specific validation/reformatting as needed
             processed_successfully = not missing_fields # Simple success condition
 
+        if streamed: # Remaining arrays are counted and sampled, never loaded whole
+            for field, value in extracted_data.items():
+                if isinstance(value, LazyJSONArray):
+                    item_counts[field] = {"total": 0, "valid": None}
+                    extracted_data[field] = _count_and_sample(value, item_counts[field])
+
         log_entry = {
             "thread_id": thread_id,
             "source": filename,
             "intent": intent,
-            "status": "Processed" if processed_successfully and not anomalies else "ProcessedWithAnomalies",
+            "status": "Processed" if processed_successfully and not anomalies.total else "ProcessedWithAnomalies",
             "extracted_data": extracted_data,
-            "anomalies": anomalies
+            "anomalies": anomalies.samples, # The first ANOMALY_SAMPLE_LIMIT messages
+            "anomaly_counts": anomalies.counts, # {field: {kind: count}} over all of them
+            "item_counts": item_counts,
         }
-        self.memory.add_log(self.name, log_entry)
-        self.memory.update_context(thread_id, {
+        context_update = {
             "json_agent_status": log_entry["status"],
             "last_extracted_json_fields": list(extracted_data.keys()),
-            "json_anomalies_count": len(anomalies)
-        })
-        
\ No newline at end of file
+            "json_anomalies_count": anomalies.total
+        }
+        return log_entry, context_update
+
+    def _match_record_intent(self, record) -> tuple:
+        """Default bulk classification: the matching schema key, or None."""
+        schema_key, score = match_json_schema(record, self.target_schema)
+        if schema_key and score >= SCHEMA_MATCH_THRESHOLD:
+            return schema_key, "schema", round(score, 3)
+        return None, "none", None
+
+    def process_bulk(self, data_payload: dict):
+        """
+        Bulk mode for NDJSON and JSON-array files. data_payload["records"]() streams
+        (record_number, record, error) tuples; every record is classified with
+        data_payload["classify_record"] and validated as its own thread, linked to the
+        file's thread by parent_thread_id. Logs and contexts are written
+        BULK_WRITE_BATCH_SIZE records per transaction, and the file's thread gets a summary.
+        Records whose batch could not be stored are counted as records_lost and mark the file "Error".
+        """
+        parent_thread_id = data_payload.get("thread_id")
+        filename = data_payload.get("original_filename", "N/A")
+        classify_record = data_payload.get("classify_record") or self._match_record_intent
+
+        started = time.perf_counter()
+        statuses = Counter()
+        records = records_with_anomalies = records_lost = 0
+        write_error = None
+        anomalous_records = [] # Capped sample
+        logs, contexts = [], {}
+
+        def write_batch():
+            nonlocal records_lost, write_error
+            try:
+                self.memory.add_logs(logs)
+                self.memory.update_contexts(contexts)
+            except sqlite3.Error as e: # Keep going; the summary reports what was lost
+                print(f"JSONAgent: could not store {len(logs)} records from '{filename}': {e}")
+                records_lost += len(logs)
+                write_error = str(e)
+            logs.clear()
+            contexts.clear()
+
+        for record_number, record, error in data_payload["records"]():
+            records += 1
+            thread_id = self.memory.generate_thread_id()
+            source = f"{filename}#{record_number}"
+            if error is not None:
+                intent, intent_source, confidence = None, "none", None
+                error_msg = f"Invalid JSON record: {error}"
+                log_entry = {"thread_id": thread_id, "source": source, "status": "Error", "error": error_msg}
+                context_update = {"json_agent_status": "Error", "json_agent_error": error_msg}
+            else:
+                intent, intent_source, confidence = classify_record(record)
+                log_entry, context_update = self.evaluate(record, intent, thread_id, source)
+            log_entry.update({"parent_thread_id": parent_thread_id, "record_number": record_number,
+                              "intent": intent, "intent_source": intent_source, "intent_confidence": confidence})
+            logs.append((self.name, log_entry))
+            contexts[thread_id] = {
+                "source_filename": source, "classified_format": "JSON", "classified_intent": intent,
+                "parent_thread_id": parent_thread_id, "record_number": record_number, **context_update,
+            }
+
+            statuses[log_entry["status"]] += 1
+            anomaly_count = context_update.get("json_anomalies_count", 1) # Errors count as one
+            if anomaly_count:
+                records_with_anomalies += 1
+                if len(anomalous_records) < BULK_ANOMALY_SAMPLE:
+                    anomalous_records.append({
+                        "record_number": record_number, "thread_id": thread_id, "status": log_entry["status"],
+                        "anomalies_count": anomaly_count,
+                        "anomalies": log_entry.get("anomalies", [log_entry.get("error")])[:3],
+                    })
+            if len(logs) >= BULK_WRITE_BATCH_SIZE:
+                write_batch()
+        write_batch()
+
+        elapsed = time.perf_counter() - started
+        records_per_second = round(records / elapsed, 1) if elapsed > 0 else None
+        if records_lost:
+            status = "Error"
+        else:
+            status = "BulkProcessedWithAnomalies" if records_with_anomalies else "BulkProcessed"
+        summary = {
+            "thread_id": parent_thread_id,
+            "source": filename,
+            "status": status,
+            "records": records,
+            "records_lost": records_lost,
+            "records_by_status": dict(statuses),
+            "records_with_anomalies": records_with_anomalies,
+            "records_per_second": records_per_second,
+            "elapsed_s": round(elapsed, 3),
+            "anomalous_records": anomalous_records,
+        }
+        context_update = {
+            "json_agent_status": status,
+            "bulk_records": records,
+            "bulk_records_lost": records_lost,
+            "bulk_records_with_anomalies": records_with_anomalies,
+            "bulk_records_per_second": records_per_second,
+        }
+        if records_lost:
+            error_msg = f"{records_lost} of {records} records could not be stored: {write_error}"
+            summary["error"] = error_msg
+            context_update["json_agent_error"] = error_msg
+        self.memory.add_log(self.name, summary)
+        self.memory.update_context(parent_thread_id, context_update)
+        print(f"JSONAgent: {records} records from '{filename}' in {elapsed:.2f}s "
+              f"({records_per_second} records/s), {records_with_anomalies} with anomalies, {records_lost} lost.")
+
+    async def process_async(self, data_payload: dict):
+        """No LLM involved, so the async path just keeps validation off the event loop."""
+        await asyncio.to_thread(self.process, data_payload)
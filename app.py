@@ -1,12 +1,19 @@
 # app.py (or web_app.py)
-from flask import Flask, request, render_template, jsonify, redirect, url_for
+from flask import Flask, Request, Response, request, render_template, jsonify, redirect, url_for
+import io
 import os
-import tempfile # To temporarily save uploaded files
+import tempfile
 
 # Adjust import paths if your main orchestrator logic is in a different structure
 # Assuming main.py contains the Orchestrator and it can be imported or its logic can be called
 from main import Orchestrator # You might need to refactor main.py to make Orchestrator easily callable
-from memory.shared_memory import global_shared_memory # Assuming this is your SQLite memory
+from memory.shared_memory import global_shared_memory, DEFAULT_LOG_PAGE_SIZE, MAX_LOG_PAGE_SIZE # Assuming this is your SQLite memory
+from utils.metrics import render_prometheus
+from utils.jobs import (
+    ByteBudget, JobManager, JobQueueFull, DEFAULT_JOB_WORKERS, DEFAULT_MAX_PENDING_JOBS, DEFAULT_MAX_QUEUED_BYTES,
+    DONE, FAILED
+)
+from utils.file_parser import spool_upload, UPLOAD_SPOOL_THRESHOLD
 
 # --- IMPORTANT REFACTORING NOTE ---
 # Your main.py currently uses argparse and runs directly.
@@ -37,8 +44,16 @@ from memory.shared_memory import global_shared_memory # Assuming this is your SQ
 #     return {"error": "Processing completed, but could not retrieve specific results."}
 
 
+class UploadRequest(Request):
+    """Keeps uploads up to UPLOAD_SPOOL_THRESHOLD in memory (werkzeug's default rolls over to disk at 500KB)."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_THRESHOLD, mode="rb+")
+
+
 app = Flask(__name__)
-UPLOAD_FOLDER = 'uploads_temp' # Create this folder or use tempfile
+app.request_class = UploadRequest
+UPLOAD_FOLDER = 'uploads_temp' # Only uploads above UPLOAD_SPOOL_THRESHOLD are written here
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -48,12 +63,33 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Let's assume your Orchestrator is designed to be called multiple times.
 orchestrator_instance = Orchestrator(global_shared_memory) # Assuming Orchestrator can be used this way
 
+# Documents are processed in the background so a request never waits on PDF parsing or the LLM.
+# The pool bounds concurrent pipelines; beyond JOB_MAX_PENDING queued jobs new uploads are refused.
+JOB_WORKERS = int(os.getenv("APP_JOB_WORKERS", DEFAULT_JOB_WORKERS))
+JOB_MAX_PENDING = int(os.getenv("APP_JOB_MAX_PENDING", DEFAULT_MAX_PENDING_JOBS))
+job_manager = JobManager(max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+# Uploads below the spool threshold are queued as bytes until their jobs finish. Once they hold this much
+# in total, further uploads are spooled to disk too, so a full queue can't hold JOB_MAX_PENDING x 8MB.
+upload_memory = ByteBudget(int(os.getenv("APP_MAX_QUEUED_UPLOAD_BYTES", DEFAULT_MAX_QUEUED_BYTES)))
+
+def process_job(input_data, is_filepath, source_filename):
+    """Runs one document through the orchestrator on a job worker and returns its thread_id."""
+    thread_id = orchestrator_instance.process_input(input_data, is_filepath=is_filepath, filename=source_filename)
+    if not thread_id: # Fails the job; another document's thread must never be shown for this one
+        raise RuntimeError(f"Processing '{source_filename}' did not produce a thread.")
+    return thread_id
+
+def remove_spooled_upload(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        results = None
         error_message = None
-        thread_id_processed = None
+        job_id = None
 
         input_type = request.form.get('inputType')
 
@@ -62,58 +98,51 @@ def index():
                 file = request.files['inputFile']
                 if file.filename == '':
                     error_message = 'No selected file'
-                if file:
-                    # Save the file temporarily
-                    filename = file.filename
-                    temp_filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(temp_filepath)
-
-                    # Process the file
-                    # You'll need to adapt your orchestrator to return structured results
-                    # or fetch them from shared_memory using a thread_id
-                    orchestrator_instance.process_input(temp_filepath, is_filepath=True)
-                    
-                    # Find the thread_id for the processed item
-                    # This is a bit tricky if process_input doesn't return it.
-                    # We might need to fetch the *latest* log.
-                    all_logs_after_processing = global_shared_memory.get_all_logs()
-                    if all_logs_after_processing:
-                         # Find logs related to this specific filename if possible, or just take latest
-                        for log in reversed(all_logs_after_processing):
-                            if log.get("source_filename") == filename:
-                                thread_id_processed = log.get("thread_id")
-                                break
-                        if not thread_id_processed: # fallback to very last one
-                            thread_id_processed = all_logs_after_processing[-1].get("thread_id")
-
-
-                    os.remove(temp_filepath) # Clean up temp file
+                else:
+                    # Typical uploads are handed to the job as bytes; large ones, or any once queued uploads
+                    # use up upload_memory, go to a uniquely named temp file, so concurrent uploads of the
+                    # same filename don't clash
+                    filename = os.path.basename(file.filename)
+                    spool_dir = app.config['UPLOAD_FOLDER']
+                    data, spooled_path = spool_upload(file.stream, filename, UPLOAD_SPOOL_THRESHOLD, spool_dir)
+                    if spooled_path is None and not upload_memory.try_reserve(len(data)):
+                        data, spooled_path = spool_upload(io.BytesIO(data), filename, 0, spool_dir)
+                    if spooled_path is None:
+                        size = len(data)
+                        try:
+                            job_id = job_manager.submit(process_job, data, False, filename, description=filename,
+                                                        on_done=lambda: upload_memory.release(size))
+                        except JobQueueFull:
+                            upload_memory.release(size)
+                            raise
+                    else:
+                        try:
+                            job_id = job_manager.submit(
+                                process_job, spooled_path, True, filename, description=filename,
+                                on_done=lambda: remove_spooled_upload(spooled_path), # Clean up temp file
+                            )
+                        except JobQueueFull:
+                            remove_spooled_upload(spooled_path)
+                            raise
 
             elif input_type == 'text' and 'inputText' in request.form:
                 raw_text = request.form['inputText']
                 if not raw_text.strip():
                     error_message = "Raw text input is empty"
                 else:
-                    # Process raw text
-                    orchestrator_instance.process_input(raw_text, is_filepath=False)
-                    all_logs_after_processing = global_shared_memory.get_all_logs()
-                    if all_logs_after_processing:
-                        # Assuming raw text processing creates a log with source "raw_input" or similar
-                        for log in reversed(all_logs_after_processing):
-                            if log.get("source_filename") == "raw_input": # Match how raw inputs are logged
-                                thread_id_processed = log.get("thread_id")
-                                break
-                        if not thread_id_processed: # fallback
-                             thread_id_processed = all_logs_after_processing[-1].get("thread_id")
+                    # Raw text processing creates a log with source "raw_input"
+                    job_id = job_manager.submit(process_job, raw_text, False, "raw_input", description="raw_input")
             else:
                 error_message = "Invalid input method or missing data."
 
-            if thread_id_processed:
-                 return redirect(url_for('show_results', thread_id=thread_id_processed))
+            if job_id:
+                return redirect(url_for('show_job', job_id=job_id))
             elif error_message:
                  return render_template('index.html', error_message=error_message, recent_logs=get_recent_logs())
 
-
+        except JobQueueFull as e:
+            error_message = f"The server is busy: {e}"
+            return render_template('index.html', error_message=error_message, recent_logs=get_recent_logs()), 503
         except Exception as e:
             print(f"Error during processing: {e}")
             import traceback
@@ -123,6 +152,34 @@ def index():
 
     return render_template('index.html', recent_logs=get_recent_logs())
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """JSON status of a submitted document: queued, running, done (with results_url) or failed."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"job_id": job_id, "error": "Unknown job"}), 404
+    thread_id = job["result"]
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "description": job["description"],
+        "thread_id": thread_id,
+        "error": job["error"] or (None if job["status"] != DONE or thread_id else "No thread was created for this input."),
+        "results_url": url_for('show_results', thread_id=thread_id) if thread_id else None,
+        "submitted_at": job["submitted_at"],
+        "finished_at": job["finished_at"],
+    })
+
+@app.route('/jobs/<job_id>/view')
+def show_job(job_id):
+    # Polls /jobs/<job_id> and moves on to the results page once processing is done
+    job = job_manager.get(job_id)
+    if job is None:
+        return render_template('index.html', error_message="Unknown job.", recent_logs=get_recent_logs()), 404
+    if job["status"] == DONE and job["result"]:
+        return redirect(url_for('show_results', thread_id=job["result"]))
+    return render_template('job.html', job=job, failed=job["status"] == FAILED)
+
 @app.route('/results/<thread_id>')
 def show_results(thread_id):
     thread_logs = global_shared_memory.get_logs_by_thread_id(thread_id)
@@ -133,22 +190,57 @@ def show_results(thread_id):
     json_agent_log = next((log for log in thread_logs if log.get('agent_name') == 'JSONAgent'), None)
     email_agent_log = next((log for log in thread_logs if log.get('agent_name') == 'EmailAgent'), None)
 
+    stage_totals = {} # Milliseconds per stage; llm and memory overlap the stages they ran in
+    for timing in global_shared_memory.get_stage_timings(thread_id):
+        stage_totals[timing['stage']] = stage_totals.get(timing['stage'], 0.0) + timing['duration_ms']
+
     return render_template('results.html',
                            thread_id=thread_id,
                            logs=thread_logs,
                            context=thread_context,
                            classifier_log=classifier_log,
                            json_agent_log=json_agent_log,
-                           email_agent_log=email_agent_log)
+                           email_agent_log=email_agent_log,
+                           stage_totals=stage_totals)
 
 @app.route('/all_logs')
 def view_all_logs():
-    all_logs = global_shared_memory.get_all_logs()
-    return render_template('all_logs.html', logs=all_logs)
+    # Keyset pagination: ?after_id=<last id of previous page>, optional agent/status/source filters
+    limit = max(1, min(request.args.get('limit', DEFAULT_LOG_PAGE_SIZE, type=int), MAX_LOG_PAGE_SIZE))
+    after_id = request.args.get('after_id', type=int)
+    filters = {
+        'agent_name': request.args.get('agent') or None,
+        'status': request.args.get('status') or None,
+        'source_filename': request.args.get('source') or None,
+    }
+    logs = global_shared_memory.query_logs(limit=limit, after_id=after_id, **filters)
+    next_after_id = logs[-1]['id'] if len(logs) == limit else None
+    return render_template('all_logs.html', logs=logs, filters=filters, limit=limit,
+                           next_after_id=next_after_id)
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape endpoint: per-stage duration histograms plus LLM scheduler/cache counters
+    jobs = job_manager.snapshot()
+    job_lines = [
+        "# HELP app_jobs Web jobs by state (finished jobs are counted while retained).",
+        "# TYPE app_jobs gauge",
+    ] + [f'app_jobs{{state="{state}"}} {count}' for state, count in jobs.items() if state != "pending"] + [
+        "# HELP app_queued_upload_bytes Upload bytes held in memory by pending jobs.",
+        "# TYPE app_queued_upload_bytes gauge",
+        f"app_queued_upload_bytes {upload_memory.used}",
+    ]
+    log_writer = global_shared_memory.log_writer_stats()
+    if log_writer is not None: # Write-behind logging enabled
+        job_lines += [
+            "# HELP shared_memory_logs_dropped_total Queued logs that could not be written to SQLite.",
+            "# TYPE shared_memory_logs_dropped_total counter",
+            f"shared_memory_logs_dropped_total {log_writer['dropped']}",
+        ]
+    return Response(render_prometheus() + "\n".join(job_lines) + "\n", mimetype='text/plain; version=0.0.4')
 
 def get_recent_logs(count=5):
-    all_logs = global_shared_memory.get_all_logs()
-    return all_logs[-count:] # Get last 'count' logs
+    return global_shared_memory.get_recent_logs(count) # Last 'count' logs, read via the id index
 
 
 if __name__ == '__main__':
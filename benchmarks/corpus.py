@@ -0,0 +1,196 @@
+# benchmarks/corpus.py
+"""
+Synthetic input corpus for benchmarks: JSON invoices/RFQs of varying size, multi-page
+PDFs and .eml files (some with PDF/JSON attachments). Generation is seeded, so the same
+arguments always produce the same files.
+
+    python -m benchmarks.corpus OUT_DIR [--json 100] [--pdf 20] [--eml 100] [--seed 7]
+"""
+import argparse
+import json
+import os
+import random
+from email.message import EmailMessage
+
+DEFAULT_SEED = 7
+JSON_ITEMS_RANGE = (1, 500) # Line items per JSON invoice / RFQ
+PDF_PAGES_RANGE = (1, 30)
+PDF_LINES_PER_PAGE = 45
+ATTACHMENT_SHARE = 0.3 # Share of .eml files that carry an attachment
+
+_COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella Ltd", "Stark Industries", "Wayne Enterprises", "Hooli"]
+_PRODUCTS = ["Super Widget", "Thingamajig", "Gear Assembly", "Steel Bracket", "Control Unit", "Sensor Kit", "Cable Set"]
+_FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley"]
+
+# (intent, subject template, body sentences). The wording mixes strong cues (which the local
+# rules catch) with vaguer ones (which go to the LLM), like real traffic.
+_EMAIL_TEMPLATES = [
+    ("Order", "Your Order #{ref} has been confirmed!",
+     ["Thank you for your order!", "Your order #{ref} has been confirmed and will be shipped soon.",
+      "Items: {qty}x {product}.", "We appreciate your business."]),
+    ("Complaint", "Problem with delivery {ref}",
+     ["I am writing to make a formal complaint.", "The {product} we received was damaged and the packaging was torn.",
+      "This is unacceptable for a customer of {company}.", "Please arrange a replacement immediately."]),
+    ("RFQ", "RFQ {ref}: {product}",
+     ["We would like to request a quotation for {qty} units of {product}.",
+      "Please provide your pricing and delivery lead time.", "Regards, {name} at {company}."]),
+    ("Query", "Question about {product}",
+     ["Could you tell me whether the {product} is compatible with our current setup?",
+      "We have {qty} units installed at the moment.", "Thanks, {name}."]),
+    ("Invoice", "Invoice {ref} from {company}",
+     ["Please find attached invoice #{ref}.", "The amount due is ${amount}.", "Payment terms are 30 days."]),
+    ("Marketing", "{pct}% off {product} this week only",
+     ["Don't miss our limited-time offer on {product}.", "Save {pct}% off everything in store.",
+      "Click here to unsubscribe from this newsletter."]),
+]
+
+_PDF_TOPICS = [
+    ("INVOICE", ["Invoice number: {ref}", "Bill to: {company}", "Amount due: ${amount}", "Item: {qty} x {product}"]),
+    ("REQUEST FOR QUOTATION", ["RFQ reference: {ref}", "Issued by: {company}", "Quantity needed: {qty} of {product}",
+                               "Please send your quotation before the submission deadline."]),
+    ("REGULATION (EU) No 2016/{qty}", ["Pursuant to Article {pct} the following compliance requirements apply.",
+                                       "Operators of {product} equipment shall keep records.", "This Regulation shall be binding."]),
+]
+
+
+def _fields(rng: random.Random, index: int) -> dict:
+    return {
+        "ref": f"{index:06d}", "company": rng.choice(_COMPANIES), "product": rng.choice(_PRODUCTS),
+        "name": rng.choice(_FIRST_NAMES), "qty": rng.randint(1, 500), "pct": rng.randint(5, 60),
+        "amount": f"{rng.uniform(50, 50000):.2f}",
+    }
+
+
+def make_json_document(rng: random.Random, index: int, items: int) -> dict:
+    """An invoice or RFQ shaped like agents/json_agent.TARGET_SCHEMAS, with the given number of items."""
+    fields = _fields(rng, index)
+    if rng.random() < 0.7:
+        line_items = [
+            {"name": rng.choice(_PRODUCTS), "quantity": rng.randint(1, 100), "unit_price": round(rng.uniform(1, 999), 2)}
+            for _ in range(items)
+        ]
+        return {
+            "invoice_id": f"INV-{fields['ref']}", "customer_name": fields["company"],
+            "total_amount": round(sum(i["quantity"] * i["unit_price"] for i in line_items), 2),
+            "issue_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "items": line_items,
+            "contact_email": f"billing@{fields['company'].split()[0].lower()}.com",
+        }
+    return {
+        "rfq_id": f"RFQ-{fields['ref']}", "company_name": fields["company"],
+        "request_details": [
+            {"item_description": rng.choice(_PRODUCTS), "quantity_needed": rng.randint(1, 1000)} for _ in range(items)
+        ],
+        "submission_deadline": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: list) -> bytes:
+    """Minimal PDF with one Helvetica text page per list of lines (no external PDF writer needed)."""
+    page_count = len(pages)
+    font_id = 3 + 2 * page_count # 1 catalog, 2 page tree, then a page and a content stream per page
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{3 + 2 * i} 0 R" for i in range(page_count)), page_count)).encode("ascii"),
+        font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i, lines in enumerate(pages):
+        page_id, content_id = 3 + 2 * i, 4 + 2 * i
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1", errors="replace")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("ascii")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream_bytes), stream_bytes)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[object_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+def make_pdf_document(rng: random.Random, index: int, page_count: int) -> bytes:
+    title, sentences = rng.choice(_PDF_TOPICS)
+    fields = _fields(rng, index)
+    pages = []
+    for page in range(page_count):
+        lines = [title.format(**fields), f"Page {page + 1} of {page_count}"] if page == 0 else [f"Page {page + 1} of {page_count}"]
+        while len(lines) < PDF_LINES_PER_PAGE:
+            lines.append(rng.choice(sentences).format(**_fields(rng, index)))
+        pages.append(lines)
+    return make_pdf(pages)
+
+
+def make_email(rng: random.Random, index: int, attach: bool) -> bytes:
+    intent, subject, sentences = rng.choice(_EMAIL_TEMPLATES)
+    fields = _fields(rng, index)
+    message = EmailMessage()
+    message["From"] = f"{fields['name']} <{fields['name'].lower()}@{fields['company'].split()[0].lower()}.com>"
+    message["To"] = "inbox@example.org"
+    message["Subject"] = subject.format(**fields)
+    message.set_content("Hello,\n\n" + "\n".join(s.format(**fields) for s in sentences) + "\n")
+    if attach:
+        if rng.random() < 0.5:
+            message.add_attachment(make_pdf_document(rng, index, rng.randint(1, 3)),
+                                   maintype="application", subtype="pdf", filename=f"{fields['ref']}.pdf")
+        else:
+            message.add_attachment(json.dumps(make_json_document(rng, index, rng.randint(1, 20))).encode("utf-8"),
+                                   maintype="application", subtype="json", filename=f"{fields['ref']}.json")
+    return bytes(message)
+
+
+def generate_corpus(out_dir: str, json_count: int = 100, pdf_count: int = 20, eml_count: int = 100,
+                    seed: int = DEFAULT_SEED, json_items_range: tuple = JSON_ITEMS_RANGE,
+                    pdf_pages_range: tuple = PDF_PAGES_RANGE) -> list:
+    """Writes the corpus into out_dir and returns the file paths, interleaved by type."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    by_type = {"json": [], "pdf": [], "eml": []}
+
+    def write(name: str, data: bytes, kind: str):
+        path = os.path.join(out_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        by_type[kind].append(path)
+
+    for i in range(json_count):
+        document = make_json_document(rng, i, rng.randint(*json_items_range))
+        write(f"doc_{i:06d}.json", json.dumps(document).encode("utf-8"), "json")
+    for i in range(pdf_count):
+        write(f"doc_{i:06d}.pdf", make_pdf_document(rng, i, rng.randint(*pdf_pages_range)), "pdf")
+    for i in range(eml_count):
+        write(f"mail_{i:06d}.eml", make_email(rng, i, rng.random() < ATTACHMENT_SHARE), "eml")
+
+    # Interleave so a run sees a realistic mix instead of all JSON first
+    paths = []
+    for i in range(max(json_count, pdf_count, eml_count)):
+        paths.extend(paths_of_kind[i] for paths_of_kind in by_type.values() if i < len(paths_of_kind))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic document corpus.")
+    parser.add_argument("out_dir", help="Directory to write the files into.")
+    parser.add_argument("--json", type=int, default=100, help="Number of JSON invoices/RFQs.")
+    parser.add_argument("--pdf", type=int, default=20, help="Number of multi-page PDFs.")
+    parser.add_argument("--eml", type=int, default=100, help="Number of .eml files.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+    paths = generate_corpus(args.out_dir, args.json, args.pdf, args.eml, args.seed)
+    print(f"Wrote {len(paths)} files to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
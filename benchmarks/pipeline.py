@@ -0,0 +1,209 @@
+# benchmarks/pipeline.py
+"""
+End-to-end pipeline benchmark. Generates a synthetic corpus (benchmarks/corpus.py), runs
+the Orchestrator over it in batch mode against the offline stub LLM, and reports
+throughput, latency percentiles, peak memory and SharedMemory DB growth.
+
+    python -m benchmarks.pipeline --json 200 --pdf 20 --eml 200 --workers 16
+    python -m benchmarks.pipeline ... --save-baseline main     # store as benchmarks/baselines/main.json
+    python -m benchmarks.pipeline ... --compare main           # print the change against it
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource # Unix only; peak RSS is reported as None elsewhere
+except ImportError:
+    resource = None
+
+from benchmarks.corpus import generate_corpus, DEFAULT_SEED
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_WORKERS = 16
+# Metrics compared against a baseline, and whether a higher value is better
+COMPARED_METRICS = {
+    "docs_per_second": True,
+    "latency_ms_p50": False,
+    "latency_ms_p95": False,
+    "latency_ms_p99": False,
+    "peak_rss_mb": False,
+    "peak_traced_mb": False,
+    "db_growth_kb_per_doc": False,
+}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # Bytes on macOS, KiB on Linux
+
+
+def _db_size_bytes(db_path: str) -> int:
+    """Database plus WAL size, after folding the WAL back in so runs compare like for like."""
+    with contextlib.closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    return sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal", "-shm") if os.path.exists(db_path + suffix))
+
+
+def run_benchmark(json_count: int = 100, pdf_count: int = 10, eml_count: int = 100, seed: int = DEFAULT_SEED,
+                  corpus_dir: str = None, mode: str = "thread", workers: int = DEFAULT_WORKERS,
+                  classify_batch_size: int = 1, stub_latency_ms: float = 200, stub_jitter_ms: float = 50,
+                  stub_error_rate: float = 0.0, llm_cache: bool = False, trace_memory: bool = False) -> dict:
+    """Runs one benchmark and returns {"config": ..., "metrics": ...}."""
+    # Imported here so the stub backend is selected before anything creates a model
+    import utils.llm_client as llm_client
+    from utils.llm_cache import global_llm_cache
+    from utils.llm_scheduler import global_llm_scheduler
+    from memory.shared_memory import SharedMemory
+    from main import Orchestrator, run_batch, run_batch_async
+
+    config = {
+        "json": json_count, "pdf": pdf_count, "eml": eml_count, "seed": seed, "corpus_dir": corpus_dir,
+        "mode": mode, "workers": workers, "classify_batch_size": classify_batch_size,
+        "stub_latency_ms": stub_latency_ms, "stub_jitter_ms": stub_jitter_ms, "stub_error_rate": stub_error_rate,
+        "llm_cache": llm_cache,
+    }
+    work_dir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    memory = None
+    try:
+        if corpus_dir:
+            paths = sorted(os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir))
+        else:
+            started = time.perf_counter()
+            paths = generate_corpus(os.path.join(work_dir, "corpus"), json_count, pdf_count, eml_count, seed)
+            print(f"Generated {len(paths)} documents in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        corpus_bytes = sum(os.path.getsize(path) for path in paths)
+
+        llm_client.set_llm_backend("stub")
+        stub = llm_client.get_llm_model()
+        stub.latency_ms, stub.jitter_ms, stub.error_rate = stub_latency_ms, stub_jitter_ms, stub_error_rate
+        calls_before = stub.calls
+        global_llm_cache.enabled = llm_cache
+
+        db_path = os.path.join(work_dir, "bench.db")
+        memory = SharedMemory(db_path)
+        orchestrator = Orchestrator(memory)
+        memory.flush()
+        db_before = _db_size_bytes(db_path)
+        output_path = os.path.join(work_dir, "results.jsonl")
+
+        if trace_memory:
+            tracemalloc.start()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # Per-document prints would dominate
+            if mode == "async":
+                summary = asyncio.run(run_batch_async(orchestrator, paths, workers, output_path, classify_batch_size))
+            else:
+                summary = run_batch(orchestrator, paths, workers, output_path, classify_batch_size)
+            memory.flush()
+        peak_traced = None
+        if trace_memory:
+            peak_traced = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+
+        db_growth = _db_size_bytes(db_path) - db_before
+        log_rows = memory.query_logs(limit=1, newest_first=True)
+        metrics = {
+            "documents": summary["documents"],
+            "failed": summary["failed"],
+            "corpus_mb": round(corpus_bytes / (1024 * 1024), 2),
+            "elapsed_s": summary["elapsed_s"],
+            "docs_per_second": summary["docs_per_second"],
+            "latency_ms_p50": summary["latency_ms_p50"],
+            "latency_ms_p95": summary["latency_ms_p95"],
+            "latency_ms_p99": summary["latency_ms_p99"],
+            "latency_ms_max": summary["latency_ms_max"],
+            "latency_scope": summary["latency_scope"],
+            "llm_calls": stub.calls - calls_before,
+            "llm_skip_rate": summary["llm_skip_rate"],
+            "intent_sources": summary["intent_sources"],
+            "peak_rss_mb": _peak_rss_mb(),
+            "peak_traced_mb": peak_traced,
+            "db_growth_kb": round(db_growth / 1024, 1),
+            "db_growth_kb_per_doc": round(db_growth / 1024 / max(1, summary["documents"]), 2),
+            "log_rows": log_rows[0]["id"] if log_rows else 0,
+            "scheduler": global_llm_scheduler.snapshot(),
+        }
+        return {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "config": config,
+            "metrics": metrics,
+        }
+    finally:
+        if memory is not None:
+            memory.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def save_baseline(name: str, result: dict) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def load_baseline(name: str) -> dict:
+    with open(os.path.join(BASELINE_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, result: dict) -> list:
+    """One row per compared metric: (metric, baseline, current, change %, better?)."""
+    rows = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        old, new = baseline["metrics"].get(metric), result["metrics"].get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        rows.append((metric, old, new, round(change, 1), (change >= 0) == higher_is_better or change == 0))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the document pipeline against the stub LLM.")
+    parser.add_argument("--json", type=int, default=100, help="Synthetic JSON invoices/RFQs.")
+    parser.add_argument("--pdf", type=int, default=10, help="Synthetic multi-page PDFs.")
+    parser.add_argument("--eml", type=int, default=100, help="Synthetic .eml files.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--corpus", type=str, help="Use the files in this directory instead of generating a corpus.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use run_batch_async instead of worker threads.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker threads (or documents in flight with --async).")
+    parser.add_argument("--classify-batch-size", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Stub LLM latency per call.")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Stub LLM latency jitter (+/-).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub LLM calls failing with 429/503.")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache enabled.")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python heap peak (slows the run).")
+    parser.add_argument("--save-baseline", type=str, metavar="NAME", help="Save the result as benchmarks/baselines/NAME.json.")
+    parser.add_argument("--compare", type=str, metavar="NAME", help="Compare the result with a saved baseline.")
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        args.json, args.pdf, args.eml, args.seed, args.corpus, "async" if args.use_async else "thread",
+        args.workers, args.classify_batch_size, args.latency_ms, args.jitter_ms, args.error_rate,
+        args.llm_cache, args.tracemalloc,
+    )
+    print(json.dumps(result, indent=2))
+    if args.compare:
+        print(f"\nCompared with baseline '{args.compare}':")
+        for metric, old, new, change, better in compare(load_baseline(args.compare), result):
+            print(f"  {metric:<22} {old:>10} -> {new:>10}  ({change:+.1f}%{'' if better else ', worse'})")
+    if args.save_baseline:
+        print(f"\nBaseline saved to {save_baseline(args.save_baseline, result)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/startup.py
+"""
+Cold-start benchmark: imports each entry point in a fresh interpreter and reports
+wall time, plus which heavy optional dependencies the import pulled in.
+
+    python -m benchmarks.startup [--runs 5] [--modules main app]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["main", "app"]
+DEFAULT_RUNS = 5
+HEAVY_MODULES = ["google.generativeai", "PyPDF2", "dotenv"] # Should stay unloaded until first use
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": elapsed_ms, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module: str) -> dict:
+    """Imports module in a new interpreter. The API key is unset to check imports don't need it."""
+    env = {k: v for k, v in os.environ.items() if k != "GEMINI_API_KEY"}
+    completed = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr else "import failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(modules: list, runs: int) -> dict:
+    report = {}
+    for module in modules:
+        samples = [measure_import(module) for _ in range(runs)]
+        errors = [s["error"] for s in samples if "error" in s]
+        if errors:
+            report[module] = {"error": errors[0]}
+            continue
+        times = [s["import_ms"] for s in samples]
+        report[module] = {
+            "import_ms_median": round(statistics.median(times), 1),
+            "import_ms_min": round(min(times), 1),
+            "heavy_modules_loaded": samples[-1]["loaded"],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the entry points.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"Fresh interpreters per module (default: {DEFAULT_RUNS}).")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import (default: main app).")
+    args = parser.parse_args()
+    print(json.dumps(run(args.modules, args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
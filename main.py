@@ -1,16 +1,39 @@
 # main.py
 import argparse
+import asyncio
+import glob
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from agents.classifier_agent import ClassifierAgent
 from agents.json_agent import JSONAgent
 from agents.email_agent import EmailAgent
 from memory.shared_memory import global_shared_memory
+from utils.llm_scheduler import global_llm_scheduler
+from utils.metrics import stage, trace_document, global_stage_metrics
+from utils.file_parser import is_in_memory_source
 
 # Ensure project root is in sys.path if running from a sub-directory or for imports
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+RECENT_LOGS_TO_PRINT = 20
+DEFAULT_BATCH_WORKERS = 4
+DEFAULT_BATCH_OUTPUT = "batch_results.jsonl"
+DEFAULT_MAX_IN_FLIGHT = 100 # Documents in flight at once on the async path
+
+
+def is_failed_outcome(classified_intent, agent_status) -> bool:
+    """
+    A document failed when its intent is Unknown (no content, LLM error) or its agent reported
+    an error ("Error", "ProcessedWithLLMError"). Such documents are neither deduplicated nor
+    counted as succeeded in batch summaries.
+    """
+    return (classified_intent or "Unknown").startswith("Unknown") or "Error" in (agent_status or "")
+
+
 class Orchestrator:
     def __init__(self, memory):
         self.memory = memory
@@ -22,11 +45,136 @@ class Orchestrator:
             "EmailAgent": self.email_agent
         }
 
-    def process_input(self, input_data: str, is_filepath=True):
-        print(f"\n🚀 Orchestrator: Processing {'file' if is_filepath else 'raw text'}: {input_data if is_filepath else 'Input Text Snippet'}...")
+    def process_input(self, input_data, is_filepath=True, filename: str = None):
+        """
+        Runs one document through the pipeline and returns its thread_id. input_data is a filepath,
+        raw text (is_filepath=False), or bytes / a binary file-like object named by filename.
+        """
+        print(f"\n🚀 Orchestrator: Processing {self._describe_input(input_data, is_filepath, filename)}...")
+
+        with trace_document() as trace:
+            # 1. Classifier Agent
+            with stage("classify"):
+                target_agent_name, routing_data, thread_id = self.classifier_agent.process(input_data, is_filepath=is_filepath, filename=filename)
+
+            # 2. Route to specific agent
+            with stage("route"):
+                agent_to_run = self._route(target_agent_name, routing_data, thread_id)
+            if agent_to_run is not None:
+                with stage("agent"):
+                    agent_to_run.process(routing_data)
+                print(f"Orchestrator: Processing complete for Thread ID: {thread_id}.")
+                print("="*50)
+            self._register_processed(routing_data, thread_id, agent_to_run)
+        self._record_timings(thread_id, trace.spans)
+        return thread_id
+
+    async def process_input_async(self, input_data, is_filepath=True, filename: str = None):
+        """Same pipeline as process_input, but the LLM calls don't block other documents."""
+        print(f"\n🚀 Orchestrator (async): Processing {self._describe_input(input_data, is_filepath, filename)}...")
+        with trace_document() as trace:
+            with stage("classify"):
+                target_agent_name, routing_data, thread_id = await self.classifier_agent.process_async(input_data, is_filepath=is_filepath, filename=filename)
+
+            with stage("route"):
+                agent_to_run = self._route(target_agent_name, routing_data, thread_id)
+            if agent_to_run is not None:
+                with stage("agent"):
+                    await agent_to_run.process_async(routing_data)
+                print(f"Orchestrator: Processing complete for Thread ID: {thread_id}.")
+                print("="*50)
+            await asyncio.to_thread(self._register_processed, routing_data, thread_id, agent_to_run)
+        await asyncio.to_thread(self._record_timings, thread_id, trace.spans)
+        return thread_id
+
+    async def process_many_async(self, inputs: list, is_filepath=True, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> list:
+        """
+        Runs many documents concurrently on the current event loop, at most max_in_flight at a time.
+        Returns thread_ids in input order; a failed document yields its exception instead.
+        """
+        semaphore = asyncio.Semaphore(max_in_flight)
+        async def run_one(input_data):
+            async with semaphore:
+                return await self.process_input_async(input_data, is_filepath=is_filepath)
+        return await asyncio.gather(*(run_one(item) for item in inputs), return_exceptions=True)
+
+    def process_inputs(self, inputs: list, is_filepath=True) -> list:
+        """
+        Processes a group of inputs, classifying them together in batched LLM calls
+        (see ClassifierAgent.classify_intents_batch). Returns thread_ids in input order.
+        Spans of the shared classification step are recorded under every thread of the group.
+        """
+        print(f"\n🚀 Orchestrator: Processing {len(inputs)} inputs with batched classification...")
+        with trace_document() as batch_trace:
+            with stage("classify"):
+                classified = self.classifier_agent.process_many(inputs, is_filepath=is_filepath)
+        thread_ids = []
+        for target_agent_name, routing_data, thread_id in classified:
+            with trace_document() as trace:
+                with stage("route"):
+                    agent_to_run = self._route(target_agent_name, routing_data, thread_id)
+                if agent_to_run is not None:
+                    with stage("agent"):
+                        agent_to_run.process(routing_data)
+                    print(f"Orchestrator: Processing complete for Thread ID: {thread_id}.")
+                    print("="*50)
+                self._register_processed(routing_data, thread_id, agent_to_run)
+            self._record_timings(thread_id, batch_trace.spans + trace.spans)
+            thread_ids.append(thread_id)
+        return thread_ids
+
+    async def process_inputs_async(self, inputs: list, is_filepath=True) -> list:
+        with trace_document() as batch_trace:
+            with stage("classify"):
+                classified = await self.classifier_agent.process_many_async(inputs, is_filepath=is_filepath)
+        async def finish(target_agent_name, routing_data, thread_id):
+            with trace_document() as trace:
+                with stage("route"):
+                    agent_to_run = self._route(target_agent_name, routing_data, thread_id)
+                if agent_to_run is not None:
+                    with stage("agent"):
+                        await agent_to_run.process_async(routing_data)
+                await asyncio.to_thread(self._register_processed, routing_data, thread_id, agent_to_run)
+            await asyncio.to_thread(self._record_timings, thread_id, batch_trace.spans + trace.spans)
+            return thread_id
+        return await asyncio.gather(*(finish(*item) for item in classified))
+
+    @staticmethod
+    def _describe_input(input_data, is_filepath, filename) -> str:
+        if is_in_memory_source(input_data):
+            return f"upload: {filename}"
+        return f"file: {input_data}" if is_filepath else "raw text: Input Text Snippet"
 
-        # 1. Classifier Agent
-        target_agent_name, routing_data, thread_id = self.classifier_agent.process(input_data, is_filepath=is_filepath)
+    def _record_timings(self, thread_id, spans: list):
+        global_stage_metrics.document_done()
+        if thread_id:
+            self.memory.record_stage_timings(thread_id, spans)
+
+    def _register_processed(self, routing_data, thread_id, agent_run):
+        """
+        Remembers a finished document's content hash so redeliveries reuse its results. Called only
+        after the routed agent returned; failed classifications (Unknown intents, including LLM
+        errors) and agent errors are not remembered, so the next delivery is processed again.
+        """
+        if not self.classifier_agent.dedupe or not routing_data or routing_data.get("duplicate_of"):
+            return
+        content_hash = routing_data.get("content_hash")
+        intent = routing_data.get("classified_intent")
+        agent_status = None
+        if agent_run is not None:
+            context = self.memory.get_context(thread_id)
+            agent_status = context.get("json_agent_status") or context.get("email_agent_status")
+        if not content_hash or is_failed_outcome(intent, agent_status):
+            return
+        self.memory.register_document_hash(content_hash, thread_id, routing_data.get("original_filename"),
+                                           routing_data.get("classified_format"), intent)
+
+    def _route(self, target_agent_name, routing_data, thread_id):
+        """Reports the classifier's decision and returns the agent to run, or None if processing stops here."""
+        if routing_data and routing_data.get("duplicate_of"):
+            print(f"Orchestrator: Duplicate of thread {routing_data['duplicate_of']}. Stored results reused for Thread ID: {thread_id}.")
+            print("="*50)
+            return None
 
         if not target_agent_name or not routing_data:
             print("Orchestrator: Classification did not result in a target agent or data. Halting.")
@@ -34,34 +182,258 @@ class Orchestrator:
 
         print(f"Orchestrator: Classified as Format='{routing_data['classified_format']}', Intent='{routing_data['classified_intent']}'. Routing to {target_agent_name}.")
 
-        # 2. Route to specific agent
         if target_agent_name in self.agents:
-            agent_to_run = self.agents[target_agent_name]
             print(f"Orchestrator: Invoking {target_agent_name}...")
-            agent_to_run.process(routing_data)
-        else:
-            print(f"Orchestrator: No agent named '{target_agent_name}' found or no specific processing needed beyond classification. Task logged.")
+            return self.agents[target_agent_name]
 
+        print(f"Orchestrator: No agent named '{target_agent_name}' found or no specific processing needed beyond classification. Task logged.")
         print(f"Orchestrator: Processing complete for Thread ID: {thread_id}.")
         print("="*50)
-        return thread_id
+        return None
+
 
+def collect_batch_inputs(patterns: list, manifest: str = None, recursive: bool = False) -> list:
+    """
+    Expands files, directories and glob patterns (plus the lines of a manifest file)
+    into a de-duplicated list of file paths, in the order given.
+    """
+    patterns = list(patterns or [])
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"): # Blank lines and comments are skipped
+                    patterns.append(line)
+
+    paths = []
+    seen = set()
+    def add(path):
+        if os.path.isfile(path) and path not in seen:
+            seen.add(path)
+            paths.append(path)
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for root, _, files in os.walk(pattern):
+                    for name in sorted(files):
+                        add(os.path.join(root, name))
+            else:
+                for name in sorted(os.listdir(pattern)):
+                    add(os.path.join(pattern, name))
+        elif os.path.isfile(pattern):
+            add(pattern)
+        else:
+            matches = sorted(glob.glob(pattern, recursive=recursive))
+            if not matches:
+                print(f"Batch: '{pattern}' did not match any files.")
+            for match in matches:
+                add(match)
+    return paths
+
+
+def _batch_result(orchestrator: Orchestrator, path: str, thread_id, error, started: float) -> dict:
+    """Summarises one document's outcome as a JSON-serialisable dict."""
+    result = {
+        "input": path,
+        "thread_id": thread_id,
+        "error": str(error) if error else None,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    if thread_id:
+        context = orchestrator.memory.get_context(thread_id)
+        result.update({
+            "classified_format": context.get("classified_format"),
+            "classified_intent": context.get("classified_intent"),
+            "agent_status": context.get("json_agent_status") or context.get("email_agent_status"),
+            "duplicate_of": context.get("duplicate_of"),
+        })
+        if context.get("bulk_records") is not None: # NDJSON / JSON-array file
+            result.update({
+                "bulk_records": context["bulk_records"],
+                "bulk_records_with_anomalies": context.get("bulk_records_with_anomalies"),
+                "bulk_records_lost": context.get("bulk_records_lost"),
+                "bulk_records_per_second": context.get("bulk_records_per_second"),
+            })
+    return result
+
+
+def _process_for_batch(orchestrator: Orchestrator, path: str) -> dict:
+    started = time.perf_counter()
+    thread_id, error = None, None
+    try:
+        thread_id = orchestrator.process_input(path, is_filepath=True)
+    except Exception as e:
+        error = e
+    return _batch_result(orchestrator, path, thread_id, error, started)
+
+
+async def _process_for_batch_async(orchestrator: Orchestrator, path: str, semaphore: asyncio.Semaphore) -> dict:
+    async with semaphore:
+        started = time.perf_counter()
+        thread_id, error = None, None
+        try:
+            thread_id = await orchestrator.process_input_async(path, is_filepath=True)
+        except Exception as e:
+            error = e
+        return await asyncio.to_thread(_batch_result, orchestrator, path, thread_id, error, started)
+
+
+def _process_chunk_for_batch(orchestrator: Orchestrator, paths: list) -> list:
+    """Runs a group of documents through one batched classification."""
+    started = time.perf_counter()
+    try:
+        thread_ids, error = orchestrator.process_inputs(paths, is_filepath=True), None
+    except Exception as e:
+        thread_ids, error = [None] * len(paths), e
+    return [_batch_result(orchestrator, path, thread_id, error, started) for path, thread_id in zip(paths, thread_ids)]
+
+
+async def _process_chunk_for_batch_async(orchestrator: Orchestrator, paths: list, semaphore: asyncio.Semaphore) -> list:
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            thread_ids, error = await orchestrator.process_inputs_async(paths, is_filepath=True), None
+        except Exception as e:
+            thread_ids, error = [None] * len(paths), e
+        return await asyncio.to_thread(
+            lambda: [_batch_result(orchestrator, path, thread_id, error, started) for path, thread_id in zip(paths, thread_ids)]
+        )
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _result_failed(result: dict) -> bool:
+    return bool(result["error"]) or not result["thread_id"] \
+        or is_failed_outcome(result.get("classified_intent"), result.get("agent_status"))
+
+
+def _batch_summary(orchestrator: Orchestrator, results: list, workers: int, elapsed: float, output_path: str,
+                   classify_batch_size: int = 1) -> dict:
+    """
+    Throughput summary of a batch run. With classify_batch_size > 1 a document's elapsed_ms is
+    that of its whole chunk (its result is only available once the chunk finishes), which
+    latency_scope reports as "chunk".
+    """
+    latencies = sorted(result["elapsed_ms"] for result in results)
+    failed = sum(1 for result in results if _result_failed(result))
+    return {
+        "documents": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_second": round(len(results) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms_p50": _percentile(latencies, 50),
+        "latency_ms_p95": _percentile(latencies, 95),
+        "latency_ms_p99": _percentile(latencies, 99),
+        "latency_ms_max": latencies[-1] if latencies else 0.0,
+        "latency_scope": "chunk" if classify_batch_size > 1 else "document",
+        "intent_sources": dict(orchestrator.classifier_agent.intent_stats),
+        "bulk_record_intent_sources": dict(orchestrator.classifier_agent.bulk_record_intent_stats),
+        "llm_skip_rate": round(orchestrator.classifier_agent.llm_skip_rate, 3),
+        "llm_scheduler": global_llm_scheduler.snapshot(),
+        "output": output_path,
+    }
+
+
+def _chunks(paths: list, size: int) -> list:
+    return [paths[i:i + size] for i in range(0, len(paths), size)]
+
+
+def run_batch(orchestrator: Orchestrator, paths: list, workers: int = DEFAULT_BATCH_WORKERS,
+              output_path: str = DEFAULT_BATCH_OUTPUT, classify_batch_size: int = 1) -> dict:
+    """
+    Processes many documents in one process with a pool of worker threads
+    (the work is dominated by LLM and SQLite I/O). One JSON line per document is
+    written to output_path as it finishes; a throughput summary is returned.
+    With classify_batch_size > 1 each worker takes that many documents and classifies them in batched LLM calls.
+    """
+    started = time.perf_counter()
+    results = []
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        if classify_batch_size > 1:
+            futures = [pool.submit(_process_chunk_for_batch, orchestrator, chunk) for chunk in _chunks(paths, classify_batch_size)]
+        else:
+            futures = [pool.submit(lambda path: [_process_for_batch(orchestrator, path)], path) for path in paths]
+        for future in as_completed(futures):
+            for result in future.result():
+                out.write(json.dumps(result) + "\n")
+                results.append(result)
+            out.flush()
+    return _batch_summary(orchestrator, results, workers, time.perf_counter() - started, output_path, classify_batch_size)
+
+
+async def run_batch_async(orchestrator: Orchestrator, paths: list, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                          output_path: str = DEFAULT_BATCH_OUTPUT, classify_batch_size: int = 1) -> dict:
+    """run_batch on an event loop: up to max_in_flight documents (or chunks) wait on the LLM at the same time."""
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    results = []
+    with open(output_path, "w", encoding="utf-8") as out:
+        if classify_batch_size > 1:
+            tasks = [asyncio.create_task(_process_chunk_for_batch_async(orchestrator, chunk, semaphore))
+                     for chunk in _chunks(paths, classify_batch_size)]
+        else:
+            async def single(path):
+                return [await _process_for_batch_async(orchestrator, path, semaphore)]
+            tasks = [asyncio.create_task(single(path)) for path in paths]
+        for task in asyncio.as_completed(tasks):
+            for result in await task:
+                out.write(json.dumps(result) + "\n")
+                results.append(result)
+            out.flush()
+    return _batch_summary(orchestrator, results, max_in_flight, time.perf_counter() - started, output_path,
+                          classify_batch_size)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Multi-Agent AI System")
-    parser.add_argument("input", type=str, help="Path to the input file (PDF, JSON, TXT/EML) or raw email text if --raw is used.")
+    parser.add_argument("input", type=str, nargs="*", help="Path to the input file (PDF, JSON, TXT/EML) or raw email text if --raw is used. With --batch: files, directories or glob patterns.")
     parser.add_argument("--raw", action="store_true", help="Indicates that the input is raw text content (e.g., email body) instead of a filepath.")
+    parser.add_argument("--batch", action="store_true", help="Process every file matched by the inputs in one run.")
+    parser.add_argument("--manifest", type=str, help="Batch mode: file listing one input path or glob per line.")
+    parser.add_argument("--recursive", action="store_true", help="Batch mode: descend into sub-directories and expand ** in globs.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS, help="Batch mode: number of documents processed concurrently.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Batch mode: run documents on an asyncio event loop; --workers then sets how many are in flight.")
+    parser.add_argument("--classify-batch-size", type=int, default=1, help="Batch mode: classify this many documents per LLM call.")
+    parser.add_argument("--output", type=str, default=DEFAULT_BATCH_OUTPUT, help="Batch mode: JSONL file for per-document results.")
     args = parser.parse_args()
+    batch_mode = args.batch or bool(args.manifest)
 
-    if not args.raw and not os.path.exists(args.input):
-        print(f"Error: File not found at '{args.input}'")
+    if batch_mode:
+        if args.raw:
+            parser.error("--raw cannot be combined with batch mode.")
+        batch_paths = collect_batch_inputs(args.input, args.manifest, args.recursive)
+        if not batch_paths:
+            print("Error: No input files found for batch mode.")
+            exit(1)
+    elif len(args.input) != 1:
+        parser.error("Exactly one input is required unless --batch or --manifest is used.")
+    elif not args.raw and not os.path.exists(args.input[0]):
+        print(f"Error: File not found at '{args.input[0]}'")
         exit(1)
 
     orchestrator = Orchestrator(global_shared_memory)
 
     try:
-        orchestrator.process_input(args.input, is_filepath=not args.raw)
+        if batch_mode:
+            print(f"Batch: processing {len(batch_paths)} documents with {args.workers} {'in flight' if args.use_async else 'workers'}...")
+            if args.use_async:
+                summary = asyncio.run(run_batch_async(orchestrator, batch_paths, max_in_flight=args.workers,
+                                                      output_path=args.output, classify_batch_size=args.classify_batch_size))
+            else:
+                summary = run_batch(orchestrator, batch_paths, workers=args.workers, output_path=args.output,
+                                    classify_batch_size=args.classify_batch_size)
+            print("\n📊 Batch Summary:")
+            print(json.dumps(summary, indent=2))
+        else:
+            orchestrator.process_input(args.input[0], is_filepath=not args.raw)
     except Exception as e:
         print(f"An unexpected error occurred in the orchestrator: {e}")
         import traceback
@@ -69,24 +441,25 @@ if __name__ == "__main__":
    # main.py
 # ...
     finally:
-        print("\n📜 Final Shared Memory Logs:")
-        all_logs = global_shared_memory.get_all_logs() # Fetch logs first
-        for log_entry in all_logs: # Iterate over the fetched logs
-            print(log_entry)
+        if not batch_mode: # Per-document results for batches are in the JSONL output
+            print("\n📜 Recent Shared Memory Logs:")
+            all_logs = global_shared_memory.get_recent_logs(RECENT_LOGS_TO_PRINT) # Only the tail, not the whole table
+            for log_entry in all_logs: # Iterate over the fetched logs
+                print(log_entry)
 
-        print("\n📦 Final Shared Context Data (sample from last thread if logs exist):")
+            print("\n📦 Final Shared Context Data (sample from last thread if logs exist):")
     # for thread_id, context in global_shared_memory.context_data.items(): # Old way
     # print(f"Thread {thread_id}: {context}")
 
     # Example: Get logs and context for the last processed thread_id if available
-        if all_logs: # Check if the fetched list of logs is not empty
-            last_log_entry = all_logs[-1] # Get the last log entry from the list
-            last_thread_id = last_log_entry.get("thread_id")
-            if last_thread_id:
-                print(f"\n🔍 Context for last thread ({last_thread_id}):")
-                print(global_shared_memory.get_context(last_thread_id))
-        else:
-            print("No logs found to retrieve last thread context.")
+            if all_logs: # Check if the fetched list of logs is not empty
+                last_log_entry = all_logs[-1] # Get the last log entry from the list
+                last_thread_id = last_log_entry.get("thread_id")
+                if last_thread_id:
+                    print(f"\n🔍 Context for last thread ({last_thread_id}):")
+                    print(global_shared_memory.get_context(last_thread_id))
+            else:
+                print("No logs found to retrieve last thread context.")
     # --- Example how to test with sample files (if not using CLI args) ---
     # Create sample files first in sample_inputs/
     # orchestrator.process_input("sample_inputs/invoice_example.json")
@@ -0,0 +1,107 @@
+# memory/connection_pool.py
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_CACHED_STATEMENTS = 256  # Per-connection prepared statement cache
+
+# Applied to every connection when it is opened.
+# WAL lets readers run while a writer is active, NORMAL sync is safe with WAL
+# and avoids an fsync per commit.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # Negative = KiB, so ~16MB page cache per connection
+    "foreign_keys": "ON",
+}
+
+
+class SQLiteConnectionPool:
+    """
+    A small pool of long-lived SQLite connections.
+    Connections are opened lazily up to pool_size and handed out one caller at a time,
+    so the Flask app (threaded) and the CLI can share a single pool.
+    """
+
+    def __init__(self, db_name: str, pool_size: int = DEFAULT_POOL_SIZE,
+                 pragmas: dict = None, busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+                 cached_statements: int = DEFAULT_CACHED_STATEMENTS):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.db_name = db_name
+        # Every connection to ":memory:" is its own private database, so it can't be pooled
+        self.pool_size = 1 if db_name == ":memory:" else pool_size
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+
+        self._idle = queue.LifoQueue(maxsize=self.pool_size)  # LIFO keeps the warmest connection in use
+        self._all_connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # Connections move between threads, but only one user at a time
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={value};")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed.")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all_connections) < self.pool_size:
+                conn = self._open_connection()
+                self._all_connections.append(conn)
+                return conn
+
+        # Pool is exhausted, wait for another caller to give a connection back
+        try:
+            return self._idle.get(timeout=self.busy_timeout_ms / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a pooled connection.") from None
+
+    def _release(self, conn: sqlite3.Connection):
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()  # Never hand out a connection with a half-finished transaction
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the with-block."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close every connection the pool has opened. Safe to call more than once."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections, self._all_connections = self._all_connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"SQLite error while closing connection: {e}")
@@ -0,0 +1,165 @@
+# memory/log_writer.py
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 0.5  # Seconds a log may wait in the queue before it is written
+WRITE_RETRIES = 3  # Extra attempts for a failed batch (e.g. "database is locked") before going row by row
+RETRY_DELAY = 0.05  # Seconds before the first retry, doubled for each further one
+
+_STOP = object()
+
+
+class _FlushMarker:
+    """Queued behind pending rows; set once everything ahead of it has been written."""
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BatchedLogWriter:
+    """
+    Write-behind writer for agent_logs rows.
+    submit() only enqueues; a background thread writes rows in batched transactions
+    once batch_size rows are waiting or flush_interval has passed since the first one.
+    A full queue blocks submit() (back-pressure) instead of dropping logs. A batch that fails
+    is retried, then written row by row; only rows that still fail are dropped, and they are
+    counted in stats().
+    """
+
+    def __init__(self, pool, insert_query: str, max_queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self._pool = pool
+        self._insert_query = insert_query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._pending = 0  # Rows submitted but not yet committed
+        self._pending_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0  # Rows that could not be written even one at a time
+        self._last_error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="shared-memory-log-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            return {"pending": self._pending, "written": self._written, "dropped": self._dropped,
+                    "last_error": self._last_error}
+
+    def submit(self, row: tuple):
+        """Queue one row. Blocks while the queue is full."""
+        if self._closed:
+            raise RuntimeError("Log writer is closed.")
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put(row)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Block until every row submitted before this call is committed or dropped (see stats()).
+        Returns False on timeout.
+        """
+        if self._pending == 0 or not self._thread.is_alive():
+            return True
+        marker = _FlushMarker()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: float = None):
+        """Write out everything still queued and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, markers, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+
+            # Collect until the batch is full, the interval runs out, or someone asks for a flush
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushMarker):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write_batch(batch)
+            for marker in markers:
+                marker.done.set()
+            if stop:
+                # Drain anything that raced in after close() so no log is lost
+                leftovers, late_markers = [], []
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _FlushMarker):
+                        late_markers.append(item)
+                    elif item is not _STOP:
+                        leftovers.append(item)
+                if leftovers:
+                    self._write_batch(leftovers)
+                for marker in late_markers:
+                    marker.done.set()
+                return
+
+    def _insert(self, rows: list):
+        with self._pool.connection() as conn:
+            with conn:  # One transaction (and one commit) per call
+                conn.executemany(self._insert_query, rows)
+
+    def _write_batch(self, batch: list):
+        written, error = 0, None
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                self._insert(batch)
+                written = len(batch)
+                break
+            except sqlite3.Error as e:
+                error = e
+                if attempt < WRITE_RETRIES:
+                    time.sleep(RETRY_DELAY * 2 ** attempt)
+        else:
+            # Keep whatever can be stored; a row SQLite rejects must not take the batch with it
+            print(f"SQLite error while writing {len(batch)} queued logs ({error}); retrying row by row.")
+            for row in batch:
+                try:
+                    self._insert([row])
+                    written += 1
+                except sqlite3.Error as e:
+                    error = e
+        dropped = len(batch) - written
+        if dropped:
+            print(f"SQLite error: dropped {dropped} queued logs: {error}")
+        with self._pending_lock:
+            self._pending -= len(batch)
+            self._written += written
+            self._dropped += dropped
+            if dropped:
+                self._last_error = str(error)
@@ -3,46 +3,87 @@ import sqlite3
 import datetime
 import uuid
 import json
-import threading # For thread-local data if you want to optimize connection reuse per thread
+import os
+import copy
+import atexit
+import threading
+from collections import OrderedDict
+from memory.connection_pool import SQLiteConnectionPool, DEFAULT_POOL_SIZE
+from memory.log_writer import BatchedLogWriter, DEFAULT_QUEUE_SIZE, DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL
+from utils.env import load_env
+from utils.metrics import timed_stage
+
+load_env() # Imported before llm_client by the agents, so SHARED_MEMORY_* settings in .env need loading here too
 
 DB_NAME = "shared_memory.db"
+DEFAULT_LOG_PAGE_SIZE = 50
+MAX_LOG_PAGE_SIZE = 500 # query_logs clamps limit to [1, MAX_LOG_PAGE_SIZE]
+LOG_INDEXES = {
+    "idx_agent_logs_thread_id": "thread_id, id",
+    "idx_agent_logs_agent_name": "agent_name, id",
+    "idx_agent_logs_status": "status, id",
+    "idx_agent_logs_source_filename": "source_filename, id",
+}
+# Pool size can be tuned per deployment (e.g. match the number of Flask worker threads)
+POOL_SIZE = int(os.getenv("SHARED_MEMORY_POOL_SIZE", DEFAULT_POOL_SIZE))
+# Write-behind logging: add_log only enqueues and a background thread commits in batches
+WRITE_BEHIND = os.getenv("SHARED_MEMORY_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("SHARED_MEMORY_LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+LOG_BATCH_SIZE = int(os.getenv("SHARED_MEMORY_LOG_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+LOG_FLUSH_INTERVAL = float(os.getenv("SHARED_MEMORY_LOG_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+# Per-process LRU of parsed contexts. Writes through this instance invalidate it;
+# writes from other processes are not seen until the entry is evicted.
+CONTEXT_CACHE_SIZE = int(os.getenv("SHARED_MEMORY_CONTEXT_CACHE_SIZE", 256))
+
+# Per-stage timings (see utils/metrics.py) are stored per thread unless disabled
+STAGE_TIMINGS_ENABLED = os.getenv("SHARED_MEMORY_STAGE_TIMINGS", "1").lower() in ("1", "true", "yes")
+
+INSERT_TIMING_QUERY = """
+INSERT INTO stage_timings (thread_id, stage, started_at, duration_ms) VALUES (?, ?, ?, ?);
+"""
+
+INSERT_LOG_QUERY = """
+INSERT INTO agent_logs (timestamp, agent_name, thread_id, source_filename, status, log_details)
+VALUES (?, ?, ?, ?, ?, ?);
+"""
 
 class SharedMemory:
-    def __init__(self, db_name=DB_NAME):
+    def __init__(self, db_name=DB_NAME, pool_size=POOL_SIZE, write_behind=WRITE_BEHIND,
+                 log_queue_size=LOG_QUEUE_SIZE, log_batch_size=LOG_BATCH_SIZE,
+                 log_flush_interval=LOG_FLUSH_INTERVAL, context_cache_size=CONTEXT_CACHE_SIZE):
         self.db_name = db_name
+        self.context_cache_size = context_cache_size
+        self._context_cache = OrderedDict()
+        self._context_cache_lock = threading.Lock()
+        self._context_write_seq = 0 # Bumped on every context write, guards against caching stale reads
+        self._pool = SQLiteConnectionPool(db_name, pool_size=pool_size) # Connections are reused across calls
+        self._log_writer = None
         self._create_tables_if_not_exist() # Create tables once at init
-
-    def _get_db_connection(self):
-        """Creates a new database connection."""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        return conn
+        if write_behind:
+            self._log_writer = BatchedLogWriter(
+                self._pool, INSERT_LOG_QUERY, max_queue_size=log_queue_size,
+                batch_size=log_batch_size, flush_interval=log_flush_interval,
+            )
 
     def _execute_query(self, query, params=(), commit=False, fetch_one=False, fetch_all=False):
-        conn = self._get_db_connection() # Get a new connection for each query
-        cursor = conn.cursor()
         try:
-            cursor.execute(query, params)
-            if commit:
-                conn.commit()
-            
-            result = None
-            if fetch_one:
-                result = cursor.fetchone()
-            elif fetch_all:
-                result = cursor.fetchall()
-            return result
+            with self._pool.connection() as conn:
+                cursor = conn.execute(query, params) # Statement text is cached per connection
+                if commit:
+                    conn.commit()
+
+                result = None
+                if fetch_one:
+                    result = cursor.fetchone()
+                elif fetch_all:
+                    result = cursor.fetchall()
+                return result
         except sqlite3.Error as e:
             print(f"SQLite error: {e} Query: {query} Params: {params}")
             return None
-        finally:
-            if conn:
-                conn.close() # Always close the connection
 
     def _create_tables_if_not_exist(self):
-        """Create database tables if they don't exist, using a temporary connection."""
-        # This method is called once at startup, so a temporary connection is fine.
-        # Or, it could be called within _execute_query with a check, but that's less efficient.
+        """Create database tables if they don't exist."""
         create_logs_table_query = """
         CREATE TABLE IF NOT EXISTS agent_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -50,6 +91,7 @@ class SharedMemory:
             agent_name TEXT NOT NULL,
             thread_id TEXT NOT NULL,
             source_filename TEXT,
+            status TEXT,
             log_details TEXT
         );
         """
@@ -60,54 +102,174 @@ class SharedMemory:
             context_data TEXT
         );
         """
-        # Use _execute_query to ensure table creation also uses its own connection
+        # Content hash -> first thread that processed those exact bytes
+        create_fingerprints_table_query = """
+        CREATE TABLE IF NOT EXISTS document_fingerprints (
+            content_hash TEXT PRIMARY KEY,
+            thread_id TEXT NOT NULL,
+            source_filename TEXT,
+            classified_format TEXT,
+            classified_intent TEXT,
+            created_at TEXT NOT NULL
+        );
+        """
         self._execute_query(create_logs_table_query, commit=True)
         self._execute_query(create_context_table_query, commit=True)
+        # One row per timed span; a document has a handful (parse, classify, llm, memory, ...)
+        create_timings_table_query = """
+        CREATE TABLE IF NOT EXISTS stage_timings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            thread_id TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            duration_ms REAL NOT NULL
+        );
+        """
+        self._execute_query(create_fingerprints_table_query, commit=True)
+        self._execute_query(create_timings_table_query, commit=True)
+        self._execute_query("CREATE INDEX IF NOT EXISTS idx_stage_timings_thread_id ON stage_timings (thread_id, id);", commit=True)
+        self._migrate_agent_logs()
+        # Keyset pagination orders by id, so every filter column is indexed together with id
+        for index_name, columns in LOG_INDEXES.items():
+            self._execute_query(f"CREATE INDEX IF NOT EXISTS {index_name} ON agent_logs ({columns});", commit=True)
+
+    def _migrate_agent_logs(self):
+        """Adds the status column to databases created before it existed and backfills it."""
+        columns = self._execute_query("PRAGMA table_info(agent_logs);", fetch_all=True) or []
+        if any(col["name"] == "status" for col in columns):
+            return
+        self._execute_query("ALTER TABLE agent_logs ADD COLUMN status TEXT;", commit=True)
+        self._execute_query(
+            "UPDATE agent_logs SET status = json_extract(log_details, '$.status') "
+            "WHERE json_valid(log_details);",
+            commit=True,
+        )
 
+    def flush(self, timeout: float = None) -> bool:
+        """Read-your-writes barrier: waits until every queued log is committed (no-op without write-behind)."""
+        log_writer = getattr(self, "_log_writer", None)
+        if log_writer is None:
+            return True
+        return log_writer.flush(timeout)
 
-    # ... your add_log, get_logs_by_thread_id, get_all_logs, _format_log_row,
-    # update_context, get_context, generate_thread_id methods remain mostly the same,
-    # as they all rely on _execute_query which now handles its own connection.
+    def log_writer_stats(self) -> dict:
+        """Write-behind counters (pending, written, dropped, last_error); None without write-behind."""
+        log_writer = getattr(self, "_log_writer", None)
+        return log_writer.stats() if log_writer is not None else None
 
-    # Remove __del__ if connections are managed per query.
-    # def __del__(self):
-    #     pass # No global connection to close
-    def add_log(self, agent_name: str, log_details: dict):
+    def close(self):
+        """Flush queued logs and close all pooled connections. The instance can't be used afterwards."""
+        log_writer = getattr(self, "_log_writer", None)
+        if log_writer is not None:
+            log_writer.close()
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _log_params(self, agent_name: str, log_details: dict) -> tuple:
         thread_id = log_details.get("thread_id", self.generate_thread_id()) # Ensure thread_id
         source_filename = log_details.get("source", log_details.get("source_filename"))
-        
+
         # Prepare log_details to be stored as JSON, exclude fields already columns
         storable_details = {k: v for k, v in log_details.items() if k not in ['thread_id', 'source', 'source_filename']}
 
-        query = """
-        INSERT INTO agent_logs (timestamp, agent_name, thread_id, source_filename, log_details)
-        VALUES (?, ?, ?, ?, ?);
-        """
-        params = (
+        return (
             datetime.datetime.now().isoformat(),
             agent_name,
             thread_id,
             source_filename,
+            storable_details.get("status"), # Copied into its own column so it can be filtered on
             json.dumps(storable_details) # Serialize the rest of log_details
         )
-        self._execute_query(query, params, commit=True)
-        print(f"MEMORY_LOG (SQLite): Agent: {agent_name}, Thread: {thread_id}, Details: {storable_details.get('status', '')}")
+
+    @timed_stage("memory")
+    def add_log(self, agent_name: str, log_details: dict):
+        params = self._log_params(agent_name, log_details)
+        if self._log_writer is not None:
+            self._log_writer.submit(params) # Blocks only when the queue is full
+        else:
+            self._execute_query(INSERT_LOG_QUERY, params, commit=True)
+        print(f"MEMORY_LOG (SQLite): Agent: {agent_name}, Thread: {params[2]}, Details: {params[4] or ''}")
+
+    @timed_stage("memory")
+    def add_logs(self, entries: list):
+        """
+        Stores [(agent_name, log_details), ...] in one transaction (bulk mode), without the per-log print.
+        Raises sqlite3.Error if the transaction fails, so the caller knows the rows were not stored.
+        """
+        rows = [self._log_params(agent_name, log_details) for agent_name, log_details in entries]
+        if not rows:
+            return
+        if self._log_writer is not None:
+            for params in rows:
+                self._log_writer.submit(params)
+            return
+        with self._pool.connection() as conn:
+            with conn:
+                conn.executemany(INSERT_LOG_QUERY, rows)
 
 
     def get_logs_by_thread_id(self, thread_id: str) -> list:
-        query = "SELECT * FROM agent_logs WHERE thread_id = ? ORDER BY timestamp ASC;"
+        # id follows insertion order, so it gives the same ordering as timestamp but uses the index
+        self.flush() # Make sure queued logs for this thread are visible
+        query = "SELECT * FROM agent_logs WHERE thread_id = ? ORDER BY id ASC;"
         rows = self._execute_query(query, (thread_id,), fetch_all=True)
         if rows:
             return [self._format_log_row(row) for row in rows]
         return []
 
     def get_all_logs(self) -> list:
-        query = "SELECT * FROM agent_logs ORDER BY timestamp ASC;"
+        """Loads every log row. Prefer query_logs for anything user-facing."""
+        self.flush()
+        query = "SELECT * FROM agent_logs ORDER BY id ASC;"
         rows = self._execute_query(query, fetch_all=True)
         if rows:
             return [self._format_log_row(row) for row in rows]
         return []
 
+    def query_logs(self, limit: int = DEFAULT_LOG_PAGE_SIZE, after_id: int = None, before_id: int = None,
+                   agent_name: str = None, status: str = None, source_filename: str = None,
+                   thread_id: str = None, newest_first: bool = False) -> list:
+        """
+        Keyset-paginated log query.
+        Pass the last id of a page as after_id (oldest first) or before_id (newest first)
+        to get the next page; filters are combined with AND.
+        """
+        limit = max(1, min(limit, MAX_LOG_PAGE_SIZE)) # SQLite treats a negative LIMIT as no limit
+        self.flush()
+        conditions = []
+        params = []
+        for column, value in (("agent_name", agent_name), ("status", status),
+                              ("source_filename", source_filename), ("thread_id", thread_id)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if newest_first else "ASC"
+        query = f"SELECT * FROM agent_logs {where_clause} ORDER BY id {order} LIMIT ?;"
+        params.append(limit)
+        rows = self._execute_query(query, tuple(params), fetch_all=True)
+        if rows:
+            return [self._format_log_row(row) for row in rows]
+        return []
+
+    def get_recent_logs(self, count: int = 5) -> list:
+        """Returns the last `count` logs in chronological order."""
+        return list(reversed(self.query_logs(limit=count, newest_first=True)))
+
     def _format_log_row(self, row: sqlite3.Row) -> dict:
         """Converts a SQLite row from agent_logs to a dictionary, parsing JSON."""
         log_entry = dict(row)
@@ -121,40 +283,170 @@ class SharedMemory:
         return log_entry
 
 
-    def update_context(self, thread_id: str, data_to_update: dict):
-        current_context = self.get_context(thread_id) # Fetch existing context
-        current_context.update(data_to_update)       # Merge new data
+    def _build_context_update(self, thread_id: str, data_to_update: dict):
+        """
+        Builds one upsert that merges data_to_update into the stored context with json_set,
+        so the merge happens inside SQLite instead of a read-modify-write in Python.
+        Top-level keys are replaced like dict.update(). Returns None when SQLite's JSON
+        functions can't express the update: NaN/Infinity values or keys containing '"'.
+        """
+        params = [thread_id, datetime.datetime.now().isoformat()]
+        set_args = []
+        for key, value in data_to_update.items():
+            key = str(key)
+            if '"' in key: # JSON paths have no escape for quotes
+                return None
+            try:
+                value_json = json.dumps(value, allow_nan=False)
+            except ValueError: # NaN/Infinity are not JSON to SQLite
+                return None
+            params.append(f'$."{key}"')
+            params.append(value_json)
+            set_args.append(f"?{len(params) - 1}, json(?{len(params)})") # Numbered params are reused below
+        set_sql = "".join(f", {arg}" for arg in set_args)
 
-        query = """
-        INSERT OR REPLACE INTO shared_context (thread_id, last_updated, context_data)
-        VALUES (?, ?, ?);
+        # Stored text SQLite can't parse (e.g. NaN from the Python merge below) updates no row
+        query = f"""
+        INSERT INTO shared_context (thread_id, last_updated, context_data)
+        VALUES (?1, ?2, json_set('{{}}'{set_sql}))
+        ON CONFLICT(thread_id) DO UPDATE SET
+            last_updated = excluded.last_updated,
+            context_data = json_set(shared_context.context_data{set_sql})
+        WHERE json_valid(shared_context.context_data);
         """
-        params = (
-            thread_id,
-            datetime.datetime.now().isoformat(),
-            json.dumps(current_context) # Serialize the entire context
+        return query, tuple(params)
+
+    def _write_context_update(self, conn: sqlite3.Connection, thread_id: str, data_to_update: dict):
+        """Applies one context update on conn; the caller commits."""
+        statement = self._build_context_update(thread_id, data_to_update)
+        if statement is not None and conn.execute(*statement).rowcount:
+            return
+        # Merge in Python with json.loads/json.dumps, which round-trip NaN and any key.
+        # The write lock is taken first, so this is as atomic as the json_set upsert.
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE;")
+        row = conn.execute("SELECT context_data FROM shared_context WHERE thread_id = ?;", (thread_id,)).fetchone()
+        context = {}
+        if row and row['context_data']:
+            try:
+                context = json.loads(row['context_data'])
+            except json.JSONDecodeError:
+                print(f"Warning: Replacing unparseable context for thread {thread_id}")
+        context.update({str(key): value for key, value in data_to_update.items()})
+        conn.execute(
+            "INSERT OR REPLACE INTO shared_context (thread_id, last_updated, context_data) VALUES (?, ?, ?);",
+            (thread_id, datetime.datetime.now().isoformat(), json.dumps(context)),
         )
-        self._execute_query(query, params, commit=True)
+
+    @timed_stage("memory")
+    def update_context(self, thread_id: str, data_to_update: dict):
+        try:
+            with self._pool.connection() as conn:
+                with conn: # Single transaction, no lost updates
+                    self._write_context_update(conn, thread_id, data_to_update)
+        except sqlite3.Error as e:
+            print(f"SQLite error while updating context for {thread_id}: {e}")
+        self._invalidate_cached_context(thread_id)
         # self.add_log("SharedMemory", {"action": "context_updated", "thread_id": thread_id, "updated_keys": list(data_to_update.keys())}) # This will now also go to DB
 
+    @timed_stage("memory")
+    def update_contexts(self, updates: dict):
+        """
+        update_context for many threads ({thread_id: data_to_update}) in one transaction.
+        Raises sqlite3.Error if the transaction fails; then none of the updates are stored.
+        """
+        if not updates:
+            return
+        try:
+            with self._pool.connection() as conn:
+                with conn:
+                    for thread_id, data_to_update in updates.items():
+                        self._write_context_update(conn, thread_id, data_to_update)
+        finally:
+            for thread_id in updates:
+                self._invalidate_cached_context(thread_id)
+
+    @timed_stage("memory")
     def get_context(self, thread_id: str) -> dict:
+        with self._context_cache_lock:
+            cached = self._context_cache.get(thread_id)
+            if cached is not None:
+                self._context_cache.move_to_end(thread_id)
+                return copy.deepcopy(cached) # Callers may mutate what they get back
+            write_seq = self._context_write_seq
+
         query = "SELECT context_data FROM shared_context WHERE thread_id = ?;"
         row = self._execute_query(query, (thread_id,), fetch_one=True)
         if row and row['context_data']:
             try:
-                return json.loads(row['context_data'])
+                context = json.loads(row['context_data'])
             except json.JSONDecodeError:
                 print(f"Warning: Could not parse context_data JSON for thread_id {thread_id}")
                 return {}
+            self._cache_context(thread_id, context, write_seq)
+            return copy.deepcopy(context)
         return {}
 
+    def _cache_context(self, thread_id: str, context: dict, write_seq: int):
+        if self.context_cache_size <= 0:
+            return
+        with self._context_cache_lock:
+            if write_seq != self._context_write_seq:
+                return # A write happened while we were reading, this copy may already be stale
+            self._context_cache[thread_id] = context
+            self._context_cache.move_to_end(thread_id)
+            while len(self._context_cache) > self.context_cache_size:
+                self._context_cache.popitem(last=False) # Evict least recently used
+
+    def _invalidate_cached_context(self, thread_id: str):
+        with self._context_cache_lock:
+            self._context_write_seq += 1
+            self._context_cache.pop(thread_id, None)
+
+    @timed_stage("memory")
+    def register_document_hash(self, content_hash: str, thread_id: str, source_filename: str = None,
+                               classified_format: str = None, classified_intent: str = None):
+        """Remembers which thread first processed a document. Later registrations of the same hash are ignored."""
+        query = """
+        INSERT OR IGNORE INTO document_fingerprints
+            (content_hash, thread_id, source_filename, classified_format, classified_intent, created_at)
+        VALUES (?, ?, ?, ?, ?, ?);
+        """
+        params = (content_hash, thread_id, source_filename, classified_format, classified_intent,
+                  datetime.datetime.now().isoformat())
+        self._execute_query(query, params, commit=True)
+
+    @timed_stage("memory")
+    def find_document_by_hash(self, content_hash: str) -> dict:
+        query = "SELECT * FROM document_fingerprints WHERE content_hash = ?;"
+        row = self._execute_query(query, (content_hash,), fetch_one=True)
+        return dict(row) if row else None
+
+    def record_stage_timings(self, thread_id: str, spans: list):
+        """Stores (stage, started_at, duration_ms) spans for a thread in one transaction."""
+        if not STAGE_TIMINGS_ENABLED or not spans:
+            return
+        rows = [(thread_id, stage_name, started_at, round(duration_ms, 3)) for stage_name, started_at, duration_ms in spans]
+        try:
+            with self._pool.connection() as conn:
+                with conn:
+                    conn.executemany(INSERT_TIMING_QUERY, rows)
+        except sqlite3.Error as e:
+            print(f"SQLite error while storing stage timings for {thread_id}: {e}")
+
+    def get_stage_timings(self, thread_id: str) -> list:
+        query = "SELECT stage, started_at, duration_ms FROM stage_timings WHERE thread_id = ? ORDER BY id ASC;"
+        rows = self._execute_query(query, (thread_id,), fetch_all=True)
+        return [dict(row) for row in rows] if rows else []
+
     def generate_thread_id(self) -> str:
         return str(uuid.uuid4())
 
-    # Optional: Destructor to ensure connection is closed when object is garbage collected
+    # Destructor to ensure pooled connections are closed when the object is garbage collected
     def __del__(self):
-        self._close()
+        self.close()
 
 # Global instance
 # This will now create/connect to shared_memory.db when first imported/used
-global_shared_memory = SharedMemory()
\ No newline at end of file
+global_shared_memory = SharedMemory()
+atexit.register(global_shared_memory.close) # Close pooled connections cleanly on interpreter exit
@@ -0,0 +1,73 @@
+import io
+import os
+import time
+
+import pytest
+
+import app as web_app
+from utils.jobs import DONE, ByteBudget, JobManager
+
+
+class RecordingOrchestrator:
+    def __init__(self):
+        self.calls = []
+
+    def process_input(self, input_data, is_filepath=False, filename=None):
+        on_disk = is_filepath and os.path.exists(input_data)
+        self.calls.append((input_data, is_filepath, filename, on_disk))
+        return f"thread-{len(self.calls)}"
+
+
+@pytest.fixture
+def upload_app(tmp_path, monkeypatch):
+    orchestrator = RecordingOrchestrator()
+    manager = JobManager(max_workers=1, max_pending=10)
+    monkeypatch.setattr(web_app, "orchestrator_instance", orchestrator)
+    monkeypatch.setattr(web_app, "job_manager", manager)
+    monkeypatch.setattr(web_app, "upload_memory", ByteBudget(limit=20))
+    monkeypatch.setattr(web_app, "UPLOAD_SPOOL_THRESHOLD", 16)
+    monkeypatch.setitem(web_app.app.config, "UPLOAD_FOLDER", str(tmp_path))
+    yield web_app.app.test_client(), orchestrator, manager
+    manager.shutdown()
+
+
+def _upload(client, data, filename="doc.txt"):
+    response = client.post("/", data={"inputType": "file", "inputFile": (io.BytesIO(data), filename)},
+                           content_type="multipart/form-data")
+    assert response.status_code == 302
+    return response.headers["Location"].rstrip("/").split("/")[-2] # /jobs/<job_id>/view
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_small_upload_is_queued_as_bytes(upload_app, tmp_path):
+    client, orchestrator, manager = upload_app
+    job_id = _upload(client, b"x" * 16)
+    _wait_until(lambda: manager.get(job_id)["status"] == DONE and web_app.upload_memory.used == 0)
+    assert orchestrator.calls == [(b"x" * 16, False, "doc.txt", False)]
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_upload_is_spooled_and_removed_when_the_job_finishes(upload_app, tmp_path):
+    client, orchestrator, manager = upload_app
+    job_id = _upload(client, b"x" * 17, filename="big.pdf")
+    _wait_until(lambda: manager.get(job_id)["status"] == DONE and not os.listdir(tmp_path))
+    path, is_filepath, filename, on_disk = orchestrator.calls[0]
+    assert is_filepath and on_disk and filename == "big.pdf"
+    assert os.path.dirname(path) == str(tmp_path) and path.endswith(".pdf")
+    assert web_app.upload_memory.used == 0
+
+
+def test_uploads_beyond_the_memory_budget_are_spooled(upload_app, tmp_path):
+    client, orchestrator, manager = upload_app
+    web_app.upload_memory.try_reserve(11) # Held by an earlier job still in the queue
+    for data in (b"a" * 9, b"b" * 10): # The second one no longer fits in the 20 bytes
+        job_id = _upload(client, data)
+        _wait_until(lambda: manager.get(job_id)["status"] == DONE and not os.listdir(tmp_path))
+    assert [(is_filepath, on_disk) for _, is_filepath, _, on_disk in orchestrator.calls] == [(False, False), (True, True)]
+    _wait_until(lambda: web_app.upload_memory.used == 11)
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+from main import _batch_summary, is_failed_outcome
+
+
+@pytest.mark.parametrize("intent, agent_status, failed", [
+    ("Invoice", "Processed", False),
+    ("Complaint", None, False),
+    ("Invoice", "ProcessedWithAnomalies", False),
+    ("Unknown (LLM error)", None, True),
+    ("Unknown (No content)", None, True),
+    (None, None, True),
+    ("Invoice", "Error", True),
+    ("Complaint", "ProcessedWithLLMError", True),
+])
+def test_is_failed_outcome(intent, agent_status, failed):
+    assert is_failed_outcome(intent, agent_status) is failed
+
+
+def _result(elapsed_ms, intent="Invoice", agent_status="Processed", thread_id="t", error=None):
+    return {"input": "doc", "thread_id": thread_id, "error": error, "elapsed_ms": elapsed_ms,
+            "classified_intent": intent, "agent_status": agent_status}
+
+
+@pytest.fixture
+def orchestrator():
+    return SimpleNamespace(classifier_agent=SimpleNamespace(intent_stats={}, bulk_record_intent_stats={}, llm_skip_rate=0.0))
+
+
+def test_batch_summary_counts_failed_documents(orchestrator):
+    results = [_result(10), _result(20, intent="Unknown (LLM error)"), _result(30, agent_status="Error"),
+               _result(40, thread_id=None), _result(50, error="boom"), _result(60, agent_status="ProcessedWithAnomalies")]
+    summary = _batch_summary(orchestrator, results, workers=2, elapsed=1.0, output_path="out.jsonl")
+    assert (summary["documents"], summary["succeeded"], summary["failed"]) == (6, 2, 4)
+    assert summary["latency_scope"] == "document"
+    assert summary["latency_ms_max"] == 60
+
+
+def test_batch_summary_marks_chunk_latencies(orchestrator):
+    summary = _batch_summary(orchestrator, [_result(10)], workers=1, elapsed=1.0, output_path="out.jsonl",
+                             classify_batch_size=8)
+    assert summary["latency_scope"] == "chunk"
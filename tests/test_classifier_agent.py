@@ -0,0 +1,23 @@
+import pytest
+
+from agents.classifier_agent import ClassifierAgent
+from memory.shared_memory import SharedMemory
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = SharedMemory(str(tmp_path / "memory.db"))
+    yield memory
+    memory.close()
+
+
+def test_bulk_records_do_not_count_towards_llm_skip_rate(memory):
+    agent = ClassifierAgent(memory, use_local_classifier=False)
+    agent.intent_stats.update({"llm": 1, "schema": 2})
+    rfq = {"rfq_id": "R1", "company_name": "Acme", "request_details": [], "submission_deadline": "2024-02-01"}
+    for _ in range(100):
+        assert agent.classify_json_record(rfq) == ("RFQ", "schema", 1.0)
+    agent.classify_json_record({"unrelated": True})
+    assert agent.intent_stats == {"llm": 1, "schema": 2}
+    assert agent.bulk_record_intent_stats == {"schema": 100, "none": 1}
+    assert agent.llm_skip_rate == pytest.approx(2 / 3)
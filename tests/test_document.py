@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from utils.document import ParsedDocument
+
+
+@pytest.mark.parametrize("filename, data, expected", [
+    ("records.ndjson", b'{"a": 1}\n{"a": 2}\n', True),
+    ("records.jsonl", b'{"a": 1}\n', True),
+    ("records.json", b'  \n[{"a": 1}, {"a": 2}]', True),
+    ("invoice.json", b'{"items": [1, 2]}', False),
+    ("notes.txt", b"[not json]", False),
+])
+def test_is_bulk_json(filename, data, expected):
+    assert ParsedDocument.from_bytes(data, filename).is_bulk_json is expected
+
+
+def test_ndjson_records_keep_line_numbers_and_errors():
+    data = b'{"a": 1}\n\n{broken\n{"a": 3}\n'
+    records = list(ParsedDocument.from_bytes(data, "r.ndjson").iter_json_records())
+    assert [(number, record) for number, record, _ in records] == [(1, {"a": 1}), (3, None), (4, {"a": 3})]
+    assert records[1][2] and records[0][2] is None
+
+
+def test_json_array_records_are_numbered_from_one():
+    data = json.dumps([{"a": i} for i in range(3)]).encode("utf-8")
+    records = list(ParsedDocument.from_bytes(data, "r.json").iter_json_records())
+    assert records == [(1, {"a": 0}, None), (2, {"a": 1}, None), (3, {"a": 2}, None)]
+
+
+def test_malformed_json_array_ends_with_an_error_record():
+    records = list(ParsedDocument.from_bytes(b'[{"a": 1}, {"a": 2}, {"a": ', "r.json").iter_json_records())
+    assert records[:2] == [(1, {"a": 1}, None), (2, {"a": 2}, None)]
+    number, record, error = records[2]
+    assert (number, record) == (3, None) and error
+    assert len(records) == 3
+
+
+def test_from_path_streams_json_without_reading_the_file(tmp_path):
+    data = json.dumps([{"a": i} for i in range(3)]).encode("utf-8")
+    path = tmp_path / "upload.tmp"
+    path.write_bytes(data)
+    document = ParsedDocument.from_path(str(path), filename="records.json")
+    assert document.is_bulk_json and document.size == len(data)
+    assert document.content_hash == ParsedDocument.from_bytes(data, "records.json").content_hash
+    assert [record for _, record, _ in document.iter_json_records()] == [{"a": 0}, {"a": 1}, {"a": 2}]
+    assert '"a"' in document.content_for_intent()
+    assert "raw_bytes" not in document.__dict__
+    assert document.raw_bytes == data # Still available to views that need the whole content
@@ -0,0 +1,61 @@
+import io
+import multiprocessing.util
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.corpus import make_pdf
+from utils import file_parser
+
+PAGES = [[f"Page {i + 1} line {line}" for line in range(3)] for i in range(8)]
+
+
+@pytest.fixture
+def parallel_pdf(monkeypatch):
+    monkeypatch.setattr(file_parser, "PDF_PARALLEL_MIN_PAGES", 4)
+    yield make_pdf(PAGES)
+    file_parser._reset_pdf_process_pool()
+
+
+@pytest.mark.parametrize("as_stream", [False, True])
+def test_parallel_extraction_of_in_memory_pdf(parallel_pdf, as_stream, tmp_path, monkeypatch):
+    expected = file_parser._extract_page_range(parallel_pdf, 0, len(PAGES))
+    multiprocessing.util.get_temp_dir() # The pool's own pymp-* dir stays in the real temp dir
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path)) # Private temp dir, so other processes' files don't interfere
+    source = io.BytesIO(parallel_pdf) if as_stream else parallel_pdf
+    assert file_parser.extract_pdf_page_texts_parallel(source, workers=2) == expected
+    assert "Page 8 line 2" in expected[-1]
+    assert os.listdir(tmp_path) == [] # The temp file handed to the workers is removed
+
+
+def test_parallel_extraction_from_path(parallel_pdf, tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(parallel_pdf)
+    page_texts = file_parser.extract_pdf_page_texts_parallel(str(path), start_page=2, workers=2)
+    assert page_texts == file_parser._extract_page_range(parallel_pdf, 2, len(PAGES))
+
+
+def test_pdf_pool_does_not_fork_the_calling_process(parallel_pdf):
+    file_parser.extract_pdf_page_texts_parallel(parallel_pdf, workers=2)
+    assert file_parser._get_pdf_process_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+@pytest.mark.parametrize("size", [0, 10, 16])
+def test_spool_upload_keeps_uploads_up_to_threshold_in_memory(tmp_path, size):
+    data = bytes(range(size))
+    assert file_parser.spool_upload(io.BytesIO(data), "a.pdf", threshold=16, spool_dir=str(tmp_path)) == (data, None)
+    assert os.listdir(tmp_path) == []
+
+
+def test_spool_upload_writes_larger_uploads_to_a_file(tmp_path):
+    data = bytes(range(17)) * 3
+    stream = io.BytesIO(data)
+    first = file_parser.spool_upload(stream, "Scan.PDF", threshold=16, spool_dir=str(tmp_path))
+    second = file_parser.spool_upload(io.BytesIO(data), "Scan.PDF", threshold=16, spool_dir=str(tmp_path))
+    for result in (first, second):
+        assert result[0] is None
+        assert os.path.dirname(result[1]) == str(tmp_path) and result[1].endswith(".pdf")
+        with open(result[1], "rb") as f:
+            assert f.read() == data
+    assert first[1] != second[1] # Same upload name, separate files
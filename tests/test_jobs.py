@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from utils.jobs import DONE, FAILED, QUEUED, RUNNING, ByteBudget, JobManager, JobQueueFull
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1, max_pending=2, max_retained=3)
+    yield manager
+    manager.shutdown()
+
+
+def _wait_for(manager, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["status"] == status and job["finished_at"] is not None:
+            return job
+        time.sleep(0.005)
+    raise AssertionError(f"job {job_id} did not reach {status}: {manager.get(job_id)}")
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+def test_job_result_and_state(manager):
+    job_id = manager.submit(lambda a, b=0: a + b, 2, b=3, description="sum")
+    job = _wait_for(manager, job_id, DONE)
+    assert job["result"] == 5 and job["error"] is None and job["description"] == "sum"
+    assert job["submitted_at"] <= job["started_at"] <= job["finished_at"]
+    assert manager.get("no-such-job") is None
+
+
+def test_failed_job_keeps_error_and_runs_on_done(manager):
+    cleaned = threading.Event()
+    job_id = manager.submit(_fail, "boom", on_done=cleaned.set)
+    job = _wait_for(manager, job_id, FAILED)
+    assert job["error"] == "boom" and job["result"] is None
+    assert cleaned.wait(5)
+    assert manager.snapshot()["pending"] == 0
+
+
+def test_submit_refused_beyond_max_pending(manager):
+    release = threading.Event()
+    first = manager.submit(release.wait)
+    second = manager.submit(release.wait)
+    with pytest.raises(JobQueueFull):
+        manager.submit(release.wait)
+    counts = manager.snapshot()
+    assert counts["pending"] == 2 and counts[RUNNING] + counts[QUEUED] == 2
+    release.set()
+    _wait_for(manager, first, DONE)
+    _wait_for(manager, second, DONE)
+    third = manager.submit(lambda: "ok") # Room again once the others finished
+    assert _wait_for(manager, third, DONE)["result"] == "ok"
+
+
+def test_trim_drops_only_oldest_finished_jobs():
+    manager = JobManager(max_workers=1, max_pending=10, max_retained=3)
+    try:
+        finished = [manager.submit(lambda i=i: i) for i in range(3)]
+        for job_id in finished:
+            _wait_for(manager, job_id, DONE)
+        release = threading.Event()
+        running = manager.submit(release.wait)
+        queued = manager.submit(release.wait)
+        # 5 jobs against a limit of 3: the two oldest finished ones go, unfinished jobs are never dropped
+        assert manager.get(finished[0]) is None and manager.get(finished[1]) is None
+        assert manager.get(finished[2])["result"] == 2
+        assert manager.get(running) is not None and manager.get(queued)["status"] == QUEUED
+        extra = manager.submit(release.wait) # Nothing left to drop but the last finished job
+        assert manager.get(finished[2]) is None
+        assert all(manager.get(job_id) is not None for job_id in (running, queued, extra))
+        release.set()
+    finally:
+        manager.shutdown()
+
+
+def test_process_job_without_thread_fails_the_job(manager, monkeypatch):
+    import app
+
+    class Orchestrator:
+        def process_input(self, input_data, is_filepath=False, filename=None):
+            return None if input_data == b"broken" else "thread-1"
+
+    monkeypatch.setattr(app, "orchestrator_instance", Orchestrator())
+    ok = manager.submit(app.process_job, b"fine", False, "fine.txt")
+    broken = manager.submit(app.process_job, b"broken", False, "broken.txt")
+    assert _wait_for(manager, ok, DONE)["result"] == "thread-1"
+    job = _wait_for(manager, broken, FAILED)
+    assert job["result"] is None and "broken.txt" in job["error"]
+
+
+def test_byte_budget():
+    budget = ByteBudget(limit=10)
+    assert budget.try_reserve(6) and budget.try_reserve(4)
+    assert not budget.try_reserve(1)
+    budget.release(6)
+    assert budget.used == 4 and budget.try_reserve(6) and not budget.try_reserve(1)
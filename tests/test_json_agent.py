@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+from agents import json_agent
+from agents.json_agent import JSONAgent
+from memory.shared_memory import SharedMemory
+
+
+@pytest.fixture
+def agent(tmp_path):
+    memory = SharedMemory(str(tmp_path / "memory.db"))
+    yield JSONAgent(memory)
+    memory.close()
+
+
+def _rfq(request_details):
+    return {"rfq_id": "RFQ-1", "company_name": "Acme", "request_details": request_details,
+            "submission_deadline": "2024-02-01"}
+
+
+def test_rfq_request_details_items_are_validated(agent):
+    details = [{"item_description": "Bolts", "quantity_needed": 100},
+               {"item_description": "Nuts", "quantity_needed": "lots"},
+               {"quantity_needed": 5}]
+    log_entry, context_update = agent.evaluate(_rfq(details), "RFQ", "t1", "rfq.json")
+    assert log_entry["status"] == "ProcessedWithAnomalies"
+    assert log_entry["extracted_data"]["request_details"] == [details[0]]
+    assert log_entry["item_counts"] == {"request_details": {"total": 3, "valid": 1}}
+    assert log_entry["anomaly_counts"] == {
+        "request_details.quantity_needed": {"type:str": 1},
+        "request_details.item_description": {"missing": 1},
+    }
+    assert context_update["json_anomalies_count"] == 2
+
+
+def test_item_schema_field_that_is_not_a_list_is_an_anomaly(agent):
+    log_entry, context_update = agent.evaluate(_rfq("100 bolts please"), "RFQ", "t1", "rfq.json")
+    assert log_entry["status"] == "ProcessedWithAnomalies"
+    assert log_entry["extracted_data"]["request_details"] == "100 bolts please" # Kept as sent
+    assert log_entry["anomaly_counts"] == {"request_details": {"not_array": 1}}
+    assert log_entry["anomalies"] == ["Field 'request_details' is not a list."]
+    assert context_update["json_anomalies_count"] == 1
+
+
+def test_valid_invoice_is_processed(agent):
+    invoice = {"invoice_id": "INV-1", "customer_name": "Acme", "total_amount": 10.0, "issue_date": "2024-01-01",
+               "items": [{"name": "Widget", "quantity": 2, "unit_price": 5.0}]}
+    log_entry, context_update = agent.evaluate(invoice, "Invoice", "t1", "invoice.json")
+    assert log_entry["status"] == "Processed"
+    assert log_entry["extracted_data"]["items"] == invoice["items"]
+    assert context_update["json_anomalies_count"] == 0
+
+
+def _bulk_payload(records):
+    return {"thread_id": "parent", "original_filename": "bulk.ndjson", "records": lambda: iter(records)}
+
+
+def _invoice(i, quantity=1):
+    return {"invoice_id": f"INV-{i}", "customer_name": "Acme", "total_amount": 1.0, "issue_date": "2024-01-01",
+            "items": [{"name": "Widget", "quantity": quantity, "unit_price": 1.0}]}
+
+
+BULK_RECORDS = [(1, _invoice(1), None), (2, _invoice(2, quantity="two"), None), (3, None, "Expecting value"),
+                (4, _invoice(4), None), (5, [1, 2], None)]
+
+
+def test_process_bulk_writes_in_batches_and_summarises(agent, monkeypatch):
+    monkeypatch.setattr(json_agent, "BULK_WRITE_BATCH_SIZE", 2)
+    batches = []
+    add_logs = agent.memory.add_logs
+    monkeypatch.setattr(agent.memory, "add_logs", lambda entries: (batches.append(len(entries)), add_logs(entries)))
+
+    agent.process_bulk(_bulk_payload(BULK_RECORDS))
+
+    assert batches == [2, 2, 1]
+    summary = agent.memory.get_logs_by_thread_id("parent")[-1]
+    assert summary["status"] == "BulkProcessedWithAnomalies"
+    assert (summary["records"], summary["records_with_anomalies"], summary["records_lost"]) == (5, 3, 0)
+    assert summary["records_by_status"] == {"Processed": 2, "ProcessedWithAnomalies": 1, "Error": 2}
+    assert [r["record_number"] for r in summary["anomalous_records"]] == [2, 3, 5]
+    context = agent.memory.get_context("parent")
+    assert (context["json_agent_status"], context["bulk_records"], context["bulk_records_lost"]) == ("BulkProcessedWithAnomalies", 5, 0)
+
+    record_logs = agent.memory.query_logs(limit=10, agent_name="JSONAgent")[:-1]
+    assert [log["record_number"] for log in record_logs] == [1, 2, 3, 4, 5]
+    assert {log["parent_thread_id"] for log in record_logs} == {"parent"}
+    assert agent.memory.get_context(record_logs[0]["thread_id"])["classified_intent"] == "invoice"
+
+
+def test_process_bulk_counts_records_it_could_not_store(agent, monkeypatch):
+    monkeypatch.setattr(json_agent, "BULK_WRITE_BATCH_SIZE", 2)
+    calls = []
+    add_logs = agent.memory.add_logs
+
+    def failing_second_batch(entries):
+        calls.append(len(entries))
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("database is locked")
+        add_logs(entries)
+    monkeypatch.setattr(agent.memory, "add_logs", failing_second_batch)
+
+    agent.process_bulk(_bulk_payload(BULK_RECORDS))
+
+    summary = agent.memory.get_logs_by_thread_id("parent")[-1]
+    assert summary["status"] == "Error"
+    assert summary["records_lost"] == 2
+    assert summary["error"] == "2 of 5 records could not be stored: database is locked"
+    context = agent.memory.get_context("parent")
+    assert (context["json_agent_status"], context["bulk_records_lost"]) == ("Error", 2)
+    assert len(agent.memory.query_logs(limit=10, agent_name="JSONAgent")) == 3 + 1 # Batches 1 and 3, plus the summary
@@ -0,0 +1,59 @@
+import io
+import json
+
+import pytest
+
+from utils.json_stream import JSONStreamReader, LazyJSONObject, iter_json_array, json_preview
+
+FLOAT_DOC = '{"n": 12.5, "m": 3e10, "k": -0.25E-3, "p": 1e+2, "list": [1.5, -2, 6.02e23, 0], "s": "1.5"}'
+CHUNK_SIZES = list(range(1, 20)) + [32, 64, len(FLOAT_DOC)]
+
+
+def _read(doc: str, chunk_chars: int):
+    reader = JSONStreamReader(io.StringIO(doc), chunk_chars=chunk_chars)
+    value = reader.read_value()
+    reader.expect_end()
+    return value
+
+
+@pytest.mark.parametrize("chunk_chars", CHUNK_SIZES)
+def test_read_value_numbers_split_at_any_chunk_boundary(chunk_chars):
+    assert _read(FLOAT_DOC, chunk_chars) == json.loads(FLOAT_DOC)
+
+
+@pytest.mark.parametrize("chunk_chars", CHUNK_SIZES)
+def test_members_read_numbers_split_at_any_chunk_boundary(chunk_chars):
+    reader = JSONStreamReader(io.StringIO(FLOAT_DOC), chunk_chars=chunk_chars)
+    values = {}
+    for key in reader.members():
+        if key == "list":
+            reader.skip_value()
+        else:
+            values[key] = reader.read_value()
+    reader.expect_end()
+    assert values == {"n": 12.5, "m": 3e10, "k": -0.25e-3, "p": 1e2, "s": "1.5"}
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 2, 3, 5, 8])
+def test_top_level_number_at_end_of_input(chunk_chars):
+    assert _read("  -12.5e-1", chunk_chars) == -1.25
+
+
+def test_truncated_number_raises():
+    with pytest.raises(ValueError):
+        _read("12.", 1)
+
+
+def test_iter_json_array_and_lazy_object():
+    raw = json.dumps({"id": 7.25, "items": [{"q": 1.5}, {"q": 2e3}]}).encode("utf-8")
+    assert list(iter_json_array(raw, "items")) == [{"q": 1.5}, {"q": 2e3}]
+    lazy = LazyJSONObject(raw)
+    assert lazy["id"] == 7.25
+    assert list(lazy["items"]) == [{"q": 1.5}, {"q": 2e3}]
+
+
+def test_json_preview_is_bounded():
+    raw = json.dumps({"items": [{"n": i + 0.5} for i in range(10_000)]}).encode("utf-8")
+    preview = json_preview(raw, max_chars=100)
+    assert len(preview) == 100
+    assert preview.startswith('{"items": [{"n": 0.5}')
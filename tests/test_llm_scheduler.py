@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.llm_scheduler import CircuitBreaker, CircuitOpenError, LLMScheduler
+
+
+def _half_open_scheduler():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure() # Open; with reset_seconds=0 the next call is the half-open probe
+    assert breaker.state == "half_open"
+    return LLMScheduler(requests_per_minute=0, tokens_per_minute=0, breaker=breaker)
+
+
+def test_probe_blocks_other_calls_until_it_finishes():
+    scheduler = _half_open_scheduler()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_request():
+        started.set()
+        return release.wait()
+
+    probe = threading.Thread(target=scheduler.call, args=(slow_request,))
+    probe.start()
+    try:
+        started.wait()
+        with pytest.raises(CircuitOpenError):
+            scheduler.call(lambda: "second")
+    finally:
+        release.set()
+        probe.join()
+    assert scheduler.breaker.state == "closed"
+
+
+def test_cancelled_probe_frees_the_probe_slot():
+    scheduler = _half_open_scheduler()
+
+    async def run():
+        started = asyncio.Event()
+
+        async def hanging_request():
+            started.set()
+            await asyncio.sleep(3600)
+
+        probe = asyncio.create_task(scheduler.call_async(hanging_request))
+        await started.wait()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+        return await scheduler.call_async(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert scheduler.breaker.state == "closed"
+
+
+def test_interrupted_sync_probe_frees_the_probe_slot():
+    scheduler = _half_open_scheduler()
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        scheduler.call(interrupted)
+    assert scheduler.call(lambda: "ok") == "ok"
@@ -0,0 +1,147 @@
+import random
+
+import pytest
+
+from memory.shared_memory import SharedMemory
+from utils import local_intent_classifier as lic
+from utils.local_intent_classifier import LocalIntentClassifier
+
+LABELS = ["Invoice", "RFQ", "Complaint", "Order", "Query", "Other"]
+THRESHOLD = 0.8 # agents.classifier_agent.LOCAL_CONFIDENCE_THRESHOLD
+MODEL_THRESHOLD = 0.95 # agents.classifier_agent.LOCAL_MODEL_THRESHOLD
+
+VOCABULARY = {
+    "Invoice": "billing payment amount balance remittance net terms bank transfer",
+    "Complaint": "damaged broken refund angry late missing unhappy replacement",
+    "Order": "shipped dispatched tracking delivery confirmed purchase quantity warehouse",
+}
+
+
+def _samples(count_per_label: int = 30, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    samples = []
+    for label, words in VOCABULARY.items():
+        words = words.split()
+        for _ in range(count_per_label):
+            samples.append((" ".join(rng.choice(words) for _ in range(12)), label))
+    return samples
+
+
+@pytest.fixture
+def trained():
+    classifier = LocalIntentClassifier(LABELS)
+    assert classifier.train(_samples()) == 90
+    return classifier
+
+
+def test_rule_strength_and_share():
+    classifier = LocalIntentClassifier(LABELS)
+    assert classifier.predict("Please find invoice number 12 attached") == ("Invoice", pytest.approx(1.4 / 1.9), "rules")
+    # A single full-weight cue: 1.0 / (1.0 + 0.5)
+    assert classifier._predict_rules("Order confirmation for you") == ("Order", pytest.approx(2 / 3))
+    assert classifier.predict("Nothing to see here") == (None, 0.0, None)
+
+
+def test_single_cue_stays_below_threshold():
+    classifier = LocalIntentClassifier(LABELS)
+    for text in ("Order confirmation", "Billing statement", "This is a formal complaint", "Request for quotation"):
+        label, confidence, source = classifier.predict(text)
+        assert label and source == "rules"
+        assert confidence < THRESHOLD, text
+
+
+def test_two_strong_cues_clear_threshold():
+    label, confidence, _ = LocalIntentClassifier(LABELS).predict(
+        "RFQ 118 - Request for quotation: please send us your quote for 40 units")
+    assert label == "RFQ" and confidence >= THRESHOLD
+
+
+def test_competing_labels_lower_confidence():
+    classifier = LocalIntentClassifier(LABELS)
+    _, alone = classifier._predict_rules("Billing statement. Amount due on receipt.")
+    label, contested = classifier._predict_rules("Billing statement. Amount due on receipt. This is a formal complaint.")
+    assert label == "Invoice"
+    # share = 1.6 / (1.6 + 0.8) on top of strength = 1.6 / 2.1
+    assert contested == pytest.approx(alone * 1.6 / 2.4)
+
+
+def test_model_not_used_before_min_training_samples():
+    classifier = LocalIntentClassifier(LABELS)
+    classifier.train(_samples(count_per_label=10))
+    assert classifier.training_samples < lic.MIN_TRAINING_SAMPLES
+    assert classifier._predict_model("damaged broken refund") == (None, 0.0)
+
+
+def test_model_confident_on_familiar_text_only(trained):
+    label, confidence = trained._predict_model("the parcel arrived damaged and broken, I want a refund or replacement")
+    assert label == "Complaint"
+    assert confidence < THRESHOLD # Unseen words ("parcel", "arrived", ...) lower the coverage
+    label, confidence = trained._predict_model("damaged broken refund replacement unhappy late missing angry")
+    assert label == "Complaint" and confidence >= MODEL_THRESHOLD
+    # Long unrelated text doesn't saturate: almost every token is unknown
+    _, confidence = trained._predict_model("Lorem ipsum dolor sit amet " * 100 + "billing")
+    assert confidence < 0.1
+
+
+def test_model_confidence_does_not_grow_with_length(trained):
+    _, short = trained._predict_model("shipped tracking delivery")
+    _, long = trained._predict_model("shipped tracking delivery " * 50)
+    assert long == pytest.approx(short)
+
+
+def test_agreement_combines_only_a_confident_model(trained, monkeypatch):
+    text = "Order confirmation"
+    rule_confidence = 2 / 3
+    for model_confidence, expected in ((0.4, (rule_confidence, "rules")),
+                                       (0.6, (1 - (1 - rule_confidence) * 0.4, "rules+model"))):
+        monkeypatch.setattr(trained, "_predict_model", lambda _text, c=model_confidence: ("Order", c))
+        label, confidence, source = trained.predict(text)
+        assert (label, source) == ("Order", expected[1])
+        assert confidence == pytest.approx(expected[0])
+    # 1.0 rule + model at 0.4 would be exactly 0.8 if combined; it must not clear the threshold
+    monkeypatch.setattr(trained, "_predict_model", lambda _text: ("Order", 0.4))
+    assert trained.predict(text)[1] < THRESHOLD
+
+
+def test_disagreement_keeps_the_more_confident_source(trained, monkeypatch):
+    monkeypatch.setattr(trained, "_predict_model", lambda _text: ("Complaint", 0.9))
+    assert trained.predict("Order confirmation") == ("Complaint", 0.9, "model")
+
+
+def test_learn_updates_model_and_ignores_unknown_labels(trained):
+    before = trained.training_samples
+    trained.learn("quarterly zorblax report", "Not A Label")
+    trained.learn("quarterly zorblax report", "Unknown (LLM error)")
+    trained.learn("", "Invoice")
+    assert trained.training_samples == before
+    assert "zorblax" not in trained._vocabulary
+    for _ in range(20):
+        trained.learn("zorblax zorblax quarterly", "Query")
+    assert trained.training_samples == before + 20
+    assert trained._predict_model("zorblax quarterly")[0] == "Query"
+
+
+def test_train_from_memory_uses_only_llm_samples(tmp_path):
+    memory = SharedMemory(str(tmp_path / "memory.db"))
+    try:
+        entries = []
+        for text, label in _samples():
+            entries.append(("ClassifierAgent", {"thread_id": "t", "status": "Classified", "classified_intent": label,
+                                                "intent_source": "llm", "content_excerpt": text}))
+        for source in ("rules", "model", "rules+model", "schema"):
+            entries.append(("ClassifierAgent", {"thread_id": "t", "status": "Classified", "classified_intent": "Query",
+                                                "intent_source": source, "content_excerpt": "zorblax " + source}))
+        entries.append(("ClassifierAgent", {"thread_id": "t", "status": "Classified", "classified_intent": "Query",
+                                            "intent_source": "llm"})) # No excerpt
+        entries.append(("ClassifierAgent", {"thread_id": "t", "status": "Duplicate", "classified_intent": "Query",
+                                            "intent_source": "llm", "content_excerpt": "zorblax duplicate"}))
+        entries.append(("EmailAgent", {"thread_id": "t", "status": "Classified", "classified_intent": "Query",
+                                       "intent_source": "llm", "content_excerpt": "zorblax email"}))
+        memory.add_logs(entries)
+
+        classifier = LocalIntentClassifier(LABELS)
+        assert classifier.train_from_memory(memory) == 90
+        assert "zorblax" not in classifier._vocabulary
+        assert classifier.train_from_memory(memory, limit=10) == 10
+    finally:
+        memory.close()
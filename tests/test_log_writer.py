@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from memory import log_writer as log_writer_module
+from memory.connection_pool import SQLiteConnectionPool
+from memory.log_writer import BatchedLogWriter
+
+INSERT = "INSERT INTO logs (value) VALUES (?);"
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_writer_module, "RETRY_DELAY", 0.0)
+    pool = SQLiteConnectionPool(str(tmp_path / "logs.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, value TEXT NOT NULL);")
+        conn.commit()
+    yield pool
+    pool.close()
+
+
+def _values(pool) -> list:
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT value FROM logs ORDER BY id;")]
+
+
+def test_rows_are_written_on_flush(pool):
+    writer = BatchedLogWriter(pool, INSERT, batch_size=2, flush_interval=10)
+    for value in "abc":
+        writer.submit((value,))
+    assert writer.flush(timeout=5)
+    assert _values(pool) == ["a", "b", "c"]
+    assert writer.stats() == {"pending": 0, "written": 3, "dropped": 0, "last_error": None}
+    writer.close()
+
+
+def test_bad_row_is_dropped_and_counted_without_losing_its_batch(pool):
+    writer = BatchedLogWriter(pool, INSERT, batch_size=10, flush_interval=10)
+    for value in ("a", None, "c"): # NULL violates NOT NULL
+        writer.submit((value,))
+    assert writer.flush(timeout=5)
+    assert _values(pool) == ["a", "c"]
+    stats = writer.stats()
+    assert (stats["written"], stats["dropped"], stats["pending"]) == (2, 1, 0)
+    assert "NOT NULL" in stats["last_error"]
+    writer.close()
+
+
+def test_transient_error_is_retried(pool, monkeypatch):
+    writer = BatchedLogWriter(pool, INSERT, batch_size=10, flush_interval=10)
+    insert, failures = writer._insert, []
+
+    def locked_once(rows):
+        if not failures:
+            failures.append(rows)
+            raise sqlite3.OperationalError("database is locked")
+        insert(rows)
+    monkeypatch.setattr(writer, "_insert", locked_once)
+    writer.submit(("a",))
+    writer.submit(("b",))
+    assert writer.flush(timeout=5)
+    assert _values(pool) == ["a", "b"]
+    assert writer.stats()["dropped"] == 0
+    writer.close()
@@ -0,0 +1,41 @@
+import pytest
+
+from utils.schema_validation import AnomalyAggregator, ItemValidator
+
+SCHEMA = {"name": str, "quantity": int, "unit_price": (int, float)}
+
+
+def _validate(items, **kwargs):
+    anomalies = AnomalyAggregator()
+    kept, valid_count, total = ItemValidator("items", SCHEMA).validate(items, anomalies, **kwargs)
+    return kept, valid_count, total, anomalies
+
+
+def test_valid_flags_checks_every_field():
+    validator = ItemValidator("items", SCHEMA)
+    batch = [
+        {"name": "a", "quantity": 1, "unit_price": 2.5},
+        {"name": "b", "quantity": 1, "unit_price": 2},
+        {"name": "c", "quantity": "1", "unit_price": 2.5},
+        {"name": "d", "quantity": 1},
+        ["not", "an", "object"],
+        None,
+    ]
+    assert validator.valid_flags(batch) == [True, True, False, False, False, False]
+    assert validator.valid_flags([]) == []
+
+
+@pytest.mark.parametrize("as_stream", [False, True])
+def test_validate_reports_invalid_items(as_stream):
+    items = [{"name": "a", "quantity": 1, "unit_price": 1.0}, {"name": "b", "quantity": "x", "unit_price": 1.0},
+             "oops", {"name": "c", "unit_price": 2.0}]
+    kept, valid_count, total, anomalies = _validate(iter(items) if as_stream else items)
+    assert (kept, valid_count, total) == ([items[0]], 1, 4)
+    assert anomalies.counts == {"items.quantity": {"type:str": 1, "missing": 1}, "items": {"not_object": 1}}
+    assert anomalies.samples[0] == "Item 2 of 'items' field 'quantity' has incorrect type (expected int, got str)"
+
+
+def test_validate_keep_valid_caps_kept_items():
+    items = [{"name": str(i), "quantity": i, "unit_price": 1.0} for i in range(10)]
+    kept, valid_count, total, _ = _validate(items, keep_valid=3)
+    assert (len(kept), valid_count, total) == (3, 10, 10)
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+
+from memory.shared_memory import SharedMemory
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = SharedMemory(str(tmp_path / "memory.db"))
+    yield memory
+    memory.close()
+
+
+def test_update_context_merges_keys(memory):
+    memory.update_context("t1", {"a": 1, "b": {"x": [1, 2]}})
+    memory.update_context("t1", {"b": "replaced", "c": None})
+    assert memory.get_context("t1") == {"a": 1, "b": "replaced", "c": None}
+
+
+def test_update_context_keeps_non_finite_floats(memory):
+    memory.update_context("t1", {"a": 1})
+    memory.update_context("t1", {"score": float("nan"), "limit": float("inf")})
+    memory.update_context("t1", {"b": 2}) # Stored text now has NaN, which SQLite can't parse
+    context = memory.get_context("t1")
+    assert math.isnan(context["score"]) and context["limit"] == float("inf")
+    assert (context["a"], context["b"]) == (1, 2)
+
+
+def test_update_context_accepts_quoted_keys(memory):
+    memory.update_context("t1", {'say "hi"': 1, "plain": 2})
+    memory.update_contexts({"t1": {'say "hi"': 3}, "t2": {"a\\b": 4}})
+    assert memory.get_context("t1") == {'say "hi"': 3, "plain": 2}
+    assert memory.get_context("t2") == {"a\\b": 4}
+
@@ -0,0 +1,231 @@
+# utils/document.py
+import hashlib
+import os
+import re
+from functools import cached_property
+from utils.file_parser import (
+    get_file_format, read_source_bytes, open_pdf_reader, iter_pdf_page_texts, extract_pdf_page_texts_parallel,
+    PDF_PARALLEL_MIN_PAGES, parse_json_bytes,
+    extract_text_from_email_bytes, extract_text_from_raw_email_content
+)
+from utils.json_stream import (
+    JSON_STREAM_MIN_BYTES, JSON_PREVIEW_CHARS, JSONStreamError, json_preview, load_json_lazily,
+    iter_json_array, iter_ndjson
+)
+
+INTENT_CONTENT_LIMIT = 4000 # Characters of content the classifier looks at
+_JSON_ARRAY_START = re.compile(rb"\s*\[")
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class ParsedDocument:
+    """
+    One input document, read once and parsed at most once per view.
+    The classifier (intent extraction) and the routed agent (content) both read from the
+    same instance, so a PDF is extracted once and JSON/.eml content is parsed once.
+    """
+
+    def __init__(self, filename: str, file_format: str, raw_bytes: bytes,
+                 filepath: str = None, raw_text: str = None):
+        self.filename = filename
+        self.file_format = file_format
+        if raw_bytes is not None: # Otherwise read from filepath on first use, see raw_bytes
+            self.raw_bytes = raw_bytes
+        self.filepath = filepath
+        self.raw_text = raw_text # Set when the input was pasted text rather than a file
+        self._pdf_pages = [] # PDF page texts extracted so far, reused by later calls
+        self._pdf_chars = 0
+
+    @classmethod
+    def from_path(cls, filepath: str, filename: str = None) -> "ParsedDocument":
+        """
+        filename overrides the name on disk, e.g. for an upload spooled to a temp file.
+        The file is not read up front: hashing and JSON streaming read it in chunks, and only
+        views that need the whole content (email, text, small JSON) load raw_bytes.
+        """
+        filename = filename or os.path.basename(filepath)
+        return cls(filename, get_file_format(filename), None, filepath=filepath)
+
+    @classmethod
+    def from_bytes(cls, data, filename: str) -> "ParsedDocument":
+        """From bytes or a binary file-like object; the format comes from filename's extension."""
+        return cls(filename, get_file_format(filename), read_source_bytes(data))
+
+    @classmethod
+    def from_raw_text(cls, text: str, filename: str = "raw_input") -> "ParsedDocument":
+        # Raw content is assumed to be email text
+        return cls(filename, "EMAIL", text.encode('utf-8'), raw_text=text)
+
+    @cached_property
+    def raw_bytes(self) -> bytes:
+        """Only computed for documents from a path; the others are given their bytes."""
+        with open(self.filepath, "rb") as f:
+            return f.read()
+
+    @property
+    def _source(self):
+        """The bytes once loaded, otherwise the filepath, for readers that accept either."""
+        return self.filepath if "raw_bytes" not in self.__dict__ else self.raw_bytes
+
+    @cached_property
+    def size(self) -> int:
+        return os.path.getsize(self.filepath) if "raw_bytes" not in self.__dict__ else len(self.raw_bytes)
+
+    def _head(self, max_bytes: int) -> bytes:
+        if "raw_bytes" in self.__dict__:
+            return self.raw_bytes[:max_bytes]
+        with open(self.filepath, "rb") as f:
+            return f.read(max_bytes)
+
+    @cached_property
+    def content_hash(self) -> str:
+        """sha256 of the raw bytes, used to recognise redelivered documents."""
+        if "raw_bytes" in self.__dict__:
+            return hashlib.sha256(self.raw_bytes).hexdigest()
+        digest = hashlib.sha256()
+        with open(self.filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @cached_property
+    def _pdf_reader(self):
+        try:
+            return open_pdf_reader(self._source)
+        except Exception as e:
+            print(f"Error reading PDF {self.filename}: {e}")
+            return None
+
+    @cached_property
+    def _pdf_page_count(self) -> int:
+        return len(self._pdf_reader.pages) if self._pdf_reader else 0
+
+    def _extract_pdf_pages(self, max_chars: int = None):
+        """Extracts pages in order until max_chars are available (or all pages when None)."""
+        if self._pdf_reader is None:
+            return
+        start_page = len(self._pdf_pages)
+        if start_page >= self._pdf_page_count or (max_chars is not None and self._pdf_chars >= max_chars):
+            return
+        try:
+            if max_chars is None and self._pdf_page_count - start_page >= PDF_PARALLEL_MIN_PAGES:
+                # Everything that's left is needed, so spread it over the process pool
+                page_texts = extract_pdf_page_texts_parallel(
+                    self.filepath or self.raw_bytes, start_page=start_page, page_count=self._pdf_page_count
+                )
+                self._pdf_pages.extend(page_texts)
+                self._pdf_chars += sum(len(page_text) for page_text in page_texts)
+                return
+            for page_text in iter_pdf_page_texts(self._pdf_reader, start_page=start_page):
+                self._pdf_pages.append(page_text)
+                self._pdf_chars += len(page_text)
+                if max_chars is not None and self._pdf_chars >= max_chars:
+                    break
+        except Exception as e:
+            print(f"Error extracting PDF text from {self.filename}: {e}")
+            self._pdf_page_count = len(self._pdf_pages) # Keep what we have, don't retry broken pages
+
+    def pdf_text_prefix(self, max_chars: int) -> str:
+        """First max_chars of the PDF text, extracting only as many pages as that takes."""
+        self._extract_pdf_pages(max_chars)
+        return "".join(self._pdf_pages)[:max_chars]
+
+    @cached_property
+    def pdf_text(self) -> str:
+        """Full PDF text. Only computed when a downstream agent actually needs it."""
+        self._extract_pdf_pages()
+        return "".join(self._pdf_pages)
+
+    @cached_property
+    def json_data(self):
+        return parse_json_bytes(self.raw_bytes)
+
+    @cached_property
+    def is_bulk_json(self) -> bool:
+        """NDJSON, or a JSON document whose top level is an array: many records, each processed on its own."""
+        if self.file_format == "NDJSON":
+            return True
+        # Leading whitespace beyond the head is not worth a full read
+        return self.file_format == "JSON" and _JSON_ARRAY_START.match(self._head(4096)) is not None
+
+    def iter_json_records(self):
+        """
+        Streams the records of a bulk document as (record_number, record, error): the line number
+        for NDJSON, the 1-based position for a JSON array. A record that can't be parsed gives
+        (number, None, error); for a JSON array that also ends the stream.
+        """
+        if self.file_format == "NDJSON":
+            yield from iter_ndjson(self._source)
+            return
+        number = 0
+        try:
+            for number, record in enumerate(iter_json_array(self._source), start=1):
+                yield number, record, None
+        except (JSONStreamError, UnicodeDecodeError) as e:
+            yield number + 1, None, str(e)
+
+    @property
+    def is_large_json(self) -> bool:
+        return self.size >= JSON_STREAM_MIN_BYTES
+
+    @cached_property
+    def json_content(self):
+        """
+        JSON for schema matching and the JSONAgent. Large documents become a LazyJSONObject, whose
+        arrays (e.g. invoice items) are streamed when iterated instead of being loaded up front.
+        """
+        if self.is_large_json:
+            return load_json_lazily(self._source)
+        return self.json_data
+
+    @cached_property
+    def email_fields(self) -> dict:
+        if self.raw_text is not None:
+            sender, subject, recipients, body = extract_text_from_raw_email_content(self.raw_text)
+            original_format = "EMAIL_TEXT"
+        else:
+            sender, subject, recipients, body = extract_text_from_email_bytes(self.raw_bytes)
+            original_format = "EMAIL_FILE"
+        return {
+            "sender": sender, "subject": subject,
+            "recipients": recipients, "body": body,
+            "original_format": original_format
+        }
+
+    @cached_property
+    def text(self) -> str:
+        """Plain text view for TEXT inputs."""
+        if self.raw_text is not None:
+            return self.raw_text
+        return self.raw_bytes.decode('utf-8', errors='replace')
+
+    def content_for_intent(self, max_chars: int = INTENT_CONTENT_LIMIT) -> str:
+        """Text the classifier uses to decide the intent."""
+        content = ""
+        if self.file_format == "PDF":
+            content = self.pdf_text_prefix(max_chars) # Stops after the first few pages
+        elif self.file_format == "JSON":
+            # Bounded key/value preview, read incrementally rather than stringifying the whole document
+            content = json_preview(self._source, JSON_PREVIEW_CHARS)
+        elif self.file_format == "NDJSON": # The first few records
+            content = self._head(max_chars * 4).decode('utf-8', errors='replace')
+        elif self.file_format == "EMAIL":
+            content = self.email_fields["body"]
+        elif self.file_format == "TEXT": # Could be raw email body passed as text
+            content = self.text
+        return content[:max_chars]
+
+    @property
+    def routing_content(self):
+        """Parsed content handed to the downstream agent."""
+        if self.is_bulk_json:
+            return None # Records are streamed by the agent, see iter_json_records
+        if self.file_format == "JSON":
+            return self.json_content
+        if self.file_format == "PDF":
+            return self.pdf_text
+        if self.file_format == "EMAIL":
+            return self.email_fields
+        if self.file_format == "TEXT":
+            return self.text
+        return None
@@ -0,0 +1,23 @@
+# utils/env.py
+import os
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_loaded = False
+
+
+def load_env():
+    """
+    Loads .env (working directory first, then the project root) into os.environ, once.
+    python-dotenv is only imported when a .env file actually exists; variables that are
+    already set in the environment win.
+    """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    for directory in (os.getcwd(), _PROJECT_ROOT):
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
@@ -1,11 +1,58 @@
 # utils/file_parser.py
-import PyPDF2
+import atexit
+import io
 import json
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from email import message_from_string
 from email.parser import BytesParser
 from email.policy import default as default_policy
 
+# Page-parallel PDF extraction. Documents with fewer pages stay in-process,
+# where the pool's start-up and pickling overhead would outweigh the gain.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 64))
+PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", os.cpu_count() or 1))
+# Workers are never forked from the (threaded) server process; forkserver where the platform has it
+PDF_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Uploads up to this size are processed from memory; larger ones are spooled to a temp file
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD_BYTES", 8 * 1024 * 1024))
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def is_in_memory_source(source) -> bool:
+    """True for bytes and binary file-like objects, False for filepaths."""
+    return isinstance(source, (bytes, bytearray)) or hasattr(source, "read")
+
+def read_source_bytes(source) -> bytes:
+    """Content of a filepath, bytes or binary file-like object."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+def spool_upload(stream, filename: str, threshold: int = UPLOAD_SPOOL_THRESHOLD, spool_dir: str = None) -> tuple:
+    """
+    Reads an uploaded binary stream. Returns (bytes, None) when it fits in threshold bytes,
+    otherwise copies it to a uniquely named temp file and returns (None, path); the caller deletes it.
+    """
+    head = stream.read(threshold + 1)
+    if len(head) <= threshold:
+        return head, None
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1].lower(), dir=spool_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(head)
+        shutil.copyfileobj(stream, f)
+    return None, path
+
 def get_file_format(filepath: str, content_bytes: bytes = None) -> str:
     _, ext = os.path.splitext(filepath)
     ext = ext.lower()
@@ -13,6 +60,8 @@ def get_file_format(filepath: str, content_bytes: bytes = None) -> str:
         return "PDF"
     elif ext == ".json":
         return "JSON"
+    elif ext in [".ndjson", ".jsonl"]: # One JSON record per line, processed in bulk mode
+        return "NDJSON"
     elif ext in [".txt", ".eml", ".msg"] or content_bytes: # if content_bytes, could be raw email
         # Further check for .eml if needed
         if ext == ".eml" or (content_bytes and b"Content-Type:" in content_bytes and b"Subject:" in content_bytes):
@@ -20,19 +69,123 @@ def get_file_format(filepath: str, content_bytes: bytes = None) -> str:
         return "TEXT" # Generic text, could be email body
     return "UNKNOWN"
 
-def extract_text_from_pdf(filepath: str) -> str:
-    text = ""
+def open_pdf_reader(source):
+    """Opens a PdfReader over a filepath, raw bytes or a binary file-like object."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    import PyPDF2 # Deferred: only PDF inputs need it
+    return PyPDF2.PdfReader(source)
+
+def iter_pdf_page_texts(reader, start_page: int = 0, max_pages: int = None):
+    """Yields the text of each page in order, so callers can stop as soon as they have enough."""
+    end_page = len(reader.pages)
+    if max_pages is not None:
+        end_page = min(end_page, start_page + max_pages)
+    for page_num in range(start_page, end_page):
+        yield reader.pages[page_num].extract_text() or "" # Add or "" to handle None
+
+def _join_page_texts(page_texts, max_chars: int = None) -> str:
+    parts = []
+    total = 0
+    for page_text in page_texts:
+        parts.append(page_text)
+        total += len(page_text)
+        if max_chars is not None and total >= max_chars:
+            break # Enough text, later pages are never extracted
+    text = "".join(parts)
+    return text[:max_chars] if max_chars is not None else text
+
+def extract_text_from_pdf(filepath, max_chars: int = None, max_pages: int = None) -> str:
+    """filepath may also be PDF bytes or a binary file-like object."""
+    if is_in_memory_source(filepath):
+        return extract_text_from_pdf_bytes(read_source_bytes(filepath), max_chars, max_pages)
     try:
+        if max_chars is None and max_pages is None: # Full text, large documents use the process pool
+            return "".join(extract_pdf_page_texts_parallel(filepath))
         with open(filepath, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page_num in range(len(reader.pages)):
-                page = reader.pages[page_num]
-                text += page.extract_text() or "" # Add or "" to handle None
+            return _join_page_texts(iter_pdf_page_texts(open_pdf_reader(f), max_pages=max_pages), max_chars)
     except Exception as e:
         print(f"Error reading PDF {filepath}: {e}")
-    return text
+        return ""
 
-def parse_json_file(filepath: str) -> dict:
+def extract_text_from_pdf_bytes(pdf_bytes: bytes, max_chars: int = None, max_pages: int = None) -> str:
+    """Same as extract_text_from_pdf, for content that is already in memory."""
+    try:
+        if max_chars is None and max_pages is None:
+            return "".join(extract_pdf_page_texts_parallel(pdf_bytes))
+        return _join_page_texts(iter_pdf_page_texts(open_pdf_reader(pdf_bytes), max_pages=max_pages), max_chars)
+    except Exception as e:
+        print(f"Error reading PDF bytes: {e}")
+        return ""
+
+def _get_pdf_process_pool() -> ProcessPoolExecutor:
+    """One shared pool per process, created on first use."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_PARALLEL_WORKERS,
+                                            mp_context=multiprocessing.get_context(PDF_POOL_START_METHOD))
+            atexit.register(_pdf_pool.shutdown, wait=False, cancel_futures=True)
+        return _pdf_pool
+
+def _reset_pdf_process_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+def _extract_page_range(source, start_page: int, end_page: int) -> list:
+    """Worker entry point: extracts pages [start_page, end_page) in a pool process."""
+    return list(iter_pdf_page_texts(open_pdf_reader(source), start_page, end_page - start_page))
+
+def extract_pdf_page_texts_parallel(source, start_page: int = 0, end_page: int = None,
+                                    page_count: int = None, workers: int = None) -> list:
+    """
+    Extracts the text of pages [start_page, end_page) across a process pool and returns
+    it in page order. source is a filepath or PDF bytes / a binary file-like object; in-memory
+    content is written to one temp file that every worker opens, rather than pickled per chunk.
+    Below PDF_PARALLEL_MIN_PAGES pages, or with a single worker, it runs in-process.
+    """
+    workers = workers or PDF_PARALLEL_WORKERS
+    if is_in_memory_source(source):
+        source = read_source_bytes(source) # A stream can only be read once
+    if page_count is None:
+        page_count = len(open_pdf_reader(source).pages)
+    end_page = page_count if end_page is None else min(end_page, page_count)
+    num_pages = end_page - start_page
+    if num_pages <= 0:
+        return []
+    if num_pages < PDF_PARALLEL_MIN_PAGES or workers <= 1:
+        return _extract_page_range(source, start_page, end_page)
+
+    # A couple of chunks per worker evens out pages that are slower to extract than others
+    chunk_size = max(1, -(-num_pages // (workers * 2)))
+    ranges = [(start, min(start + chunk_size, end_page)) for start in range(start_page, end_page, chunk_size)]
+    spooled_path = None
+    try:
+        if isinstance(source, bytes):
+            fd, spooled_path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as f:
+                f.write(source)
+        pool = _get_pdf_process_pool()
+        futures = [pool.submit(_extract_page_range, spooled_path or source, start, end) for start, end in ranges]
+        page_texts = []
+        for future in futures: # Collected in submission order = page order
+            page_texts.extend(future.result())
+        return page_texts
+    except (BrokenProcessPool, OSError) as e:
+        print(f"Parallel PDF extraction failed ({e}), falling back to in-process extraction.")
+        _reset_pdf_process_pool()
+        return _extract_page_range(source, start_page, end_page)
+    finally:
+        if spooled_path:
+            os.remove(spooled_path)
+
+def parse_json_file(filepath) -> dict:
+    """filepath may also be bytes or a binary file-like object."""
+    if is_in_memory_source(filepath):
+        return parse_json_bytes(read_source_bytes(filepath))
     try:
         with open(filepath, "r", encoding='utf-8') as f:
             return json.load(f)
@@ -40,32 +193,52 @@ def parse_json_file(filepath: str) -> dict:
         print(f"Error reading JSON {filepath}: {e}")
         return None
 
-def extract_text_from_email_file(filepath: str) -> tuple[str, str, str, str]:
-    """Parses an .eml file and extracts sender, subject, and body."""
+def parse_json_bytes(content_bytes: bytes) -> dict:
+    try:
+        return json.loads(content_bytes.decode('utf-8'))
+    except Exception as e:
+        print(f"Error parsing JSON content: {e}")
+        return None
+
+def extract_text_from_email_file(filepath) -> tuple[str, str, str, str]:
+    """Parses an .eml file (path, bytes or binary file-like object) and extracts sender, subject, and body."""
+    if is_in_memory_source(filepath):
+        return extract_text_from_email_bytes(read_source_bytes(filepath))
     try:
         with open(filepath, 'rb') as fp:
             msg = BytesParser(policy=default_policy).parse(fp)
-        
-        sender = msg.get('From', 'Unknown Sender')
-        subject = msg.get('Subject', 'No Subject')
-        recipients = msg.get('To', '') # Could be multiple
-        
-        body = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                ctype = part.get_content_type()
-                cdispo = str(part.get('Content-Disposition'))
-                if ctype == 'text/plain' and 'attachment' not in cdispo:
-                    body = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
-                    break
-        else:
-            body = msg.get_payload(decode=True).decode(msg.get_content_charset() or 'utf-8', errors='replace')
-        
-        return sender, subject, recipients, body.strip()
+        return _extract_email_fields(msg)
     except Exception as e:
         print(f"Error parsing email file {filepath}: {e}")
         return "Error", "Error", "Error", f"Could not parse email content: {e}"
 
+def extract_text_from_email_bytes(content_bytes: bytes) -> tuple[str, str, str, str]:
+    """Same as extract_text_from_email_file, for .eml content that is already in memory."""
+    try:
+        msg = BytesParser(policy=default_policy).parsebytes(content_bytes)
+        return _extract_email_fields(msg)
+    except Exception as e:
+        print(f"Error parsing email content: {e}")
+        return "Error", "Error", "Error", f"Could not parse email content: {e}"
+
+def _extract_email_fields(msg) -> tuple[str, str, str, str]:
+    sender = msg.get('From', 'Unknown Sender')
+    subject = msg.get('Subject', 'No Subject')
+    recipients = msg.get('To', '') # Could be multiple
+
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            ctype = part.get_content_type()
+            cdispo = str(part.get('Content-Disposition'))
+            if ctype == 'text/plain' and 'attachment' not in cdispo:
+                body = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
+                break
+    else:
+        body = msg.get_payload(decode=True).decode(msg.get_content_charset() or 'utf-8', errors='replace')
+
+    return sender, subject, recipients, body.strip()
+
 
 def extract_text_from_raw_email_content(email_content: str) -> tuple[str, str, str, str]:
     """Parses raw email text content."""
@@ -0,0 +1,133 @@
+# utils/jobs.py
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_MAX_PENDING_JOBS = 100 # Queued + running; submissions beyond this are refused
+DEFAULT_MAX_RETAINED_JOBS = 1000 # Finished jobs kept for status lookups, oldest dropped first
+DEFAULT_MAX_QUEUED_BYTES = 64 * 1024 * 1024 # Input bytes pending jobs may hold in memory together
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised by JobManager.submit when max_pending jobs are already queued or running."""
+
+
+class ByteBudget:
+    """
+    Thread-safe count of bytes held by pending jobs against a limit. A caller that can't reserve
+    room keeps its data elsewhere (e.g. spools an upload to disk) instead of queueing it in memory.
+    """
+
+    def __init__(self, limit: int = DEFAULT_MAX_QUEUED_BYTES):
+        self.limit = limit
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self, size: int) -> bool:
+        with self._lock:
+            if self._used + size > self.limit:
+                return False
+            self._used += size
+            return True
+
+    def release(self, size: int):
+        with self._lock:
+            self._used -= size
+
+    @property
+    def used(self) -> int:
+        with self._lock:
+            return self._used
+
+
+class JobManager:
+    """
+    Runs submitted callables on a bounded thread pool and keeps their status by job id,
+    so a web request can return immediately and the client polls for the result.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_JOB_WORKERS, max_pending: int = DEFAULT_MAX_PENDING_JOBS,
+                 max_retained: int = DEFAULT_MAX_RETAINED_JOBS):
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._jobs = OrderedDict() # job_id -> job dict, in submission order
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, description: str = None, on_done=None, **kwargs) -> str:
+        """
+        Queues func(*args, **kwargs) and returns its job id. The return value becomes the job's result.
+        on_done() runs after the job whatever the outcome (e.g. to remove temporary files).
+        """
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs are already waiting; try again shortly.")
+            self._pending += 1
+            self._jobs[job_id] = {
+                "job_id": job_id, "status": QUEUED, "description": description, "result": None,
+                "error": None, "submitted_at": time.time(), "started_at": None, "finished_at": None,
+            }
+            self._trim()
+        try:
+            self._executor.submit(self._run, job_id, func, args, kwargs, on_done)
+        except RuntimeError: # Executor shut down
+            with self._lock:
+                self._pending -= 1
+                del self._jobs[job_id]
+            raise
+        return job_id
+
+    def _run(self, job_id: str, func, args, kwargs, on_done):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            result = func(*args, **kwargs)
+            self._update(job_id, status=DONE, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._update(job_id, finished_at=time.time())
+            if on_done is not None:
+                on_done()
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _trim(self):
+        """Caller holds self._lock. Drops the oldest finished jobs beyond max_retained."""
+        excess = len(self._jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for job_id in [jid for jid, job in self._jobs.items() if job["status"] in (DONE, FAILED)][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> dict:
+        """A copy of the job's state, or None for unknown (or long-finished) jobs."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            counts["pending"] = self._pending
+        return counts
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
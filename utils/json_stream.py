@@ -0,0 +1,313 @@
+# utils/json_stream.py
+import io
+import json
+import os
+import re
+from collections.abc import Mapping
+
+# JSON documents at least this large are read incrementally instead of with json.loads
+JSON_STREAM_MIN_BYTES = int(os.getenv("JSON_STREAM_MIN_BYTES", 16 * 1024 * 1024))
+JSON_PREVIEW_CHARS = 2000 # Size of the key/value preview the classifier sees
+READ_CHUNK_CHARS = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Everything up to the next bracket, whole strings included, so skipping costs one match per bracket
+_SKIP_RUN = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+_NUMBER_START = "-0123456789"
+_NUMBER_CONTINUE = ".eE+-" # Can't follow a complete number, so the number continues in the next chunk
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL) # From after the opening quote to the closing one
+
+
+class JSONStreamError(ValueError):
+    """Malformed or truncated JSON found while streaming."""
+
+
+def open_json_text(source):
+    """Text stream over a filepath, bytes or binary file-like object."""
+    if isinstance(source, (bytes, bytearray)):
+        return io.TextIOWrapper(io.BytesIO(source), encoding="utf-8")
+    if hasattr(source, "read"):
+        return io.TextIOWrapper(source, encoding="utf-8")
+    return open(source, "r", encoding="utf-8")
+
+
+class JSONStreamReader:
+    """
+    Pull reader over a JSON text stream that keeps only a window of the text in memory.
+    Values are either read (materialized one at a time) or skipped without being built,
+    and objects/arrays can be walked member by member with members()/elements().
+    """
+
+    def __init__(self, stream, chunk_chars: int = READ_CHUNK_CHARS):
+        self._stream = stream
+        self._chunk_chars = chunk_chars
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, at_least: int = 0) -> bool:
+        """Drops the consumed text and appends the next chunk. False at end of input."""
+        if self._eof:
+            return False
+        chunk = self._stream.read(max(self._chunk_chars, at_least))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it, "" at end of input."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise JSONStreamError(f"Expected {char!r}, found {found or 'end of input'!r}")
+        self._pos += 1
+
+    def expect_end(self):
+        if self.peek():
+            raise JSONStreamError("Extra data after the JSON value")
+
+    def read_value(self):
+        """Decodes the next value. Only use it for values that fit in memory."""
+        if not self.peek():
+            raise JSONStreamError("Unexpected end of input")
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._fill(len(self._buffer) - self._pos): # Value continues past the window, double it
+                    continue
+                raise JSONStreamError(str(e)) from e
+            # A number cut by the end of the window decodes as its prefix ("12." -> 12), so refill and retry
+            if self._buffer[self._pos] in _NUMBER_START and (end == len(self._buffer) or self._buffer[end] in _NUMBER_CONTINUE) \
+                    and self._fill(len(self._buffer) - self._pos):
+                continue
+            self._pos = end
+            return value
+
+    def skip_value(self):
+        """Moves past the next value without building it."""
+        char = self.peek()
+        if char == '"':
+            self._pos += 1
+            self._skip_string_rest()
+        elif char in ("{", "["):
+            self._skip_container()
+        else:
+            self.read_value() # Number or literal
+
+    def _skip_string_rest(self):
+        while True:
+            match = _STRING_REST.match(self._buffer, self._pos)
+            if match:
+                self._pos = match.end()
+                return
+            self._pos -= 1 # Keep the opening quote in the window and retry with more text
+            if not self._fill(len(self._buffer) - self._pos):
+                raise JSONStreamError("Unterminated string")
+            self._pos += 1
+
+    def _skip_container(self):
+        depth = 0
+        while True:
+            self._pos = _SKIP_RUN.match(self._buffer, self._pos).end()
+            if self._pos >= len(self._buffer):
+                if not self._fill():
+                    raise JSONStreamError("Unexpected end of input inside an object or array")
+                continue
+            char = self._buffer[self._pos]
+            self._pos += 1
+            if char == '"': # A string cut off by the end of the window
+                self._skip_string_rest()
+            elif char in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def members(self):
+        """
+        Walks the object at the current position, yielding each key. The caller must read or
+        skip the member's value before asking for the next key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise JSONStreamError("Object keys must be strings")
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def elements(self):
+        """Walks the array at the current position, yielding each index; the caller consumes each value."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_json_array(source, key: str = None):
+    """
+    Yields the elements of the top-level array, or of the array under a top-level key,
+    one at a time. Yields nothing when the key is missing or not an array.
+    """
+    with open_json_text(source) as stream:
+        reader = JSONStreamReader(stream)
+        if key is not None:
+            for member in reader.members():
+                if member == key and reader.peek() == "[":
+                    break
+                reader.skip_value()
+            else:
+                return
+        elif reader.peek() != "[":
+            return
+        for _ in reader.elements():
+            yield reader.read_value()
+
+
+def iter_ndjson(source):
+    """
+    Yields (line_number, record, error) for each non-blank line of newline-delimited JSON.
+    A line that doesn't parse gives record None and the error message, and reading goes on.
+    """
+    with open_json_text(source) as stream:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield line_number, None, str(e)
+
+
+class _PreviewFull(Exception):
+    pass
+
+
+class _BoundedWriter:
+    def __init__(self, max_chars: int):
+        self.parts = []
+        self.remaining = max_chars
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.remaining -= len(text)
+        if self.remaining <= 0:
+            raise _PreviewFull()
+
+
+def _render_preview(reader: JSONStreamReader, out: _BoundedWriter):
+    char = reader.peek()
+    if char == "{":
+        out.write("{")
+        for i, key in enumerate(reader.members()):
+            out.write(f"{', ' if i else ''}{json.dumps(key, ensure_ascii=False)}: ")
+            _render_preview(reader, out)
+        out.write("}")
+    elif char == "[":
+        out.write("[")
+        for i in reader.elements():
+            if i:
+                out.write(", ")
+            _render_preview(reader, out)
+        out.write("]")
+    else:
+        out.write(json.dumps(reader.read_value(), ensure_ascii=False))
+
+
+def json_preview(source, max_chars: int = JSON_PREVIEW_CHARS) -> str:
+    """
+    Compact JSON rendering of the first max_chars of a document. Reading stops as soon as the
+    preview is full, so the cost does not depend on the document size. "" for invalid JSON.
+    """
+    out = _BoundedWriter(max_chars)
+    try:
+        with open_json_text(source) as stream:
+            _render_preview(JSONStreamReader(stream), out)
+    except _PreviewFull:
+        pass
+    except (JSONStreamError, UnicodeDecodeError) as e:
+        print(f"Error previewing JSON content: {e}")
+        return ""
+    return "".join(out.parts)[:max_chars]
+
+
+class LazyJSONArray:
+    """A top-level array of a LazyJSONObject. Each iteration streams it from the source again."""
+
+    def __init__(self, source, key: str):
+        self._source = source
+        self.key = key
+
+    def __iter__(self):
+        return iter_json_array(self._source, self.key)
+
+    def __repr__(self):
+        return f"<LazyJSONArray {self.key!r}>"
+
+
+class LazyJSONObject(Mapping):
+    """
+    A top-level JSON object loaded without its arrays: scalar and object members are decoded,
+    array members become LazyJSONArray views that are iterated from the source on demand.
+    """
+
+    def __init__(self, source):
+        self._source = source
+        self._members = {}
+        with open_json_text(source) as stream:
+            reader = JSONStreamReader(stream)
+            for key in reader.members():
+                if reader.peek() == "[":
+                    reader.skip_value()
+                    self._members[key] = LazyJSONArray(source, key)
+                else:
+                    self._members[key] = reader.read_value()
+            reader.expect_end()
+
+    def __getitem__(self, key):
+        return self._members[key]
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self):
+        return len(self._members)
+
+
+def load_json_lazily(source):
+    """LazyJSONObject for a top-level object, None (after printing the error) for anything else."""
+    try:
+        return LazyJSONObject(source)
+    except (JSONStreamError, UnicodeDecodeError) as e:
+        print(f"Error streaming JSON content: {e}")
+        return None
@@ -0,0 +1,188 @@
+# utils/llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from memory.connection_pool import SQLiteConnectionPool
+
+CACHE_DB_NAME = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 3600))
+CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 512))
+CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", 50000))
+CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "0").lower() in ("1", "true", "yes")
+
+
+def make_cache_key(model_name: str, prompt, generation_params: dict = None) -> str:
+    """Content address of one request: sha256 over model, prompt parts and generation params."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    parts = prompt if isinstance(prompt, (list, tuple)) else [prompt]
+    for part in parts:
+        digest.update(b"\0")
+        if isinstance(part, (bytes, bytearray)):
+            digest.update(part)
+        elif isinstance(part, dict) and isinstance(part.get("data"), (bytes, bytearray)):
+            # Inline blobs such as {"mime_type": ..., "data": pdf_bytes}
+            digest.update(part.get("mime_type", "").encode("utf-8"))
+            digest.update(part["data"])
+        else:
+            digest.update(str(part).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(generation_params or {}, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for LLM responses: an in-process LRU in front of a SQLite table.
+    Entries expire after ttl_seconds; each tier is trimmed to its max entry count.
+    """
+
+    def __init__(self, db_name: str = CACHE_DB_NAME, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 memory_entries: int = CACHE_MEMORY_ENTRIES, disk_entries: int = CACHE_DISK_ENTRIES,
+                 enabled: bool = not CACHE_DISABLED):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.enabled = enabled
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._memory = OrderedDict() # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._db_name = db_name
+        self._pool = None # Opened on first disk access, so a disabled cache never touches disk
+        self._pool_lock = threading.Lock()
+        self._writes_since_trim = 0
+
+    @property
+    def hits(self) -> int:
+        return self.stats["memory_hits"] + self.stats["disk_hits"]
+
+    @property
+    def misses(self) -> int:
+        return self.stats["misses"]
+
+    def _get_pool(self) -> SQLiteConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = SQLiteConnectionPool(self._db_name, pool_size=2)
+                with self._pool.connection() as conn:
+                    conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        response TEXT NOT NULL
+                    );
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at);")
+                    conn.commit()
+            return self._pool
+
+    def get(self, key: str):
+        """Returns the cached response or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key] # Expired
+
+        try:
+            with self._get_pool().connection() as conn:
+                row = conn.execute(
+                    "SELECT expires_at, response FROM llm_cache WHERE cache_key = ? AND expires_at > ?;",
+                    (key, now),
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"LLM cache read error: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, row["expires_at"], row["response"]) # Promote to the memory tier
+        return row["response"]
+
+    def set(self, key: str, response: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, response)
+            self.stats["stores"] += 1
+            self._writes_since_trim += 1
+            trim = self._writes_since_trim >= 100 # Trim the disk tier every 100 writes, not every write
+            if trim:
+                self._writes_since_trim = 0
+        try:
+            with self._get_pool().connection() as conn:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO llm_cache (cache_key, created_at, expires_at, response) VALUES (?, ?, ?, ?);",
+                        (key, now, expires_at, response),
+                    )
+                    if trim:
+                        self._trim_disk(conn, now)
+        except sqlite3.Error as e:
+            print(f"LLM cache write error: {e}")
+
+    def _remember(self, key: str, expires_at: float, response: str):
+        """Caller holds self._lock."""
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _trim_disk(self, conn, now: float):
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?;", (now,))
+        conn.execute(
+            """
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            );
+            """,
+            (self.disk_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        try:
+            with self._get_pool().connection() as conn:
+                with conn:
+                    conn.execute("DELETE FROM llm_cache;")
+        except sqlite3.Error as e:
+            print(f"LLM cache clear error: {e}")
+
+    def snapshot(self) -> dict:
+        """Counters plus current memory-tier size, e.g. for logging or a metrics endpoint."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["enabled"] = self.enabled
+        return stats
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+
+# Global instance shared by all LLM calls in this process
+global_llm_cache = LLMResponseCache()
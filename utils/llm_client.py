@@ -1,15 +1,23 @@
 # utils/llm_client.py (or initialize in each agent that needs it)
-import google.generativeai as genai
+import asyncio
 import os
-from dotenv import load_dotenv
+import threading
+import weakref
+from utils.env import load_env
 
-load_dotenv()
+load_env()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
+# After load_env so LLM_CACHE_* / LLM_* scheduler settings from .env apply
+from utils.llm_cache import global_llm_cache, make_cache_key
+from utils.llm_scheduler import global_llm_scheduler, estimate_tokens, CircuitOpenError
+from utils.metrics import stage
 
-genai.configure(api_key=GEMINI_API_KEY)
+# google.generativeai takes about a second to import, so it's only imported (and configured)
+# when the first model is created. Runs that never call the LLM don't pay for it,
+# and a missing API key is reported then rather than at import time.
+_genai = None
+_models = {} # (backend, model name) -> model object, reused across calls
+_models_lock = threading.Lock()
 
 # Using a specific model, e.g., gemini-1.5-flash
 # Using gemini-pro as it's generally available and good for text tasks.
@@ -18,37 +26,187 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Let's use gemini-1.5-flash as it's versatile.
 llm_model_name = "gemini-1.5-flash-latest" # or "gemini-pro"
 
-def get_gemini_model():
+# Which backend serves LLM calls: "gemini" (the real API) or "stub" (offline, see utils/llm_stub.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+# Upper bound on concurrent async LLM requests from this process, whatever the number of documents in flight
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+_llm_semaphores = weakref.WeakKeyDictionary() # event loop -> semaphore
+
+def _get_genai():
+    """Imports and configures the Gemini SDK on first use. Caller holds _models_lock."""
+    global _genai
+    if _genai is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        _genai = genai
+    return _genai
+
+def _create_gemini_model(model_name: str):
+    return _get_genai().GenerativeModel(model_name)
+
+def _create_stub_model(model_name: str):
+    from utils.llm_stub import StubGenerativeModel
+    return StubGenerativeModel(model_name)
+
+# Backend name -> factory(model_name). A backend's model needs generate_content() and
+# generate_content_async() returning an object with .text (and optionally .usage_metadata).
+LLM_BACKENDS = {
+    "gemini": _create_gemini_model,
+    "stub": _create_stub_model,
+}
+
+def register_llm_backend(name: str, factory):
+    LLM_BACKENDS[name.lower()] = factory
+
+def set_llm_backend(name: str):
+    """Switches the backend for subsequent calls (e.g. to "stub" for load tests)."""
+    global LLM_BACKEND
+    name = name.lower()
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Available: {', '.join(sorted(LLM_BACKENDS))}")
+    LLM_BACKEND = name
+
+def get_llm_model(model_name: str = None):
+    """Model object of the configured backend, created once per model name."""
     # For more complex scenarios, you might want a Chat session
     # For one-off classification/extraction, generate_content is fine
-    return genai.GenerativeModel(llm_model_name)
-
-def generate_text_gemini(prompt: str, model=None) -> str:
+    key = (LLM_BACKEND, model_name or llm_model_name)
+    model = _models.get(key)
     if model is None:
-        model = get_gemini_model()
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                factory = LLM_BACKENDS.get(key[0])
+                if factory is None:
+                    raise ValueError(f"Unknown LLM backend '{key[0]}'. Available: {', '.join(sorted(LLM_BACKENDS))}")
+                model = factory(key[1])
+                _models[key] = model
+    return model
+
+def get_gemini_model(model_name: str = None):
+    # Name kept from when Gemini was the only backend
+    return get_llm_model(model_name)
+
+def _model_name(model) -> str:
+    if model is not None and getattr(model, "model_name", None):
+        return model.model_name
+    # Responses from different backends must never share cache entries
+    return llm_model_name if LLM_BACKEND == "gemini" else f"{LLM_BACKEND}:{llm_model_name}"
+
+def _llm_error_text(e: Exception, response=None) -> str:
+    """Logs an API failure and returns the error string callers receive instead of text."""
+    print(f"Error calling Gemini API: {e}")
+    if isinstance(e, CircuitOpenError):
+        return "Error: LLM temporarily unavailable (circuit open)."
+    if getattr(e, 'response', None):
+        print(f"Gemini API Error Details: {e.response}")
+    # Check for blocked content. response is None when the request itself failed.
+    feedback = getattr(response, "prompt_feedback", None)
+    if feedback and getattr(feedback, "block_reason", None):
+        print(f"Prompt blocked: {feedback.block_reason_message}")
+        return f"Error: Content blocked by API - {feedback.block_reason_message}"
+    return "Error: Could not get response from LLM."
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """Process-wide cap on in-flight async LLM calls (one semaphore per event loop)."""
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _llm_semaphores[loop] = semaphore
+    return semaphore
+
+def generate_text_gemini(prompt: str, model=None, generation_config: dict = None, use_cache: bool = True) -> str:
+    cache_key = make_cache_key(_model_name(model), prompt, generation_config)
+    if use_cache:
+        cached = global_llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    response = None
+    try:
+        model = model or get_llm_model() # Only on a cache miss, so cached runs never load the SDK
+        with stage("llm"): # Includes quota waits and retries
+            response = global_llm_scheduler.call(
+                lambda: model.generate_content(prompt, generation_config=generation_config), estimate_tokens(prompt)
+            )
+        text = response.text # Raises for blocked/empty candidates
+    except Exception as e:
+        return _llm_error_text(e, response)
+    if use_cache:
+        global_llm_cache.set(cache_key, text) # Error strings above are never cached
+    return text
+
+async def generate_text_gemini_async(prompt: str, model=None, generation_config: dict = None,
+                                     use_cache: bool = True) -> str:
+    """Non-blocking generate_text_gemini. At most LLM_MAX_CONCURRENCY calls are in flight at once."""
+    cache_key = make_cache_key(_model_name(model), prompt, generation_config)
+    if use_cache:
+        cached = global_llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    response = None
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        model = model or get_llm_model()
+        with stage("llm"):
+            async with _get_llm_semaphore():
+                response = await global_llm_scheduler.call_async(
+                    lambda: model.generate_content_async(prompt, generation_config=generation_config),
+                    estimate_tokens(prompt),
+                )
+        text = response.text
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
-        if hasattr(e, 'response') and e.response:
-            print(f"Gemini API Error Details: {e.response}")
-        # Check for blocked content
-        if response and response.prompt_feedback and response.prompt_feedback.block_reason:
-            print(f"Prompt blocked: {response.prompt_feedback.block_reason_message}")
-            return f"Error: Content blocked by API - {response.prompt_feedback.block_reason_message}"
-        return "Error: Could not get response from LLM."
+        return _llm_error_text(e, response)
+    if use_cache:
+        global_llm_cache.set(cache_key, text)
+    return text
 
 
 # Example of how Gemini can take PDF bytes (from your provided example)
-def summarize_pdf_bytes_gemini(pdf_bytes: bytes, prompt: str = "Summarize this document", model=None) -> str:
-    if model is None:
-        model = get_gemini_model() # Ensure this model supports multimodal input if you use it.
-                                   # gemini-1.5-flash-latest should work.
+def summarize_pdf_bytes_gemini(pdf_bytes: bytes, prompt: str = "Summarize this document", model=None,
+                               use_cache: bool = True) -> str:
+    pdf_part = {"mime_type": "application/pdf", "data": pdf_bytes}
+    cache_key = make_cache_key(_model_name(model), [pdf_part, prompt]) # Keyed on the PDF bytes, not the filename
+    if use_cache:
+        cached = global_llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    try:
+        model = model or get_llm_model() # Must support multimodal input; gemini-1.5-flash-latest does
+        with stage("llm"):
+            response = global_llm_scheduler.call(
+                lambda: model.generate_content([pdf_part, prompt]), estimate_tokens([pdf_part, prompt])
+            )
+        text = response.text
+    except Exception as e:
+        print(f"Error calling Gemini API with PDF: {e}")
+        return "Error: Could not get PDF summary from LLM."
+    if use_cache:
+        global_llm_cache.set(cache_key, text)
+    return text
+
+async def summarize_pdf_bytes_gemini_async(pdf_bytes: bytes, prompt: str = "Summarize this document", model=None,
+                                           use_cache: bool = True) -> str:
+    pdf_part = {"mime_type": "application/pdf", "data": pdf_bytes}
+    cache_key = make_cache_key(_model_name(model), [pdf_part, prompt])
+    if use_cache:
+        cached = global_llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
     try:
-        pdf_part = {"mime_type": "application/pdf", "data": pdf_bytes}
-        response = model.generate_content([pdf_part, prompt])
-        return response.text
+        model = model or get_llm_model()
+        with stage("llm"):
+            async with _get_llm_semaphore():
+                response = await global_llm_scheduler.call_async(
+                    lambda: model.generate_content_async([pdf_part, prompt]), estimate_tokens([pdf_part, prompt])
+                )
+        text = response.text
     except Exception as e:
         print(f"Error calling Gemini API with PDF: {e}")
-        return "Error: Could not get PDF summary from LLM."
\ No newline at end of file
+        return "Error: Could not get PDF summary from LLM."
+    if use_cache:
+        global_llm_cache.set(cache_key, text)
+    return text
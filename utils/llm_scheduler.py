@@ -0,0 +1,275 @@
+# utils/llm_scheduler.py
+import asyncio
+import os
+import random
+import threading
+import time
+
+# Quota of the API key. 0 disables that limit (e.g. when the quota is unknown).
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 1.0))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 30.0))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30.0))
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", 256)) # Reserved per call for the answer
+LLM_BLOB_TOKEN_ESTIMATE = int(os.getenv("LLM_BLOB_TOKEN_ESTIMATE", 2000)) # Per inline file part (e.g. a PDF)
+
+# Quota, overload and transient server errors. Anything else (bad request, blocked prompt) fails fast.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+def is_retryable_error(e: Exception) -> bool:
+    # google.api_core exceptions carry the HTTP status in .code, so the SDK doesn't need importing here
+    code = getattr(e, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    return isinstance(e, (TimeoutError, ConnectionError))
+
+
+def estimate_tokens(prompt) -> int:
+    """Rough token count of a request (about 4 characters per token) plus room for the answer."""
+    parts = prompt if isinstance(prompt, (list, tuple)) else [prompt]
+    tokens = LLM_OUTPUT_TOKEN_ESTIMATE
+    for part in parts:
+        if isinstance(part, dict) and isinstance(part.get("data"), (bytes, bytearray)):
+            tokens += LLM_BLOB_TOKEN_ESTIMATE
+        else:
+            tokens += len(str(part)) // 4 + 1
+    return tokens
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    return total if isinstance(total, int) and total > 0 else None
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute / 60 per second up to capacity (one minute's worth).
+    reserve() takes the amount immediately, going into debt if needed, and returns how long
+    the caller must wait before using it, so concurrent callers queue up in arrival order.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self._tokens = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+    def adjust(self, amount: float):
+        """Corrects an earlier reservation once the real cost is known (negative gives tokens back)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive retryable failures and rejects calls for
+    reset_seconds. Then one probe call is let through (half-open); success closes it again.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic() # (Re)open; a failed probe restarts the timer
+            self._probe_in_flight = False
+
+    def release(self):
+        """For an allowed call that ended without an outcome (cancelled, interrupted): frees the probe slot."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class LLMScheduler:
+    """
+    Client-side admission control for LLM calls: token buckets for requests and tokens per
+    minute, exponential backoff with full jitter on retryable errors, and a circuit breaker.
+    call() / call_async() wrap one API request; snapshot() reports queue depth and wait time.
+    """
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE_SECONDS, backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+                 breaker: CircuitBreaker = None):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self._lock = threading.Lock()
+        self._queue_depth = 0 # Callers currently waiting for quota
+        self.stats = {
+            "requests": 0, "succeeded": 0, "failed": 0, "retries": 0, "rejected": 0,
+            "max_queue_depth": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+        }
+
+    def _admit(self, estimated_tokens: int) -> float:
+        """Checks the breaker and reserves quota. Returns the seconds to wait before sending."""
+        if not self.breaker.allow():
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise CircuitOpenError("LLM circuit breaker is open; not calling the API.")
+        wait = 0.0
+        if self.request_bucket:
+            wait = self.request_bucket.reserve(1)
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["wait_seconds_total"] += wait
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait)
+            if wait > 0:
+                self._queue_depth += 1
+                self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queue_depth)
+        return wait
+
+    def _leave_queue(self, wait: float):
+        if wait > 0:
+            with self._lock:
+                self._queue_depth -= 1
+
+    def _on_success(self, response, estimated_tokens: int):
+        self.breaker.record_success()
+        actual = _usage_tokens(response)
+        if self.token_bucket and actual is not None:
+            self.token_bucket.adjust(actual - estimated_tokens)
+        with self._lock:
+            self.stats["succeeded"] += 1
+
+    def _on_failure(self, e: Exception, attempt: int):
+        """Returns the backoff delay before the next attempt, or None if the error should be raised."""
+        retryable = is_retryable_error(e)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success() # The API answered, it just rejected this request
+        with self._lock:
+            if not retryable or attempt >= self.max_retries:
+                self.stats["failed"] += 1
+                return None
+            self.stats["retries"] += 1
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)) # Full jitter
+
+    def call(self, request, estimated_tokens: int = LLM_OUTPUT_TOKEN_ESTIMATE):
+        """Runs request() within quota, retrying retryable errors. Raises the last error (or CircuitOpenError)."""
+        attempt = 0
+        while True:
+            wait = self._admit(estimated_tokens)
+            try:
+                try:
+                    if wait > 0:
+                        time.sleep(wait)
+                finally:
+                    self._leave_queue(wait)
+                response = request()
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+                print(f"LLM call failed ({e}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException: # KeyboardInterrupt etc.: no outcome, but a half-open probe must not stay taken
+                self.breaker.release()
+                raise
+            self._on_success(response, estimated_tokens)
+            return response
+
+    async def call_async(self, request, estimated_tokens: int = LLM_OUTPUT_TOKEN_ESTIMATE):
+        """call() for coroutines: request is a zero-argument callable returning an awaitable."""
+        attempt = 0
+        while True:
+            wait = self._admit(estimated_tokens)
+            try:
+                try:
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                finally:
+                    self._leave_queue(wait)
+                response = await request()
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                if delay is None:
+                    raise
+                print(f"LLM call failed ({e}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException: # CancelledError is not an Exception; free the probe slot before re-raising
+                self.breaker.release()
+                raise
+            self._on_success(response, estimated_tokens)
+            return response
+
+    def snapshot(self) -> dict:
+        """Counters plus current queue depth and breaker state, e.g. for a batch summary or metrics endpoint."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["queue_depth"] = self._queue_depth
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 3)
+        stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 3)
+        stats["wait_ms_avg"] = round(1000 * stats["wait_seconds_total"] / stats["requests"], 2) if stats["requests"] else 0.0
+        stats["breaker_state"] = self.breaker.state
+        return stats
+
+
+# Global instance shared by all LLM calls in this process, so the quota is enforced process-wide
+global_llm_scheduler = LLMScheduler()
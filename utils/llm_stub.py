@@ -0,0 +1,140 @@
+# utils/llm_stub.py
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from utils.local_intent_classifier import LocalIntentClassifier, DEFAULT_RULES
+
+# Simulated service behaviour, per call
+STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", 200))
+STUB_JITTER_MS = float(os.getenv("LLM_STUB_JITTER_MS", 50)) # Latency is uniform in latency +/- jitter
+STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", 0)) # Fraction of calls that fail with a retryable error
+STUB_SEED = os.getenv("LLM_STUB_SEED") # Fixes the latency/error sequence when set
+
+STUB_INTENTS = list(DEFAULT_RULES) + ["Query", "Other"]
+STUB_URGENCIES = ["Low", "Medium", "High"]
+_URGENT_PATTERN = re.compile(r"\b(urgent|asap|immediately|critical|outage|down)\b", re.IGNORECASE)
+_ENTITY_PATTERN = re.compile(r"\b[A-Z][a-zA-Z0-9]+(?: [A-Z][a-zA-Z0-9]+)*\b")
+_DELIMITED_PATTERN = re.compile(r"---\n(.*?)\n\s*---", re.DOTALL)
+_BATCH_DOCUMENT_PATTERN = re.compile(r"Document (\d+) \(from file: .*?\):\s*---\n(.*?)\n\s*---", re.DOTALL)
+_SUBJECT_PATTERN = re.compile(r"^\s*Subject: (.*)$", re.MULTILINE)
+
+
+class StubAPIError(Exception):
+    """Simulated API failure. code mirrors the HTTP status carried by google.api_core exceptions."""
+
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+class StubUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class StubResponse:
+    """The parts of a Gemini response that llm_client reads."""
+
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.prompt_feedback = None
+        self.usage_metadata = StubUsage(prompt_tokens, len(text) // 4 + 1)
+
+
+def _stable_choice(text: str, options: list):
+    """Same text, same pick: the choice only depends on a hash of the text."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return options[int.from_bytes(digest[:4], "big") % len(options)]
+
+
+class StubGenerativeModel:
+    """
+    Offline stand-in for genai.GenerativeModel. Answers the classifier and email prompts
+    with deterministic, schema-valid responses derived from the prompt text, after a
+    simulated latency, and fails a configurable fraction of calls with 429/503 errors.
+    """
+
+    def __init__(self, model_name: str = "stub", latency_ms: float = STUB_LATENCY_MS,
+                 jitter_ms: float = STUB_JITTER_MS, error_rate: float = STUB_ERROR_RATE, seed=STUB_SEED):
+        self.model_name = f"stub:{model_name}"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._classifier = LocalIntentClassifier(STUB_INTENTS)
+        self.calls = 0
+
+    def _draw(self) -> tuple:
+        """(delay in seconds, error or None) for one call."""
+        with self._random_lock:
+            self.calls += 1
+            delay_ms = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            failed = self._random.random() < self.error_rate
+            code = self._random.choice([429, 503])
+        error = StubAPIError(f"Simulated {code} from stub LLM backend", code) if failed else None
+        return max(0.0, delay_ms) / 1000, error
+
+    def generate_content(self, contents, generation_config=None) -> StubResponse:
+        delay, error = self._draw()
+        time.sleep(delay)
+        if error:
+            raise error
+        return self._respond(contents)
+
+    async def generate_content_async(self, contents, generation_config=None) -> StubResponse:
+        delay, error = self._draw()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return self._respond(contents)
+
+    def _respond(self, contents) -> StubResponse:
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        prompt = "\n".join(part for part in parts if isinstance(part, str))
+        blobs = [part for part in parts if isinstance(part, dict)]
+        if blobs: # Multimodal call, e.g. summarize_pdf_bytes_gemini
+            text = f"Summary of a {len(blobs[0].get('data', b''))}-byte document: {prompt.strip()[:200]}"
+        elif "Classify the primary intent of each of the" in prompt:
+            text = json.dumps([
+                {"document": int(number), "intent": self._intent(body)}
+                for number, body in _BATCH_DOCUMENT_PATTERN.findall(prompt)
+            ])
+        elif '"urgency"' in prompt and '"crm_summary"' in prompt:
+            text = json.dumps(self._email_analysis(prompt, with_intent='"intent"' in prompt))
+        elif "Primary Intent:" in prompt:
+            text = self._intent(self._delimited(prompt))
+        else:
+            text = f"Stub response: {prompt.strip()[:200]}"
+        return StubResponse(text, len(prompt) // 4 + 1)
+
+    def _delimited(self, prompt: str) -> str:
+        match = _DELIMITED_PATTERN.search(prompt)
+        return match.group(1) if match else prompt
+
+    def _intent(self, text: str) -> str:
+        label, _, _ = self._classifier.predict(text)
+        return label or _stable_choice(text, STUB_INTENTS)
+
+    def _email_analysis(self, prompt: str, with_intent: bool) -> dict:
+        body = self._delimited(prompt).strip()
+        subject_match = _SUBJECT_PATTERN.search(prompt)
+        subject = subject_match.group(1).strip() if subject_match else ""
+        urgency = "High" if _URGENT_PATTERN.search(f"{subject}\n{body}") else _stable_choice(body, STUB_URGENCIES[:2])
+        first_sentence = re.split(r"(?<=[.!?])\s", body, maxsplit=1)[0] if body else subject
+        entities = list(dict.fromkeys(_ENTITY_PATTERN.findall(body)))[:5]
+        analysis = {
+            "urgency": urgency,
+            "crm_summary": (first_sentence or "No content.")[:200],
+            "entities": entities,
+        }
+        if with_intent:
+            analysis = {"intent": self._intent(f"{subject}\n{body}"), **analysis}
+        return analysis
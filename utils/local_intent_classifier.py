@@ -0,0 +1,197 @@
+# utils/local_intent_classifier.py
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+# (pattern, weight) per intent. A weight of 1.0 is strong evidence on its own,
+# weaker cues need company before they clear the confidence threshold.
+DEFAULT_RULES = {
+    "Invoice": [
+        (r"\binvoice\s*(#|no\b|number\b|id\b)", 1.0),
+        (r"\b(amount|balance|payment) due\b", 0.6),
+        (r"\bbilling statement\b", 1.0),
+        (r"\binvoice\b", 0.4),
+    ],
+    "RFQ": [
+        (r"\brequest for (quotation|quote)s?\b", 1.0),
+        (r"\brfq\b", 0.8),
+        (r"\bplease (provide|send) (us )?(a |your )?(quote|quotation|pricing)\b", 0.8),
+    ],
+    "Complaint": [
+        (r"\b(formal )?complaint\b", 0.8),
+        (r"\b(dissatisfied|unacceptable|disappointed)\b", 0.5),
+        (r"\b(defective|damaged|broken) (item|product|goods|unit)s?\b", 0.5),
+    ],
+    "Regulation": [
+        (r"\bregulation \(?(eu|ec)\)? ?(no\.? )?\d", 1.0),
+        (r"\bpursuant to (article|section)\b", 0.8),
+        (r"\b(compliance|regulatory) requirements?\b", 0.5),
+    ],
+    "Order": [
+        (r"\border (confirmation|confirmed|#|number\b)", 1.0),
+        (r"\byour order (has been|is) (confirmed|placed|shipped)\b", 1.0),
+        (r"\bpurchase order\b", 0.6),
+    ],
+    "Marketing": [
+        (r"\bunsubscribe\b", 0.8),
+        (r"\b\d{1,2}% off\b", 0.6),
+        (r"\blimited[- ]time offer\b", 0.6),
+        (r"\bnewsletter\b", 0.5),
+    ],
+    "Internal Memo": [
+        (r"^\s*(memo|memorandum)\b", 1.0),
+        (r"\bto: all (staff|employees)\b", 0.8),
+    ],
+    "Resume": [
+        (r"\bcurriculum vitae\b", 1.0),
+        (r"\b(work|professional) experience\b", 0.5),
+        (r"\beducation\b.*\bskills\b", 0.5),
+    ],
+}
+
+MIN_TRAINING_SAMPLES = 50 # The trained model is not consulted with fewer examples than this
+# The model's confidence is the posterior a text of this many tokens would get if every token carried
+# the text's average evidence, scaled by the share of tokens the model has seen before. The raw
+# naive Bayes posterior saturates at 1.0 for any longer text, related or not.
+MODEL_REFERENCE_TOKENS = 8
+# Agreement only adds the model's confidence when the model is at least this sure on its own,
+# so one strong rule (0.67) plus a hesitant model can't reach the 0.8 threshold together
+MODEL_AGREEMENT_MIN = 0.5
+_TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9]+")
+
+
+class LocalIntentClassifier:
+    """
+    Cheap intent classification that runs before the LLM: weighted keyword/regex rules plus a
+    multinomial naive Bayes model trained on earlier LLM classifications. predict() returns a
+    label with a confidence in [0, 1]; callers escalate to the LLM below their threshold.
+    """
+
+    def __init__(self, labels: list, rules: dict = None, max_chars: int = 4000):
+        self.labels = list(labels)
+        self.max_chars = max_chars
+        rules = DEFAULT_RULES if rules is None else rules
+        self._rules = {
+            label: [(re.compile(pattern, re.IGNORECASE | re.MULTILINE), weight) for pattern, weight in patterns]
+            for label, patterns in rules.items() if label in self.labels
+        }
+        self._lock = threading.Lock()
+        self._token_counts = {} # label -> Counter of tokens
+        self._token_totals = {} # label -> total tokens seen, precomputed for the smoothing denominator
+        self._label_counts = Counter()
+        self._vocabulary = set()
+
+    @property
+    def training_samples(self) -> int:
+        return sum(self._label_counts.values())
+
+    def predict(self, text: str) -> tuple:
+        """
+        Returns (label, confidence, source) where source is "rules", "model" or "rules+model"
+        (both agree and the model reaches MODEL_AGREEMENT_MIN; their confidences are combined
+        as 1 - (1 - rules)(1 - model)); label is None if nothing matched.
+        """
+        text = text[:self.max_chars]
+        rule_label, rule_confidence = self._predict_rules(text)
+        model_label, model_confidence = self._predict_model(text)
+        if rule_label and rule_label == model_label and model_confidence >= MODEL_AGREEMENT_MIN:
+            return rule_label, 1 - (1 - rule_confidence) * (1 - model_confidence), "rules+model"
+        best = (None, 0.0, None)
+        if rule_label:
+            best = (rule_label, rule_confidence, "rules")
+        if model_label and model_confidence > best[1]:
+            best = (model_label, model_confidence, "model")
+        return best
+
+    def _predict_rules(self, text: str) -> tuple:
+        scores = {}
+        for label, patterns in self._rules.items():
+            score = sum(weight for regex, weight in patterns if regex.search(text))
+            if score:
+                scores[label] = score
+        if not scores:
+            return None, 0.0
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        label, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        strength = score / (score + 0.5) # 1.0 -> 0.67, 2.0 -> 0.8: a single cue never clears 0.8 alone
+        share = score / (score + runner_up) # Competing labels pull the confidence down
+        return label, strength * share
+
+    def _predict_model(self, text: str) -> tuple:
+        with self._lock:
+            total = sum(self._label_counts.values())
+            if total < MIN_TRAINING_SAMPLES:
+                return None, 0.0
+            tokens = self._tokenize(text)
+            known = [token for token in tokens if token in self._vocabulary] # Unseen tokens carry no evidence
+            if not known:
+                return None, 0.0
+            log_scores = {}
+            for label, label_count in self._label_counts.items():
+                counts = self._token_counts[label]
+                denominator = self._token_totals[label] + len(self._vocabulary) # Laplace smoothing
+                log_likelihood = sum(math.log((counts.get(token, 0) + 1) / denominator) for token in known)
+                # Length-normalised, so the score doesn't grow more certain with every extra token
+                log_scores[label] = (log_likelihood / len(known) + math.log(label_count / total) / MODEL_REFERENCE_TOKENS) * MODEL_REFERENCE_TOKENS
+
+        best_label = max(log_scores, key=log_scores.get)
+        best_score = log_scores[best_label]
+        normaliser = sum(math.exp(score - best_score) for score in log_scores.values())
+        coverage = len(known) / len(tokens)
+        return best_label, coverage / normaliser
+
+    def _tokenize(self, text: str) -> list:
+        return _TOKEN_PATTERN.findall(text[:self.max_chars].lower())
+
+    def train(self, samples) -> int:
+        """Fits the model from (text, label) pairs, replacing any previous training. Returns the sample count."""
+        token_counts = defaultdict(Counter)
+        label_counts = Counter()
+        vocabulary = set()
+        for text, label in samples:
+            if label not in self.labels or not text:
+                continue
+            tokens = self._tokenize(text)
+            token_counts[label].update(tokens)
+            label_counts[label] += 1
+            vocabulary.update(tokens)
+        with self._lock:
+            self._token_counts = dict(token_counts)
+            self._token_totals = {label: sum(counts.values()) for label, counts in token_counts.items()}
+            self._label_counts = label_counts
+            self._vocabulary = vocabulary
+        return sum(label_counts.values())
+
+    def learn(self, text: str, label: str):
+        """Adds one (text, label) example to the model, e.g. each new LLM classification."""
+        if label not in self.labels or not text:
+            return
+        tokens = self._tokenize(text)
+        with self._lock:
+            self._token_counts.setdefault(label, Counter()).update(tokens)
+            self._token_totals[label] = self._token_totals.get(label, 0) + len(tokens)
+            self._label_counts[label] += 1
+            self._vocabulary.update(tokens)
+
+    def train_from_memory(self, memory, agent_name: str = "ClassifierAgent", limit: int = 5000) -> int:
+        """
+        Trains on the most recent LLM classifications recorded in agent_logs
+        (entries that carry a content_excerpt). Local predictions are skipped so the
+        model never learns from its own output.
+        """
+        samples = []
+        before_id = None
+        scanned = 0
+        while len(samples) < limit and scanned < limit * 4: # Old logs without excerpts shouldn't mean a full scan
+            page = memory.query_logs(limit=500, agent_name=agent_name, status="Classified",
+                                     before_id=before_id, newest_first=True)
+            if not page:
+                break
+            scanned += len(page)
+            for log in page:
+                if log.get("intent_source") == "llm" and log.get("content_excerpt"):
+                    samples.append((log["content_excerpt"], log.get("classified_intent")))
+            before_id = page[-1]["id"]
+        return self.train(samples[:limit])
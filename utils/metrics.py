@@ -0,0 +1,166 @@
+# utils/metrics.py
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Pipeline stages that are timed. llm and memory spans nest inside the others.
+STAGES = ("parse", "classify", "route", "agent", "llm", "memory")
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = ContextVar("stage_trace", default=None)
+
+
+class StageTrace:
+    """Spans recorded while one document (or one batch of documents) goes through the pipeline."""
+
+    def __init__(self):
+        self.spans = [] # (stage, started_at epoch seconds, duration_ms)
+        self._lock = threading.Lock() # asyncio.to_thread shares the trace with worker threads
+
+    def add(self, stage_name: str, started_at: float, duration_ms: float):
+        with self._lock:
+            self.spans.append((stage_name, started_at, duration_ms))
+
+    def totals(self) -> dict:
+        """Total milliseconds per stage."""
+        totals = {}
+        with self._lock:
+            for stage_name, _, duration_ms in self.spans:
+                totals[stage_name] = totals.get(stage_name, 0.0) + duration_ms
+        return totals
+
+
+class StageMetrics:
+    """Process-wide duration histograms per stage, exported in Prometheus text format."""
+
+    def __init__(self, buckets: tuple = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = {} # stage -> per-bucket counts (last slot is +Inf)
+        self._sums = {}
+        self.documents = 0
+
+    def observe(self, stage_name: str, seconds: float):
+        with self._lock:
+            counts = self._counts.get(stage_name)
+            if counts is None:
+                counts = self._counts[stage_name] = [0] * (len(self.buckets) + 1)
+                self._sums[stage_name] = 0.0
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[stage_name] += seconds
+
+    def document_done(self):
+        with self._lock:
+            self.documents += 1
+
+    def snapshot(self) -> dict:
+        """{stage: {"count", "sum_seconds", "buckets"}} with cumulative bucket counts."""
+        with self._lock:
+            result = {}
+            for stage_name, counts in self._counts.items():
+                cumulative, running = [], 0
+                for count in counts:
+                    running += count
+                    cumulative.append(running)
+                result[stage_name] = {"count": running, "sum_seconds": self._sums[stage_name], "buckets": cumulative}
+            return result
+
+
+global_stage_metrics = StageMetrics()
+
+
+@contextmanager
+def stage(stage_name: str):
+    """Times the with-block as one span of stage_name, for the histograms and the current trace."""
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        global_stage_metrics.observe(stage_name, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage_name, started_at, seconds * 1000)
+
+
+def timed_stage(stage_name: str):
+    """Decorator form of stage() for synchronous functions."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace_document():
+    """
+    Collects the spans of everything run inside the with-block (including asyncio tasks and
+    asyncio.to_thread calls started from it, which inherit the context) into a StageTrace.
+    """
+    trace = StageTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus() -> str:
+    """Stage histograms plus LLM scheduler and cache counters in the Prometheus text exposition format."""
+    from utils.llm_cache import global_llm_cache
+    from utils.llm_scheduler import global_llm_scheduler
+
+    lines = [
+        "# HELP pipeline_stage_duration_seconds Time spent in each pipeline stage.",
+        "# TYPE pipeline_stage_duration_seconds histogram",
+    ]
+    metrics = global_stage_metrics
+    for stage_name, data in sorted(metrics.snapshot().items()):
+        for bound, count in zip(metrics.buckets, data["buckets"]):
+            lines.append(f"pipeline_stage_duration_seconds_bucket{_format_labels({'stage': stage_name, 'le': bound})} {count}")
+        lines.append(f"pipeline_stage_duration_seconds_bucket{_format_labels({'stage': stage_name, 'le': '+Inf'})} {data['count']}")
+        lines.append(f"pipeline_stage_duration_seconds_sum{_format_labels({'stage': stage_name})} {data['sum_seconds']:.6f}")
+        lines.append(f"pipeline_stage_duration_seconds_count{_format_labels({'stage': stage_name})} {data['count']}")
+    lines += [
+        "# HELP pipeline_documents_total Documents that finished the pipeline.",
+        "# TYPE pipeline_documents_total counter",
+        f"pipeline_documents_total {metrics.documents}",
+    ]
+
+    scheduler = global_llm_scheduler.snapshot()
+    for name, kind, value, help_text in (
+        ("llm_requests_total", "counter", scheduler["requests"], "LLM requests admitted by the scheduler."),
+        ("llm_retries_total", "counter", scheduler["retries"], "LLM requests retried after a retryable error."),
+        ("llm_failures_total", "counter", scheduler["failed"], "LLM requests that failed for good."),
+        ("llm_rejected_total", "counter", scheduler["rejected"], "LLM requests rejected by the open circuit breaker."),
+        ("llm_queue_depth", "gauge", scheduler["queue_depth"], "LLM requests currently waiting for quota."),
+        ("llm_quota_wait_seconds_total", "counter", scheduler["wait_seconds_total"], "Time spent waiting for quota."),
+        ("llm_circuit_open", "gauge", int(scheduler["breaker_state"] != "closed"), "1 while the circuit breaker is open or half-open."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+    cache = global_llm_cache.snapshot()
+    lines += ["# HELP llm_cache_lookups_total LLM cache lookups by result.", "# TYPE llm_cache_lookups_total counter"]
+    for result in ("memory_hits", "disk_hits", "misses"):
+        lines.append(f"llm_cache_lookups_total{_format_labels({'result': result})} {cache[result]}")
+    return "\n".join(lines) + "\n"
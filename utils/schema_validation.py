@@ -0,0 +1,147 @@
+# utils/schema_validation.py
+import json
+import os
+from itertools import islice
+
+VALIDATION_BATCH_SIZE = 1024 # Items pulled from the (possibly streamed) array per validation pass
+ANOMALY_SAMPLE_LIMIT = int(os.getenv("JSON_ANOMALY_SAMPLE_LIMIT", 50)) # Anomaly messages kept per document
+
+# Type names usable in schema config files
+SCHEMA_TYPES = {
+    "str": str, "int": int, "float": float, "number": (int, float),
+    "bool": bool, "list": list, "dict": dict,
+}
+
+_MISSING = object()
+
+
+def _type_name(expected) -> str:
+    if isinstance(expected, tuple):
+        return " or ".join(t.__name__ for t in expected)
+    return expected.__name__
+
+
+class AnomalyAggregator:
+    """Counts anomalies per (field, kind) and keeps the first sample_limit messages."""
+
+    def __init__(self, sample_limit: int = ANOMALY_SAMPLE_LIMIT):
+        self.sample_limit = sample_limit
+        self.counts = {} # field -> {kind: count}
+        self.samples = []
+        self.total = 0
+
+    def add(self, field: str, kind: str, message: str):
+        kinds = self.counts.setdefault(field, {})
+        kinds[kind] = kinds.get(kind, 0) + 1
+        self.total += 1
+        if len(self.samples) < self.sample_limit:
+            self.samples.append(message)
+
+
+class ItemValidator:
+    """
+    An item schema ({key: type}) compiled for one array field. The (key, type) checks are
+    precomputed, and valid_flags() runs each one over the whole batch in a single list
+    comprehension, so no function is called per item. Only invalid items are then
+    inspected field by field.
+    """
+
+    def __init__(self, field: str, item_schema: dict):
+        self.field = field
+        self.item_schema = dict(item_schema)
+        self._checks = tuple(self.item_schema.items())
+
+    def valid_flags(self, batch: list) -> list:
+        """One bool per item of batch."""
+        flags = [isinstance(item, dict) for item in batch]
+        for key, expected in self._checks: # Items that already failed are short-circuited by `ok and`
+            flags = [ok and isinstance(item.get(key, _MISSING), expected) for ok, item in zip(flags, batch)]
+        return flags
+
+    def _report(self, index: int, item, anomalies: AnomalyAggregator):
+        if not isinstance(item, dict):
+            anomalies.add(self.field, "not_object", f"Item {index + 1} of '{self.field}' is not a valid object.")
+            return
+        for key, expected in self.item_schema.items():
+            value = item.get(key, _MISSING)
+            if value is _MISSING:
+                anomalies.add(f"{self.field}.{key}", "missing",
+                              f"Item {index + 1} of '{self.field}' missing field: {key}")
+            elif not isinstance(value, expected):
+                anomalies.add(f"{self.field}.{key}", f"type:{type(value).__name__}",
+                              f"Item {index + 1} of '{self.field}' field '{key}' has incorrect type "
+                              f"(expected {_type_name(expected)}, got {type(value).__name__})")
+
+    def validate(self, items, anomalies: AnomalyAggregator, keep_valid: int = None) -> tuple:
+        """
+        Validates an iterable of items (a list or a streamed array) in batches.
+        Returns (valid items kept, valid count, total count); keep_valid caps the items kept.
+        """
+        kept, valid_count, total = [], 0, 0
+        valid_flags = self.valid_flags
+        if isinstance(items, list): # Already in memory, so one pass over the whole list
+            batches = iter((items,) if items else ())
+        else:
+            iterator = iter(items)
+            batches = iter(lambda: list(islice(iterator, VALIDATION_BATCH_SIZE)), [])
+        for batch in batches:
+            flags = valid_flags(batch)
+            batch_valid = sum(flags)
+            if batch_valid == len(batch):
+                valid_items = batch
+            else:
+                valid_items = []
+                for offset, (item, ok) in enumerate(zip(batch, flags)):
+                    if ok:
+                        valid_items.append(item)
+                    else:
+                        self._report(total + offset, item, anomalies)
+            if keep_valid is None:
+                kept.extend(valid_items)
+            elif len(kept) < keep_valid:
+                kept.extend(valid_items[:keep_valid - len(kept)])
+            valid_count += batch_valid
+            total += len(batch)
+        return kept, valid_count, total
+
+
+class CompiledSchema:
+    """A JSONAgent target schema: required top-level fields plus an ItemValidator per array field."""
+
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.required_fields = list(config["required_fields"])
+        self.item_validators = {
+            field: ItemValidator(field, item_schema)
+            for field, item_schema in config.get("item_schemas", {}).items()
+        }
+
+    def missing_fields(self, document) -> list:
+        return [field for field in self.required_fields if field not in document]
+
+
+def compile_schemas(schemas: dict) -> dict:
+    """{schema_key: CompiledSchema}. Compile once and reuse for every document."""
+    return {key: CompiledSchema(key, config) for key, config in schemas.items()}
+
+
+def load_schema_config(path: str) -> dict:
+    """
+    Reads target schemas from a JSON file shaped like agents/json_agent.TARGET_SCHEMAS, with
+    type names from SCHEMA_TYPES in place of Python types:
+        {"invoice": {"required_fields": [...], "item_schemas": {"items": {"quantity": "int"}}}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    schemas = {}
+    for key, config in raw.items():
+        if "required_fields" not in config:
+            raise ValueError(f"Schema '{key}' in {path} has no required_fields")
+        item_schemas = {}
+        for field, item_schema in config.get("item_schemas", {}).items():
+            try:
+                item_schemas[field] = {name: SCHEMA_TYPES[type_name] for name, type_name in item_schema.items()}
+            except KeyError as e:
+                raise ValueError(f"Schema '{key}' in {path}: unknown type {e}; use one of {sorted(SCHEMA_TYPES)}") from None
+        schemas[key.lower()] = {"required_fields": list(config["required_fields"]), "item_schemas": item_schemas}
+    return schemas